@@ -1,24 +1,49 @@
+import click
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from flask_socketio import emit
 from models import User, AuditLog, ChatMessage
+from sqlalchemy.orm import contains_eager, selectinload, undefer, undefer_group
 from extensions import db, socketio
 from utils import log_audit
 from functools import wraps
 from forms import EditUserForm
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
-from chat_service import ChatService
+from chat_service import chat_service
+from user_cache import user_cache
+from password_service import password_hasher
+from email_service import mail_queue
+from response_cache import response_cache
+from generation_tracker import generation_tracker, GenerationCancelled
+from rollups import record_flag_change, delete_user_rollups
+from read_replicas import replica_router, replica_reads
+from monitor_feed import monitor_feed
+from model_scheduler import model_scheduler
+from model_router import model_router
 
 admin = Blueprint('admin', __name__)
-chat_service = ChatService()
+
+# Columns selected by the user directory, per view. Never includes password_hash.
+USER_DIRECTORY_VIEWS = {
+    'table': (User.id, User.email, User.role, User.is_active, User.email_verified, User.last_login, User.created_at),
+    'options': (User.id, User.email),
+}
+USER_DIRECTORY_SORTS = {
+    'email': User.email,
+    'role': User.role,
+    'is_active': User.is_active,
+    'created_at': User.created_at,
+    'last_login': User.last_login,
+}
+USER_DIRECTORY_MAX_PER_PAGE = 200
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or current_user.role != 'admin':
             flash('You do not have permission to access this page.', 'danger')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -26,12 +51,56 @@ def admin_required(f):
 @login_required
 @admin_required
 def user_list():
-    users = User.query.all()
-    return render_template('admin/users.html', users=users)
+    return render_template('admin/users.html')
+
+@admin.route('/api/users')
+@login_required
+@admin_required
+@replica_reads
+def user_directory():
+    columns = USER_DIRECTORY_VIEWS.get(request.args.get('view'), USER_DIRECTORY_VIEWS['table'])
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), USER_DIRECTORY_MAX_PER_PAGE)
+    sort_column = USER_DIRECTORY_SORTS.get(request.args.get('sort'), User.created_at)
+    descending = request.args.get('order', 'desc') == 'desc'
+
+    query = db.session.query(*columns)
+
+    search = request.args.get('q', '').strip()
+    if search:
+        # A prefix match on lower(email) can use ix_user_email_lower; % and _ in the search are literal
+        query = query.filter(func.lower(User.email).startswith(search.lower(), autoescape=True))
+    if request.args.get('role'):
+        query = query.filter(User.role == request.args['role'])
+    if request.args.get('active') in ('true', 'false'):
+        query = query.filter(User.is_active == (request.args['active'] == 'true'))
+
+    query = query.order_by(
+        sort_column.desc() if descending else sort_column.asc(),
+        User.id.desc() if descending else User.id.asc()
+    )
+
+    # Fetch one extra row instead of running a COUNT(*) to know whether there is a next page
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    users = []
+    for row in rows[:per_page]:
+        user = row._asdict()
+        for key in ('last_login', 'created_at'):
+            if user.get(key):
+                user[key] = user[key].isoformat()
+        users.append(user)
+
+    return jsonify({
+        'users': users,
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page
+    })
 
 @admin.route('/audit-logs')
 @login_required
 @admin_required
+@replica_reads
 def audit_logs():
     logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).all()
     return render_template('admin/audit_logs.html', audit_logs=logs)
@@ -39,6 +108,7 @@ def audit_logs():
 @admin.route('/system-status')
 @login_required
 @admin_required
+@replica_reads
 def system_status():
     # User statistics
     total_users = User.query.count()
@@ -81,7 +151,15 @@ def system_status():
         'recent_registrations': recent_registrations,
         'total_actions': total_actions,
         'recent_actions': recent_actions,
-        'common_actions': common_actions
+        'common_actions': common_actions,
+        'user_cache': user_cache.stats(),
+        'password_hasher': password_hasher.stats(),
+        'mail_queue': mail_queue.stats(),
+        'response_cache': response_cache.stats(),
+        'generations': generation_tracker.stats(),
+        'replicas': replica_router.stats(),
+        'model_scheduler': model_scheduler.stats(),
+        'model_router': model_router.stats()
     }
 
     return render_template('admin/system_status.html', metrics=metrics)
@@ -89,8 +167,8 @@ def system_status():
 @admin.route('/dashboard')
 @login_required
 @admin_required
+@replica_reads
 def admin_dashboard():
-    users = User.query.all()
     chat_messages = ChatMessage.query.filter_by(user_id=current_user.id).order_by(ChatMessage.timestamp.desc()).all()
     messages = [{
         'content': msg.content,
@@ -99,7 +177,7 @@ def admin_dashboard():
         'message_type': msg.message_type,
         'voice_url': msg.voice_url
     } for msg in chat_messages]
-    return render_template('dashboard/admin.html', users=users, messages=messages)
+    return render_template('dashboard/admin.html', messages=messages)
 
 @admin.route('/voice-message', methods=['POST'])
 @login_required
@@ -113,11 +191,12 @@ def handle_voice_message():
         return jsonify({'success': False, 'error': 'Empty audio file'}), 400
     
     # Process the voice message
-    result = chat_service.process_voice_message(audio_file, current_user)
+    with model_scheduler.priority('admin'):
+        result = chat_service.process_voice_message(audio_file, current_user)
     
     if result and result.get('success', False):
-        # Emit the message to monitoring
-        emit('new_monitored_message', {
+        # Emit the message to monitoring; this is an HTTP request, so emit through the server
+        socketio.emit('new_monitored_message', {
             'id': result.get('message_id'),
             'content': result.get('transcript'),
             'user_email': current_user.email,
@@ -129,7 +208,7 @@ def handle_voice_message():
             'sentiment_label': result.get('sentiment_label'),
             'sentiment_score': result.get('sentiment_score'),
             'sentiment_analysis': result.get('sentiment_analysis')
-        }, broadcast=True)
+        })
         
         return jsonify({
             'success': True,
@@ -148,55 +227,58 @@ def handle_voice_message():
 @login_required
 @admin_required
 def handle_admin_message(data):
+    generation = generation_tracker.begin(request.sid)
     try:
-        # Save admin message
-        message = ChatMessage()
-        message.user_id = current_user.id
-        message.content = data['message']
-        message.is_ai_response = False
-        message.message_type = 'text'
-        db.session.add(message)
-        db.session.commit()
-
-        # Emit the message
-        emit('new_message', {
-            'content': message.content,
-            'timestamp': message.timestamp.isoformat(),
-            'is_ai_response': False,
-            'message_type': 'text'
-        })
-
-        # Get and emit AI response
-        emit('typing_indicator', {'typing': True})
-        ai_response = chat_service.get_ai_response(data['message'], current_user)
-        emit('typing_indicator', {'typing': False})
+        def emit_admin_message(message):
+            emit('new_message', {
+                'content': message.content,
+                'timestamp': message.timestamp.isoformat(),
+                'is_ai_response': False,
+                'message_type': 'text'
+            })
+            emit('typing_indicator', {'typing': True})
 
-        if ai_response:
-            ai_message = ChatMessage()
-            ai_message.user_id = current_user.id
-            ai_message.content = ai_response
-            ai_message.is_ai_response = True
-            ai_message.message_type = 'text'
-            db.session.add(ai_message)
-            db.session.commit()
+        # Get and emit AI response; both messages are saved in one commit
+        with model_scheduler.priority('admin'):
+            message, ai_message = chat_service.chat_turn(
+                data['message'],
+                current_user,
+                on_user_message=emit_admin_message,
+                generation=generation
+            )
 
+        if ai_message:
             emit('new_message', {
-                'content': ai_response,
-                'timestamp': datetime.utcnow().isoformat(),
+                'content': ai_message.content,
+                'timestamp': ai_message.timestamp.isoformat(),
                 'is_ai_response': True,
                 'message_type': 'text'
             })
         else:
             emit('error', {'message': 'Failed to get AI response'})
+    except GenerationCancelled:
+        pass
     except Exception as e:
         emit('error', {'message': f'Failed to process message: {str(e)}'})
+    finally:
+        # A cancelled reply leaves the typing indicator to the newer message (or the closed socket)
+        if not generation.cancelled:
+            emit('typing_indicator', {'typing': False})
+        generation_tracker.finish(generation)
 
 @socketio.on('admin_get_messages')
 @login_required
 @admin_required
+@replica_reads
 def handle_get_messages(data):
     try:
-        query = ChatMessage.query.join(User).order_by(desc(ChatMessage.timestamp))
+        # The listing shows explanations, so load them with the page instead of per row;
+        # notes are only shown in the details view
+        query = ChatMessage.query.join(User).options(
+            contains_eager(ChatMessage.user),
+            undefer(ChatMessage._sentiment_analysis),
+            selectinload(ChatMessage.sentiment_explanation)
+        ).order_by(desc(ChatMessage.timestamp))
 
         if data.get('user_id'):
             query = query.filter(ChatMessage.user_id == data['user_id'])
@@ -214,19 +296,20 @@ def handle_get_messages(data):
             'message_type': msg.message_type,
             'voice_url': msg.voice_url,
             'flagged': msg.flagged,
-            'monitor_notes': msg.monitor_notes,
             'sentiment_label': msg.sentiment_label,
             'sentiment_score': msg.sentiment_score,
             'sentiment_analysis': msg.sentiment_analysis
         } for msg in messages]
 
-        emit('admin_messages', {'messages': message_list})
+        # Only fields this connection has not seen yet are sent
+        emit('admin_messages', monitor_feed.diff(request.sid, message_list))
     except Exception as e:
         emit('error', {'message': f'Failed to fetch messages: {str(e)}'})
 
 @socketio.on('admin_get_message_details')
 @login_required
 @admin_required
+@replica_reads
 def handle_get_message_details(data):
     try:
         message = ChatMessage.query.get(data['message_id'])
@@ -242,7 +325,10 @@ def handle_get_message_details(data):
                 'monitor_notes': message.monitor_notes,
                 'sentiment_label': message.sentiment_label,
                 'sentiment_score': message.sentiment_score,
-                'sentiment_analysis': message.sentiment_analysis
+                'sentiment_analysis': message.sentiment_analysis,
+                'model': message.model,
+                'model_route': message.model_route,
+                'sentiment_model': message.sentiment_model
             }
             emit('admin_message_details', details)
         else:
@@ -258,9 +344,11 @@ def handle_flag_message(data):
 
     message = ChatMessage.query.get(data['message_id'])
     if message:
+        record_flag_change(message, data['flagged'])
         message.flagged = data['flagged']
         db.session.commit()
         log_audit(current_user.id, 'message_flagged', f'Message {message.id} flagged by admin', request.remote_addr)
+        monitor_feed.update(request.sid, message.id, flagged=message.flagged)
         emit('admin_message_updated', {
             'message_id': message.id,
             'flagged': message.flagged
@@ -293,6 +381,7 @@ def toggle_user_active(user_id):
     else:
         user.is_active = not user.is_active
         db.session.commit()
+        user_cache.invalidate(user.id)
         action = 'activated' if user.is_active else 'deactivated'
         log_audit(current_user.id, f'user_{action}', f'User {user.email} {action}', request.remote_addr)
         flash(f'User {action} successfully.', 'success')
@@ -319,6 +408,7 @@ def edit_user(user_id):
             log_audit(current_user.id, 'password_changed', f'Password changed for user {user.email}', request.remote_addr)
             
         db.session.commit()
+        user_cache.invalidate(user.id)
         log_audit(current_user.id, 'user_edited', f'User {user.email} details updated', request.remote_addr)
         flash('User updated successfully.', 'success')
         return redirect(url_for('admin.user_list'))
@@ -334,8 +424,41 @@ def delete_user(user_id):
         flash('You cannot delete your own account.', 'danger')
     else:
         email = user.email
+        delete_user_rollups(user.id)
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         log_audit(current_user.id, 'user_deleted', f'User {email} deleted', request.remote_addr)
         flash('User deleted successfully.', 'success')
-    return redirect(url_for('admin.user_list'))
\ No newline at end of file
+    return redirect(url_for('admin.user_list'))
+
+@admin.cli.command('compact-text')
+@click.option('--batch-size', default=500, show_default=True, help='Messages rewritten per transaction.')
+def compact_text_command(batch_size):
+    """Compress long chat text and deduplicate sentiment explanations saved before they were."""
+    from text_compression import text_compression
+    legacy = ChatMessage._sentiment_analysis.isnot(None)
+    if text_compression.min_bytes:
+        legacy = db.or_(
+            legacy,
+            func.length(ChatMessage._content) >= text_compression.min_bytes,
+            func.length(ChatMessage._monitor_notes) >= text_compression.min_bytes
+        )
+
+    last_id, rewritten = 0, 0
+    while True:
+        messages = ChatMessage.query.options(undefer_group('details')).filter(
+            ChatMessage.id > last_id, legacy
+        ).order_by(ChatMessage.id).limit(batch_size).all()
+        if not messages:
+            break
+        for message in messages:
+            # Assigning through the properties stores each value in its compact form
+            message.content = message.content
+            message.monitor_notes = message.monitor_notes
+            if message._sentiment_analysis is not None:
+                message.sentiment_analysis = message._sentiment_analysis
+        last_id = messages[-1].id
+        rewritten += len(messages)
+        db.session.commit()
+    click.echo(f"Rewrote {rewritten} chat messages")
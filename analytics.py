@@ -0,0 +1,127 @@
+import click
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, jsonify, request
+from flask_login import login_required, current_user
+from sqlalchemy import func, desc
+from extensions import db
+from models import User, ChatMessage, DailyUserStats
+import rollups
+from read_replicas import replica_reads
+from chat_service import chat_service
+from model_router import model_router
+from model_scheduler import model_scheduler
+
+analytics = Blueprint('analytics', __name__)
+
+TREND_DEFAULT_DAYS = 30
+TREND_MAX_DAYS = 365
+
+def staff_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.role not in ['therapist', 'admin']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def trend_window():
+    days = min(max(request.args.get('days', TREND_DEFAULT_DAYS, type=int), 1), TREND_MAX_DAYS)
+    return days, datetime.utcnow().date() - timedelta(days=days - 1)
+
+@analytics.route('/clients')
+@login_required
+@staff_required
+@replica_reads
+def active_clients():
+    """Clients with conversation activity in the window, most recently active first"""
+    days, since = trend_window()
+    rows = db.session.query(
+        User.id,
+        User.email,
+        func.max(DailyUserStats.day),
+        func.sum(DailyUserStats.message_count)
+    ).join(DailyUserStats, DailyUserStats.user_id == User.id).filter(
+        User.role == 'client',
+        DailyUserStats.day >= since
+    ).group_by(User.id, User.email).order_by(desc(func.max(DailyUserStats.day))).limit(200).all()
+
+    return jsonify({'clients': [{
+        'id': user_id,
+        'email': email,
+        'last_active': last_active.isoformat(),
+        'message_count': int(message_count or 0)
+    } for user_id, email, last_active, message_count in rows]})
+
+@analytics.route('/users/<int:user_id>/trend')
+@login_required
+@staff_required
+@replica_reads
+def user_trend(user_id):
+    """Daily rollups for one user; reads at most `days` rows however long the history is"""
+    days, since = trend_window()
+    stats = DailyUserStats.query.filter(
+        DailyUserStats.user_id == user_id,
+        DailyUserStats.day >= since
+    ).order_by(DailyUserStats.day).all()
+
+    return jsonify({
+        'user_id': user_id,
+        'since': since.isoformat(),
+        'days': days,
+        'series': [{
+            'day': row.day.isoformat(),
+            'message_count': row.message_count,
+            'voice_ratio': round(row.voice_count / row.message_count, 3) if row.message_count else 0.0,
+            'flagged_count': row.flagged_count,
+            'sentiment_mean': round(row.sentiment_mean, 3) if row.sentiment_mean is not None else None,
+            'sentiment_min': row.sentiment_min
+        } for row in stats]
+    })
+
+@analytics.cli.command('backfill')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Only rebuild these users (repeatable).')
+@click.option('--chunk-size', default=100000, show_default=True, help='Chat messages read per chunk.')
+def backfill_command(user_ids, chunk_size):
+    """Rebuild daily rollups from the full chat history."""
+    written = rollups.backfill(user_ids=list(user_ids) or None, chunksize=chunk_size)
+    click.echo(f"Wrote {written} daily rollups")
+
+@analytics.cli.command('reanalyze-sentiment')
+@click.option('--days', default=30, show_default=True, help='Only replies from the last this many days.')
+@click.option('--limit', default=1000, show_default=True, help='Most replies analysed in one run.')
+def reanalyze_sentiment_command(days, limit):
+    """Analyse sentiment for replies saved without it, e.g. after the sentiment call failed.
+
+    Runs in the background model class, so it only takes slots interactive chat leaves free.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    replies = ChatMessage.query.filter(
+        ChatMessage.is_ai_response.is_(True),
+        ChatMessage.sentiment_score.is_(None),
+        ChatMessage.timestamp >= since
+    ).order_by(ChatMessage.id).limit(limit).all()
+
+    analysed = 0
+    with model_scheduler.priority('background'):
+        for reply in replies:
+            # chat_turn saves the user's message just before its reply
+            prompt = ChatMessage.query.filter(
+                ChatMessage.user_id == reply.user_id,
+                ChatMessage.is_ai_response.is_(False),
+                ChatMessage.id < reply.id
+            ).order_by(ChatMessage.id.desc()).first()
+            if prompt is None:
+                continue
+            route = model_router.route('sentiment', prompt.content)
+            result = chat_service.analyze_sentiment(prompt.content, route)
+            if not result or result.get('sentiment_score') is None:
+                continue
+            reply.sentiment_score = result.get('sentiment_score')
+            reply.sentiment_label = result.get('sentiment_label')
+            reply.sentiment_analysis = result.get('sentiment_analysis')
+            reply.sentiment_model = route.model
+            rollups.record_sentiment(prompt, reply.sentiment_score)
+            db.session.commit()
+            analysed += 1
+    click.echo(f"Analysed sentiment for {analysed} of {len(replies)} replies")
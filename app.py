@@ -1,181 +1,140 @@
 import eventlet
 eventlet.monkey_patch()
-
-from flask import Flask, render_template, redirect, url_for, session, request, jsonify, send_from_directory
-from flask_login import current_user, login_required
-from flask_socketio import emit
-from datetime import datetime, timedelta
+try:
+    # psycopg2 blocks the whole eventlet hub while it waits on the server unless its waits are patched
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+except ImportError:
+    pass
+
+from flask import Flask
 from config import Config
-from extensions import db, login_manager, session as flask_session, socketio
-from models import User, ChatMessage
+from extensions import db, login_manager, session as flask_session, socketio, migrate
+from flask_migrate import upgrade
+from models import User
 from auth import auth
 from admin import admin
-from chat_service import ChatService
+from main import main
+from analytics import analytics
+from user_cache import user_cache
+from password_service import password_hasher
+from email_service import mail_queue
+from audio_storage import audio_store
+from voice_upload import voice_uploads
+from audio_preprocessing import voice_preprocessor
+from response_cache import response_cache
+from health import health_probe
+from text_compression import text_compression
+from read_replicas import replica_router
+from idempotency import idempotency_store
+from model_scheduler import model_scheduler
+from model_router import model_router
+from static_assets import static_assets
+import importlib.util
 import os
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize database with retry logic
-Config.init_db(app)
-
-# Initialize extensions
-db.init_app(app)
-login_manager.init_app(app)
-flask_session.init_app(app)
-socketio.init_app(app, 
-    cors_allowed_origins="*", 
-    async_mode='eventlet',
-    ping_timeout=30,
-    ping_interval=15,
-    reconnection=True,
-    reconnection_attempts=5,
-    reconnection_delay=1000,
-    reconnection_delay_max=5000
-)
-chat_service = ChatService()
-
-login_manager.login_view = 'auth.login'
-
-@login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-app.register_blueprint(auth, url_prefix='/auth')
-app.register_blueprint(admin, url_prefix='/admin')
-
-@app.before_request
-def before_request():
-    if current_user.is_authenticated:
-        session.permanent = True
-        app.permanent_session_lifetime = timedelta(minutes=30)
-
-@app.route('/')
-def index():
-    if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('auth.login'))
-
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    if current_user.role == 'admin':
-        users = User.query.all()
-        return render_template('dashboard/admin.html', users=users)
-    else:
-        chat_messages = ChatMessage.query.filter_by(user_id=current_user.id).order_by(ChatMessage.timestamp.desc()).all()
-        messages = [{
-            'content': msg.content,
-            'timestamp': msg.timestamp,
-            'is_ai_response': msg.is_ai_response
-        } for msg in chat_messages]
-        if current_user.role == 'therapist':
-            return render_template('dashboard/therapist.html', messages=messages)
-        else:
-            return render_template('dashboard/client.html', messages=messages)
-
-@app.route('/voice-message', methods=['POST'])
-@login_required
-def handle_voice_message():
-    try:
-        if current_user.role not in ['client', 'therapist', 'admin']:
-            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
-        
-        if 'audio' not in request.files:
-            return jsonify({'success': False, 'error': 'No audio file provided'}), 400
-        
-        audio_file = request.files['audio']
-        if not audio_file or not audio_file.filename:
-            return jsonify({'success': False, 'error': 'Empty audio file'}), 400
-        
-        # Process the voice message
-        result = chat_service.process_voice_message(audio_file, current_user)
-        
-        if result and result.get('success', False):
-            return jsonify({
-                'success': True,
-                'transcript': result.get('transcript'),
-                'ai_response': result.get('ai_response'),
-                'ai_audio_url': result.get('ai_audio_url')
-            })
-        
-        return jsonify({
-            'success': False,
-            'error': result.get('error', 'Failed to process voice message')
-        }), 500
-        
-    except Exception as e:
-        app.logger.error(f"Error in handle_voice_message: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': f'An unexpected error occurred: {str(e)}'
-        }), 500
-
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    static_dir = app.static_folder or 'static'
-    return send_from_directory(static_dir, filename)
-
-@socketio.on('connect')
-def handle_connect():
-    if not current_user.is_authenticated:
-        return False
-    app.logger.info(f"User {current_user.email} connected")
-    return True
+    user_id = int(user_id)
+    return user_cache.get(user_id, lambda: User.query.get(user_id))
+
+def create_app(config_class=Config):
+    """Build the app. Nothing here connects to the database or to OpenAI."""
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    # Initialize extensions; replicas are registered as binds before the engines are built
+    replica_router.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db, directory=os.path.join(app.root_path, 'migrations'))
+    login_manager.init_app(app)
+    flask_session.init_app(app)
+    if app.config['SOCKETIO_SERIALIZER'] == 'msgpack' and importlib.util.find_spec('msgpack') is None:
+        app.logger.warning("SOCKETIO_SERIALIZER is msgpack but the msgpack package is not installed; using JSON")
+        app.config['SOCKETIO_SERIALIZER'] = 'json'
+    socketio.init_app(app, 
+        serializer='msgpack' if app.config['SOCKETIO_SERIALIZER'] == 'msgpack' else 'default',
+        http_compression=True,
+        compression_threshold=app.config['SOCKETIO_COMPRESSION_THRESHOLD'],
+        cors_allowed_origins="*", 
+        async_mode='eventlet',
+        ping_timeout=30,
+        ping_interval=15,
+        reconnection=True,
+        reconnection_attempts=5,
+        reconnection_delay=1000,
+        reconnection_delay_max=5000
+    )
+    user_cache.configure(ttl=app.config['USER_CACHE_TTL'], max_entries=app.config['USER_CACHE_MAX_ENTRIES'])
+    response_cache.configure(
+        enabled=app.config['RESPONSE_CACHE_ENABLED'],
+        ttl=app.config['RESPONSE_CACHE_TTL'],
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        similarity_threshold=app.config['RESPONSE_CACHE_SIMILARITY'],
+        max_prompt_chars=app.config['RESPONSE_CACHE_MAX_PROMPT_CHARS'],
+        bypass_user_ids=app.config['RESPONSE_CACHE_BYPASS_USERS']
+    )
+    text_compression.configure(min_bytes=app.config['TEXT_COMPRESSION_MIN_BYTES'], level=app.config['TEXT_COMPRESSION_LEVEL'])
+    idempotency_store.configure(
+        ttl=app.config['IDEMPOTENCY_TTL'],
+        wait_timeout=app.config['IDEMPOTENCY_WAIT_TIMEOUT'],
+        reconnect_grace=app.config['IDEMPOTENCY_RECONNECT_GRACE']
+    )
+    model_scheduler.configure(
+        max_concurrency=app.config['MODEL_MAX_CONCURRENCY'],
+        shares=app.config['MODEL_CLASS_SHARES'],
+        deadlines=app.config['MODEL_CLASS_DEADLINES']
+    )
+    model_router.configure(
+        enabled=app.config['MODEL_ROUTING_ENABLED'],
+        strong_model=app.config['MODEL_STRONG'],
+        fast_model=app.config['MODEL_FAST'],
+        sentiment_model=app.config['MODEL_SENTIMENT'],
+        short_chars=app.config['MODEL_SHORT_MESSAGE_CHARS'],
+        budgets=app.config['MODEL_LATENCY_BUDGETS'],
+        costs=app.config['MODEL_COSTS'],
+        window=app.config['MODEL_LATENCY_WINDOW_SECONDS'],
+        min_samples=app.config['MODEL_LATENCY_MIN_SAMPLES']
+    )
+    password_hasher.configure(method=app.config['PASSWORD_HASH_METHOD'], workers=app.config['PASSWORD_HASH_WORKERS'])
+    mail_queue.init_app(app)
+    audio_store.init_app(app)
+    static_assets.init_app(app)
+    health_probe.init_app(app)
+    voice_uploads.configure(
+        max_duration=app.config['VOICE_MAX_DURATION_SECONDS'],
+        max_bitrate=app.config['VOICE_MAX_BITRATE'],
+        max_chunk_bytes=app.config['VOICE_MAX_CHUNK_BYTES'],
+        buffer_bytes=app.config['VOICE_UPLOAD_BUFFER_BYTES'],
+        ttl=app.config['VOICE_UPLOAD_TTL']
+    )
+    voice_preprocessor.configure(
+        enabled=app.config['VOICE_VAD_ENABLED'],
+        floor_db=app.config['VOICE_VAD_FLOOR_DB'],
+        padding_ms=app.config['VOICE_VAD_PADDING_MS'],
+        max_pause_ms=app.config['VOICE_VAD_MAX_PAUSE_MS'],
+        min_speech_ms=app.config['VOICE_VAD_MIN_SPEECH_MS'],
+        bitrate=app.config['VOICE_TRANSCODE_BITRATE']
+    )
 
-@socketio.on('disconnect')
-def handle_disconnect():
-    if current_user.is_authenticated:
-        app.logger.info(f"User {current_user.email} disconnected")
+    login_manager.login_view = 'auth.login'
+    login_manager.user_loader(load_user)
 
-@socketio.on_error()
-def error_handler(e):
-    app.logger.error(f"SocketIO error: {str(e)}")
-    return False
+    app.register_blueprint(main)
+    app.register_blueprint(auth, url_prefix='/auth')
+    app.register_blueprint(admin, url_prefix='/admin')
+    app.register_blueprint(analytics, url_prefix='/analytics')
+    return app
 
-@socketio.on('send_message')
-def handle_message(data):
-    if not current_user.is_authenticated or current_user.role not in ['client', 'therapist']:
-        emit('error', {'message': 'Unauthorized'})
-        return
-    
-    try:
-        # Save user message
-        user_message = ChatMessage()
-        user_message.user_id = current_user.id
-        user_message.is_ai_response = False
-        user_message.content = data['message']
-        db.session.add(user_message)
-        db.session.commit()
-        
-        # Emit the user message
-        emit('new_message', {
-            'content': data['message'],
-            'timestamp': user_message.timestamp.isoformat(),
-            'is_ai_response': False
-        })
-        
-        # Get and emit AI response
-        emit('typing_indicator', {'typing': True})
-        ai_response = chat_service.get_ai_response(data['message'], current_user)
-        emit('typing_indicator', {'typing': False})
-        
-        if ai_response:
-            emit('new_message', {
-                'content': ai_response,
-                'timestamp': datetime.utcnow().isoformat(),
-                'is_ai_response': True
-            })
-        else:
-            emit('error', {'message': 'Failed to get AI response'})
-        
-    except Exception as e:
-        app.logger.error(f"Error in handle_message: {str(e)}")
-        emit('error', {'message': 'Failed to process message'})
+app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade()
+    # Drain anything queued before the last restart
+    mail_queue.start()
+    audio_store.start_cleanup()
+    health_probe.start()
+    replica_router.start()
     socketio.run(app, 
         host='0.0.0.0',
         port=5000,
@@ -0,0 +1,137 @@
+import io
+import time
+import numpy as np
+
+# Decoder to pass to ffmpeg per container; naming the codec also stops pydub shelling out to ffprobe
+SOURCE_CODECS = {
+    'webm': 'opus',
+    'ogg': 'opus',
+    'mp3': 'mp3',
+    'wav': None,
+}
+
+class NoSpeechError(ValueError):
+    pass
+
+def frame_energies(samples, frame_length, full_scale):
+    """dBFS of each non-overlapping frame of a 1-D sample array"""
+    n_frames = len(samples) // frame_length
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n_frames * frame_length].reshape(n_frames, frame_length).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(rms / full_scale + 1e-10)
+
+def speech_threshold(energies, floor_db=-45.0, noise_margin_db=10.0):
+    """Energy threshold separating speech from background for one recording.
+
+    It adapts to the recording's noise floor (its quietest frames) but never drops
+    below floor_db or rises so high that it would cut the loudest speech.
+    """
+    noise_floor = np.percentile(energies, 10)
+    peak = np.percentile(energies, 95)
+    return max(floor_db, min(noise_floor + noise_margin_db, peak - 20))
+
+def pad_mask(mask, padding_frames):
+    """Widen each run of speech frames by padding_frames on both sides so word edges survive"""
+    if padding_frames <= 0 or not mask.any():
+        return mask
+    kernel = np.ones(2 * padding_frames + 1, dtype=np.int32)
+    return np.convolve(mask.astype(np.int32), kernel, mode='same') > 0
+
+def keep_frames(mask, max_pause_frames):
+    """Frames to keep: speech plus at most max_pause_frames of each internal pause.
+
+    Leading and trailing silence is dropped entirely.
+    """
+    keep = mask.copy()
+    speech = np.flatnonzero(mask)
+    if speech.size == 0:
+        return keep
+    # Runs of silence between two speech frames
+    gaps = np.flatnonzero(np.diff(speech) > 1)
+    for gap in gaps:
+        start, end = speech[gap] + 1, speech[gap + 1]
+        length = end - start
+        if length <= max_pause_frames:
+            keep[start:end] = True
+        else:
+            head = max_pause_frames // 2
+            keep[start:start + head] = True
+            keep[end - (max_pause_frames - head):end] = True
+    return keep
+
+class VoicePreprocessor:
+    """Strips silence from recordings before they are sent for transcription"""
+
+    def __init__(self, enabled=True, frame_ms=30, floor_db=-45.0, noise_margin_db=10.0,
+                 padding_ms=200, max_pause_ms=600, min_speech_ms=250, sample_rate=16000, bitrate='24k'):
+        self.enabled = enabled
+        self.frame_ms = frame_ms
+        self.floor_db = floor_db
+        self.noise_margin_db = noise_margin_db
+        self.padding_ms = padding_ms
+        self.max_pause_ms = max_pause_ms
+        self.min_speech_ms = min_speech_ms
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise AttributeError(f"Unknown preprocessing option: {name}")
+            setattr(self, name, value)
+
+    def decode(self, audio_bytes, source_format):
+        from pydub import AudioSegment
+
+        segment = AudioSegment.from_file(
+            io.BytesIO(audio_bytes),
+            format=source_format,
+            codec=SOURCE_CODECS.get(source_format)
+        )
+        # Whisper works at 16 kHz mono; resampling first makes every later step cheaper
+        return segment.set_channels(1).set_frame_rate(self.sample_rate).set_sample_width(2)
+
+    def trim(self, segment):
+        """Return segment with leading/trailing silence removed and long pauses shortened"""
+        samples = np.frombuffer(segment.raw_data, dtype=np.int16)
+        frame_length = int(segment.frame_rate * self.frame_ms / 1000)
+        energies = frame_energies(samples, frame_length, 32768.0)
+        if energies.size == 0:
+            raise NoSpeechError("No speech detected in the recording")
+
+        speech = energies > speech_threshold(energies, self.floor_db, self.noise_margin_db)
+        if np.count_nonzero(speech) * self.frame_ms < self.min_speech_ms:
+            raise NoSpeechError("No speech detected in the recording")
+
+        mask = pad_mask(speech, self.padding_ms // self.frame_ms)
+        keep = keep_frames(mask, self.max_pause_ms // self.frame_ms)
+        kept_samples = samples[:keep.size * frame_length].reshape(keep.size, frame_length)[keep].ravel()
+        return segment._spawn(kept_samples.tobytes())
+
+    def encode(self, segment):
+        buffer = io.BytesIO()
+        segment.export(buffer, format='ogg', codec='libopus', bitrate=self.bitrate)
+        return buffer.getvalue()
+
+    def process(self, audio_bytes, source_format='webm'):
+        """Return (audio_bytes, format, stats) ready for transcription.
+
+        Raises NoSpeechError if the recording holds no speech.
+        """
+        start = time.perf_counter()
+        segment = self.decode(audio_bytes, source_format)
+        original_ms = len(segment)
+        trimmed = self.trim(segment)
+        encoded = self.encode(trimmed)
+        stats = {
+            'original_bytes': len(audio_bytes),
+            'processed_bytes': len(encoded),
+            'original_ms': original_ms,
+            'processed_ms': len(trimmed),
+            'processing_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+        return encoded, 'ogg', stats
+
+voice_preprocessor = VoicePreprocessor()
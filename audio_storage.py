@@ -0,0 +1,240 @@
+import os
+import time
+import uuid
+import json
+import traceback
+import mimetypes
+from datetime import datetime
+from flask import current_app, send_file, redirect, abort
+from werkzeug.security import safe_join
+from extensions import db, socketio
+from models import ChatMessage
+
+AUDIO_CONTENT_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'webm': 'audio/webm',
+    'ogg': 'audio/ogg',
+}
+# Keys per UPDATE when clearing the voice_url of evicted audio
+FORGET_BATCH_SIZE = 500
+
+def generate_key(prefix, extension, shard_depth):
+    """Build a unique storage key, sharded by the leading hex digits of a UUID"""
+    unique_id = uuid.uuid4().hex
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    shards = [unique_id[i * 2:i * 2 + 2] for i in range(shard_depth)]
+    return '/'.join(shards + [f'{prefix}_{timestamp}_{unique_id}.{extension}'])
+
+class LocalAudioStorage:
+    def __init__(self, root, shard_depth=2):
+        self.root = os.path.abspath(root)
+        self.shard_depth = shard_depth
+
+    def save(self, data, prefix, extension):
+        key = generate_key(prefix, extension, self.shard_depth)
+        path = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name so a half-written file is never served
+        temp_path = f'{path}.part'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return key
+
+    def delete(self, key):
+        path = self._path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def list_objects(self):
+        """Yield (key, size, modified_timestamp) for every stored object"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.part'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield key, stat.st_size, stat.st_mtime
+
+    def serve(self, key, max_age):
+        path = self._path(key)
+        if not path or not os.path.isfile(path):
+            abort(404)
+        # conditional=True gives ETag, If-None-Match/If-Modified-Since and Range support;
+        # with USE_X_SENDFILE the front-end server streams the bytes instead of this worker
+        response = send_file(path, mimetype=content_type_for(key), conditional=True, etag=True, max_age=max_age)
+        response.headers['Cache-Control'] = f'private, max-age={max_age}, immutable'
+        return response
+
+    def prune_empty_directories(self):
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            if dirpath != self.root and not dirnames and not filenames:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def _path(self, key):
+        return safe_join(self.root, key)
+
+class ObjectStoreAudioStorage:
+    """S3-compatible storage. Point AUDIO_S3_ENDPOINT_URL at MinIO for a local stand-in."""
+
+    def __init__(self, bucket, prefix='voice_messages', endpoint_url=None, url_expires=3600, shard_depth=2):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.url_expires = url_expires
+        self.shard_depth = shard_depth
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def save(self, data, prefix, extension):
+        key = generate_key(prefix, extension, self.shard_depth)
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+            ContentType=content_type_for(key),
+            CacheControl='private, max-age=31536000, immutable'
+        )
+        return key
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def list_objects(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'{self.prefix}/'):
+            for obj in page.get('Contents', []):
+                key = obj['Key'][len(self.prefix) + 1:]
+                yield key, obj['Size'], obj['LastModified'].timestamp()
+
+    def serve(self, key, max_age):
+        # The object store serves the bytes (with its own Range and ETag support);
+        # the app only signs a short-lived URL
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._object_key(key)},
+            ExpiresIn=self.url_expires
+        )
+        response = redirect(url)
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+
+    def prune_empty_directories(self):
+        pass
+
+    def _object_key(self, key):
+        if '..' in key.split('/'):
+            abort(404)
+        return f'{self.prefix}/{key}'
+
+def content_type_for(key):
+    extension = key.rsplit('.', 1)[-1].lower()
+    return AUDIO_CONTENT_TYPES.get(extension) or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+class AudioStore:
+    """Application-facing wrapper that picks a backend from config and runs lifecycle cleanup"""
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self._cleanup_started = False
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        if config['AUDIO_STORAGE_BACKEND'] == 's3':
+            self.backend = ObjectStoreAudioStorage(
+                bucket=config['AUDIO_S3_BUCKET'],
+                prefix=config['AUDIO_S3_PREFIX'],
+                endpoint_url=config['AUDIO_S3_ENDPOINT_URL'],
+                url_expires=config['AUDIO_S3_URL_EXPIRES'],
+                shard_depth=config['AUDIO_STORAGE_SHARD_DEPTH']
+            )
+        elif config['AUDIO_STORAGE_BACKEND'] == 'local':
+            self.backend = LocalAudioStorage(config['AUDIO_STORAGE_DIR'], config['AUDIO_STORAGE_SHARD_DEPTH'])
+        else:
+            raise ValueError(f"Unknown audio storage backend: {config['AUDIO_STORAGE_BACKEND']}")
+
+    def save(self, data, prefix='ai_response', extension='mp3'):
+        """Store audio bytes and return the URL clients should fetch them from"""
+        key = self.backend.save(data, prefix, extension)
+        return self.url_for(key)
+
+    def url_for(self, key):
+        return f'/audio/{key}'
+
+    def serve(self, key):
+        return self.backend.serve(key, self.app.config['AUDIO_CACHE_MAX_AGE'])
+
+    def cleanup(self, ttl=None, quota_bytes=None):
+        """Delete audio older than ttl seconds, then the oldest audio until under quota_bytes"""
+        config = self.app.config
+        ttl = config['AUDIO_TTL_SECONDS'] if ttl is None else ttl
+        quota_bytes = config['AUDIO_QUOTA_BYTES'] if quota_bytes is None else quota_bytes
+        cutoff = time.time() - ttl if ttl else None
+
+        kept = []
+        evicted = []
+        for key, size, modified in self.backend.list_objects():
+            if cutoff is not None and modified < cutoff:
+                evicted.append(key)
+            else:
+                kept.append((modified, size, key))
+
+        if quota_bytes:
+            total = sum(size for _, size, _ in kept)
+            kept.sort()
+            for modified, size, key in kept:
+                if total <= quota_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+
+        # Unlink the messages first so none is left pointing at audio that is gone
+        self._forget(evicted)
+        for key in evicted:
+            self.backend.delete(key)
+
+        self.backend.prune_empty_directories()
+        return len(evicted)
+
+    def _forget(self, keys):
+        for start in range(0, len(keys), FORGET_BATCH_SIZE):
+            urls = [self.url_for(key) for key in keys[start:start + FORGET_BATCH_SIZE]]
+            ChatMessage.query.filter(ChatMessage.voice_url.in_(urls)).update(
+                {'voice_url': None}, synchronize_session=False
+            )
+            db.session.commit()
+
+    def start_cleanup(self):
+        if self._cleanup_started or self.app is None or not self.app.config['AUDIO_CLEANUP_INTERVAL']:
+            return
+        self._cleanup_started = True
+        socketio.start_background_task(self._run_cleanup)
+
+    def _run_cleanup(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    deleted = self.cleanup()
+                    if deleted:
+                        current_app.logger.info(f"Audio cleanup deleted {deleted} files")
+                except Exception as e:
+                    error_context = {
+                        'error_type': type(e).__name__,
+                        'error_message': str(e),
+                        'traceback': traceback.format_exc(),
+                        'timestamp': datetime.utcnow().isoformat()
+                    }
+                    current_app.logger.error(f"Error cleaning up audio storage: {json.dumps(error_context)}")
+            socketio.sleep(self.app.config['AUDIO_CLEANUP_INTERVAL'])
+
+audio_store = AudioStore()
@@ -5,14 +5,15 @@ from forms import LoginForm, RegistrationForm
 from extensions import db
 from datetime import datetime, timedelta
 from utils import log_audit
-from email_service import send_verification_email
+from email_service import queue_verification_email, mail_queue
+from user_cache import user_cache
 
 auth = Blueprint('auth', __name__)
 
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
         
     form = LoginForm()
     if form.validate_on_submit():
@@ -27,12 +28,15 @@ def login():
                 return render_template('auth/login.html', form=form)
                 
             login_user(user)
+            if user.password_needs_rehash():
+                # Upgrade hashes made with older work factors while we have the plaintext
+                user.set_password(form.password.data)
             user.failed_login_attempts = 0
             user.last_login = datetime.utcnow()
             db.session.commit()
             
             log_audit(user.id, 'login', 'Successful login', request.remote_addr)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             if user:
                 user.failed_login_attempts += 1
@@ -44,7 +48,7 @@ def login():
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
         
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -61,17 +65,16 @@ def register():
         user.set_password(form.password.data)
         verification_token = user.generate_verification_token()
         
+        # The user and their verification email are committed together; the mail
+        # queue delivers it in the background and retries if SendGrid is down
         db.session.add(user)
+        queue_verification_email(user.email, verification_token)
         db.session.commit()
+        mail_queue.notify()
         
-        if send_verification_email(user.email, verification_token):
-            flash('Registration successful! Please check your email to verify your account.', 'success')
-            log_audit(user.id, 'register', 'User registered', request.remote_addr)
-            return redirect(url_for('auth.login'))
-        else:
-            db.session.delete(user)
-            db.session.commit()
-            flash('Failed to send verification email. Please try again.', 'danger')
+        flash('Registration successful! Please check your email to verify your account.', 'success')
+        log_audit(user.id, 'register', 'User registered', request.remote_addr)
+        return redirect(url_for('auth.login'))
             
     return render_template('auth/register.html', form=form)
 
@@ -91,6 +94,7 @@ def verify_email(token):
     user.verification_token = None
     user.verification_token_expires = None
     db.session.commit()
+    user_cache.invalidate(user.id)
     
     log_audit(user.id, 'verify_email', 'Email verified', request.remote_addr)
     flash('Email verified successfully! You can now login.', 'success')
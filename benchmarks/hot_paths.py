@@ -0,0 +1,442 @@
+"""Time the chat and monitoring hot paths against seeded SQLite databases.
+
+    python benchmarks/hot_paths.py [--sizes 10000 100000 1000000] [--repeat 15]
+        [--only NAME ...] [--save-baseline [PATH]] [--baseline PATH]
+        [--max-regression 0.25] [--threshold NAME=RATIO ...] [--json]
+
+Everything runs offline. OpenAI is replaced by a stub that returns canned
+replies, and each size gets its own SQLite database, seeded once and cached
+under benchmarks/.data (--reseed rebuilds it). Each size runs in a fresh
+interpreter because the app reads its configuration at import.
+
+Medians are compared with the baseline (benchmarks/baseline.json by default,
+when it exists). The run exits with status 1 if any benchmark is slower than
+--max-regression allows, or slower than its own --threshold. Baselines are
+machine specific, so save one on the machine that runs the comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, '.data')
+SAMPLES_DIR = os.path.join(ROOT, 'samples', 'voice')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_SIZES = [10000, 100000, 1000000]
+SEED_VERSION = 3
+
+CHAT_REPLY = (
+    "It sounds like this week has been a lot to carry. What felt hardest about it, "
+    "and what helped, even a little?"
+)
+SENTIMENT_REPLY = json.dumps({
+    'sentiment_score': -0.35,
+    'sentiment_label': 'Negative',
+    'sentiment_analysis': 'The message describes ongoing stress at work with some hope of improvement.'
+})
+TRANSCRIPT = "I have been feeling a little better this week, but work is still stressful."
+
+# --- Stubbed OpenAI client --------------------------------------------------
+
+class StubOpenAI:
+    """Canned OpenAI responses, so the numbers measure this app and not the API"""
+
+    def __init__(self, speech_bytes):
+        self.speech_bytes = speech_bytes
+        self.sentiment_reply = SENTIMENT_REPLY
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+        self.audio = SimpleNamespace(
+            transcriptions=SimpleNamespace(create=lambda **kwargs: TRANSCRIPT),
+            speech=SimpleNamespace(create=lambda **kwargs: SimpleNamespace(content=self.speech_bytes))
+        )
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _complete(self, model, messages, **kwargs):
+        content = self.sentiment_reply if 'sentiment' in messages[0]['content'] else CHAT_REPLY
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+# --- Worker: one size, one interpreter --------------------------------------
+
+def database_path(size):
+    return os.path.join(DATA_DIR, f'messages_{size}_v{SEED_VERSION}.db')
+
+def configure_environment(database, scratch):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    os.environ['MAIL_TRANSPORT'] = 'file'
+    os.environ['MAIL_FILE_DIR'] = os.path.join(scratch, 'outbox')
+    os.environ['AUDIO_STORAGE_DIR'] = os.path.join(scratch, 'voice_storage')
+    os.environ['SESSION_FILE_DIR'] = os.path.join(scratch, 'flask_session')
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+    os.environ['STT_BACKEND'] = 'openai'
+    os.environ['TTS_BACKEND'] = 'openai'
+    os.environ['RESPONSE_CACHE_ENABLED'] = 'false'
+    os.environ.pop('DATABASE_REPLICA_URLS', None)
+
+def seed(size, db, models, text_compression):
+    """Fill a fresh database with `size` chat messages spread over 180 days"""
+    rng = random.Random(size)
+    User, ChatMessage, AuditLog, SentimentExplanation = (
+        models.User, models.ChatMessage, models.AuditLog, models.SentimentExplanation
+    )
+    db.create_all()
+
+    admin = User(email='admin@bench.example.com', role='admin', is_active=True, email_verified=True, failed_login_attempts=0)
+    admin.set_password('Bench-passw0rd!')
+    db.session.add(admin)
+    client_count = max(20, size // 1000)
+    db.session.execute(db.insert(User.__table__), [{
+        'email': f'client{index}@bench.example.com',
+        'password_hash': 'unusable',
+        'role': 'client' if index % 10 else 'therapist',
+        'is_active': True,
+        'email_verified': True,
+        'failed_login_attempts': 0,
+        'created_at': datetime.utcnow() - timedelta(days=rng.randint(0, 365))
+    } for index in range(client_count)])
+    db.session.commit()
+    client_ids = [row[0] for row in db.session.execute(db.select(User.id).where(User.role == 'client'))]
+    # The benchmarked client has a typical share of the history
+    bench_client = db.session.get(User, client_ids[0])
+    bench_client.set_password('Bench-passw0rd!')
+
+    explanation_ids = []
+    for index in range(200):
+        explanation = SentimentExplanation.for_text(f'Explanation {index}: the message reads as {rng.choice(["hopeful", "anxious", "flat", "frustrated"])}.')
+        db.session.flush()
+        explanation_ids.append(explanation.id)
+    db.session.commit()
+
+    words = 'I feel work sleep family better worse today week anxious calm talk session help'.split()
+    long_text = ' '.join(rng.choice(words) for _ in range(400))
+    now = datetime.utcnow()
+    batch = []
+    for index in range(size):
+        is_ai = index % 2 == 1
+        content = long_text if index % 50 == 0 else ' '.join(rng.choice(words) for _ in range(rng.randint(5, 60)))
+        plain, compressed = text_compression.encode(content)
+        score = round(rng.uniform(-1, 1), 2) if is_ai else None
+        batch.append({
+            'user_id': client_ids[(index // 2) % len(client_ids)],
+            'content': plain,
+            'content_zlib': compressed,
+            'is_ai_response': is_ai,
+            'timestamp': now - timedelta(seconds=rng.randint(0, 180 * 86400)),
+            'message_type': 'voice' if index % 7 == 0 else 'text',
+            'voice_url': f'/audio/bench/{index}.mp3' if is_ai and index % 7 == 1 else None,
+            'monitored': False,
+            'flagged': index % 100 == 0,
+            'sentiment_score': score,
+            'sentiment_label': ('Positive' if score > 0.2 else 'Negative' if score < -0.2 else 'Neutral') if is_ai else None,
+            'sentiment_explanation_id': rng.choice(explanation_ids) if is_ai else None
+        })
+        if len(batch) == 20000:
+            db.session.execute(db.insert(ChatMessage.__table__), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(ChatMessage.__table__), batch)
+
+    actions = ['login', 'logout', 'message_flagged', 'user_updated', 'registration']
+    db.session.execute(db.insert(AuditLog.__table__), [{
+        'user_id': rng.choice(client_ids),
+        'action': rng.choice(actions),
+        'details': 'seeded',
+        'timestamp': now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+        'ip_address': '127.0.0.1'
+    } for _ in range(max(1000, size // 10))])
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'min_ms': round(timings[0], 3),
+        'runs': repeat
+    }
+
+def login(app, email):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'email': email, 'password': 'Bench-passw0rd!'})
+    if response.status_code not in (200, 302):
+        raise RuntimeError(f'Benchmark login failed for {email}: {response.status_code}')
+    return client
+
+def seed_worker(size):
+    scratch = tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = database_path(size)
+    if os.path.exists(path):
+        os.remove(path)
+    configure_environment(path + '.tmp', scratch)
+
+    import app as app_module
+    import models
+    from extensions import db
+    from text_compression import text_compression
+
+    started = time.perf_counter()
+    with app_module.app.app_context():
+        seed(size, db, models, text_compression)
+        db.engine.dispose()
+    os.replace(path + '.tmp', path)
+    print(f'  seeded {size} messages in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+def run_worker(size, repeat, only):
+    import logging
+    # Benchmarks write (audit logs, voice turns), so each run works on a copy of the seeded database
+    scratch = tempfile.mkdtemp(prefix='bench_')
+    database = os.path.join(scratch, 'bench.db')
+    shutil.copyfile(database_path(size), database)
+    configure_environment(database, scratch)
+
+    import app as app_module
+    import models
+    from extensions import db, socketio
+    from chat_service import chat_service
+    from monitor_feed import monitor_feed
+    from utils import log_audit
+    from werkzeug.datastructures import FileStorage
+    import vad_benchmark
+
+    app = app_module.app
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SESSION_COOKIE_SECURE'] = False
+    app.logger.setLevel(logging.WARNING)
+    speech_bytes = b''
+    mp3_samples = sorted(name for name in os.listdir(SAMPLES_DIR) if name.endswith('.mp3'))
+    if mp3_samples:
+        with open(os.path.join(SAMPLES_DIR, mp3_samples[0]), 'rb') as f:
+            speech_bytes = f.read()
+    stub = StubOpenAI(speech_bytes or b'ID3' + b'\0' * 4096)
+    chat_service._client = stub
+
+    benchmarks = {}
+
+    def benchmark(name):
+        def register(fn):
+            if not only or name in only:
+                benchmarks[name] = fn
+            return fn
+        return register
+
+    with app.app_context():
+        client_email = db.session.execute(
+            db.select(models.User.email).where(models.User.role == 'client').order_by(models.User.id).limit(1)
+        ).scalar()
+        client_id = db.session.execute(db.select(models.User.id).where(models.User.email == client_email)).scalar()
+    client_http = login(app, client_email)
+    admin_http = login(app, 'admin@bench.example.com')
+
+    @benchmark('dashboard_history')
+    def dashboard_history():
+        response = client_http.get('/dashboard')
+        assert response.status_code == 200, response.status_code
+
+    admin_socket = socketio.test_client(app, flask_test_client=admin_http)
+    admin_sid = socketio.server.manager.sid_from_eio_sid(admin_socket.eio_sid, '/')
+
+    @benchmark('admin_messages_full')
+    def admin_messages_full():
+        monitor_feed.forget(admin_sid)
+        admin_socket.emit('admin_get_messages', {})
+        assert any(r['name'] == 'admin_messages' for r in admin_socket.get_received())
+
+    @benchmark('admin_messages_refresh')
+    def admin_messages_refresh():
+        admin_socket.emit('admin_get_messages', {})
+        assert any(r['name'] == 'admin_messages' for r in admin_socket.get_received())
+
+    @benchmark('system_status')
+    def system_status():
+        response = admin_http.get('/admin/system-status')
+        assert response.status_code == 200, response.status_code
+
+    @benchmark('log_audit_x100')
+    def log_audit_x100():
+        with app.test_request_context():
+            for _ in range(100):
+                log_audit(client_id, 'benchmark', 'log_audit throughput', '127.0.0.1')
+
+    @benchmark('analyze_sentiment_x100')
+    def analyze_sentiment_x100():
+        with app.test_request_context():
+            for index in range(100):
+                # Every tenth reply is not JSON, like a model that ignores the format
+                stub.sentiment_reply = 'The tone is mostly neutral.' if index % 10 == 0 else SENTIMENT_REPLY
+                chat_service.analyze_sentiment(TRANSCRIPT)
+            stub.sentiment_reply = SENTIMENT_REPLY
+
+    webm_samples = sorted(
+        os.path.join(SAMPLES_DIR, name) for name in os.listdir(SAMPLES_DIR) if name.endswith('.webm')
+    )
+
+    @benchmark('process_voice_message')
+    def process_voice_message():
+        with app.test_request_context('/voice-message', method='POST'):
+            user = db.session.get(models.User, client_id)
+            for path in webm_samples:
+                with open(path, 'rb') as f:
+                    audio = FileStorage(stream=f, filename=os.path.basename(path), content_type='audio/webm')
+                    result = chat_service.process_voice_message(audio, user)
+                if not result.get('success') and 'No speech' not in result.get('error', ''):
+                    raise RuntimeError(f"Voice pipeline failed on {os.path.basename(path)}: {result.get('error')}")
+
+    @benchmark('voice_preprocessing')
+    def voice_preprocessing():
+        vad_benchmark.run(webm_samples)
+
+    results = {}
+    for name, fn in benchmarks.items():
+        if name in ('process_voice_message', 'voice_preprocessing') and not webm_samples:
+            continue
+        # The voice pipeline makes real audio conversions; fewer runs keep the suite quick
+        runs = max(3, repeat // 3) if name in ('process_voice_message', 'voice_preprocessing', 'log_audit_x100') else repeat
+        try:
+            results[name] = measure(fn, runs)
+        except Exception as e:
+            results[name] = {'error': f'{type(e).__name__}: {e}'}
+        print(f'  {name:28} {results[name]}', file=sys.stderr)
+    admin_socket.disconnect()
+    shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+# --- Driver -----------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_sizes(args):
+    results = {}
+    for size in args.sizes:
+        print(f'{size} messages', file=sys.stderr)
+        if args.reseed or not os.path.exists(database_path(size)):
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--seed', str(size)], check=True, cwd=ROOT)
+        fd, output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        command = [sys.executable, os.path.abspath(__file__), '--worker', str(size), '--output', output, '--repeat', str(args.repeat)]
+        for name in args.only or []:
+            command += ['--only', name]
+        subprocess.run(command, check=True, cwd=ROOT)
+        with open(output) as f:
+            for name, stats in json.load(f).items():
+                results[f'{name}@{size}'] = stats
+        os.remove(output)
+    return results
+
+def compare(results, baseline, max_regression, thresholds):
+    """Return a list of (benchmark, baseline ms, current ms, allowed ratio) that regressed"""
+    regressions = []
+    for key, stats in results.items():
+        previous = baseline.get('results', {}).get(key)
+        if not previous or 'median_ms' not in previous or 'median_ms' not in stats:
+            continue
+        allowed = thresholds.get(key, thresholds.get(key.split('@')[0], max_regression))
+        if stats['median_ms'] > previous['median_ms'] * (1 + allowed):
+            regressions.append((key, previous['median_ms'], stats['median_ms'], allowed))
+    return regressions
+
+def parse_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        name, _, ratio = value.partition('=')
+        thresholds[name] = float(ratio)
+    return thresholds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--only', action='append', help='run only this benchmark (repeatable)')
+    parser.add_argument('--reseed', action='store_true', help='rebuild the cached databases')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='allowed slowdown of a median over the baseline, as a ratio (0.25 = 25%%)')
+    parser.add_argument('--threshold', action='append', metavar='NAME=RATIO',
+                        help='allowed slowdown for one benchmark, e.g. system_status=0.5 or system_status@100000=0.5')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--seed', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_worker(args.seed)
+        return
+    if args.worker:
+        results = run_worker(args.worker, args.repeat, args.only)
+        with open(args.output, 'w') as f:
+            json.dump(results, f)
+        return
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': run_sizes(args)
+    }
+
+    regressions = []
+    if os.path.exists(args.baseline) and args.save_baseline != args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline, args.max_regression, parse_thresholds(args.threshold))
+        report['baseline_revision'] = baseline.get('revision')
+    report['regressions'] = [
+        {'benchmark': key, 'baseline_ms': before, 'current_ms': after, 'allowed': allowed}
+        for key, before, after, allowed in regressions
+    ]
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(f"{'benchmark':40} {'median ms':>10} {'p95 ms':>10}")
+        for key, stats in report['results'].items():
+            if 'error' in stats:
+                print(f"{key:40} {stats['error']}")
+            else:
+                print(f"{key:40} {stats['median_ms']:>10} {stats['p95_ms']:>10}")
+        for key, before, after, allowed in regressions:
+            print(f"REGRESSION {key}: {before} ms -> {after} ms (allowed +{allowed:.0%})")
+
+    if regressions or any('error' in stats for stats in report['results'].values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Measure what silence trimming saves on recorded voice samples.
+
+    python benchmarks/vad_benchmark.py [files...] [--pad-silence SECONDS] [--json]
+
+Whisper bills and processes by audio duration, so the duration reduction is a
+direct proxy for transcription time and cost; the byte reduction is upload time.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_preprocessing import voice_preprocessor, NoSpeechError
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'samples', 'voice')
+
+def pad_with_silence(audio_bytes, source_format, seconds):
+    """Re-encode a sample with silence around it, like a press-and-hold recording"""
+    from pydub import AudioSegment
+
+    segment = voice_preprocessor.decode(audio_bytes, source_format)
+    silence = AudioSegment.silent(duration=int(seconds * 1000), frame_rate=segment.frame_rate)
+    padded = silence + segment + silence + segment + silence
+    buffer = io.BytesIO()
+    padded.export(buffer, format='webm', codec='libopus', bitrate='32k')
+    return buffer.getvalue(), 'webm'
+
+def run(paths, pad_silence=0.0):
+    results = []
+    for path in paths:
+        source_format = path.rsplit('.', 1)[-1].lower()
+        with open(path, 'rb') as f:
+            audio_bytes = f.read()
+        if not audio_bytes:
+            continue
+        if pad_silence:
+            audio_bytes, source_format = pad_with_silence(audio_bytes, source_format, pad_silence)
+        try:
+            _, _, stats = voice_preprocessor.process(audio_bytes, source_format)
+        except NoSpeechError:
+            stats = {'original_bytes': len(audio_bytes), 'rejected': True}
+        stats['file'] = os.path.basename(path)
+        results.append(stats)
+    return results
+
+def summarize(results):
+    processed = [r for r in results if not r.get('rejected')]
+    original_bytes = sum(r['original_bytes'] for r in processed)
+    processed_bytes = sum(r['processed_bytes'] for r in processed)
+    original_ms = sum(r['original_ms'] for r in processed)
+    processed_ms = sum(r['processed_ms'] for r in processed)
+    return {
+        'files': len(results),
+        'rejected_silent': len(results) - len(processed),
+        'byte_reduction_pct': round(100 * (1 - processed_bytes / original_bytes), 1) if original_bytes else 0,
+        'duration_reduction_pct': round(100 * (1 - processed_ms / original_ms), 1) if original_ms else 0,
+        'mean_processing_ms': round(sum(r['processing_ms'] for r in processed) / len(processed), 1) if processed else 0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--pad-silence', type=float, default=0.0,
+                        help='seconds of silence to add before, between and after two copies of each sample')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    paths = args.files or sorted(glob.glob(os.path.join(SAMPLES_DIR, '*.webm')) + glob.glob(os.path.join(SAMPLES_DIR, '*.mp3')))
+    results = run(paths, args.pad_silence)
+    summary = summarize(results)
+
+    if args.json:
+        print(json.dumps({'results': results, 'summary': summary}, indent=2))
+        return
+
+    print(f"{'file':45} {'bytes':>8} {'-> bytes':>9} {'ms':>6} {'-> ms':>6} {'vad ms':>7}")
+    for r in results:
+        if r.get('rejected'):
+            print(f"{r['file']:45} {r['original_bytes']:>8} {'silent, rejected before upload':>31}")
+            continue
+        print(f"{r['file']:45} {r['original_bytes']:>8} {r['processed_bytes']:>9} "
+              f"{r['original_ms']:>6} {r['processed_ms']:>6} {r['processing_ms']:>7}")
+    print()
+    print(f"bytes -{summary['byte_reduction_pct']}%, audio duration -{summary['duration_reduction_pct']}%, "
+          f"mean preprocessing {summary['mean_processing_ms']} ms, {summary['rejected_silent']} silent clips rejected")
+
+if __name__ == '__main__':
+    main()
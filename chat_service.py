@@ -5,21 +5,53 @@ from models import ChatMessage
 from extensions import db
 import traceback
 from datetime import datetime
-import io
-import uuid
 import json
+import tempfile
+from audio_storage import audio_store
+from audio_preprocessing import voice_preprocessor, NoSpeechError
+from speech_backends import build_speech_backend
+from response_cache import response_cache
+from generation_tracker import Generation, GenerationCancelled
+from rollups import record_turn, recently_flagged
+from model_scheduler import model_scheduler
+from model_router import model_router
 
 class ChatService:
     def __init__(self):
-        self.api_key = os.environ.get('OPENAI_API_KEY')
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found in environment variables")
-        self.client = openai.Client(api_key=self.api_key)
+        self._client = None
+        self._speech_to_text = None
+        self._text_to_speech = None
+    
+    @property
+    def client(self):
+        # Created on first use so starting the app (or a CLI script) needs no API key
+        if self._client is None:
+            api_key = os.environ.get('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OpenAI API key not found in environment variables")
+            self._client = openai.Client(api_key=api_key)
+        return self._client
+    
+    @property
+    def speech_to_text(self):
+        # Built on first use so the backends follow the app config
+        if self._speech_to_text is None:
+            self._speech_to_text = build_speech_backend('stt', lambda: self.client, current_app.config)
+        return self._speech_to_text
+    
+    @property
+    def text_to_speech(self):
+        if self._text_to_speech is None:
+            self._text_to_speech = build_speech_backend('tts', lambda: self.client, current_app.config)
+        return self._text_to_speech
         
-    def analyze_sentiment(self, text):
+    def analyze_sentiment(self, text, route=None):
+        route = route or model_router.route('sentiment', text)
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            response = model_scheduler.call(
+                model_router.call, route,
+                self.client.chat.completions.create,
+                model=route.model,
                 messages=[{
                     "role": "system",
                     "content": """You are a sentiment analysis expert. Analyze the following text and provide the sentiment analysis in this exact format:
@@ -56,40 +88,51 @@ class ChatService:
             current_app.logger.error(f"Error analyzing sentiment: {json.dumps(error_context)}")
             return None
         
-    def get_ai_response(self, user_message, user):
+    def generate_reply(self, user_message, user, generation=None, flagged=False):
+        """Return (ai_message, sentiment_result, models) for user_message, or None on failure. Nothing is saved.
+
+        models holds the model, model_route and sentiment_model to record on the reply.
+        flagged says whether the user has recently flagged messages, which keeps the strong model.
+        Raises GenerationCancelled if generation is cancelled while the model is working.
+        """
+        generation = generation or Generation()
         try:
-            start_time = datetime.utcnow()
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a helpful therapist assistant. Provide supportive and professional responses while maintaining HIPAA compliance. Do not store or repeat sensitive personal information."},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=150
-            )
-            
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
-            current_app.logger.info(f"AI response generated in {processing_time:.2f} seconds")
-            
-            ai_message = response.choices[0].message.content
-            
-            # Analyze sentiment before saving
-            sentiment_result = self.analyze_sentiment(user_message)
-            
-            chat_message = ChatMessage()
-            chat_message.user_id = user.id
-            chat_message.is_ai_response = True
-            chat_message.content = ai_message
-            
-            if sentiment_result:
-                chat_message.sentiment_score = sentiment_result.get('sentiment_score')
-                chat_message.sentiment_label = sentiment_result.get('sentiment_label')
-                chat_message.sentiment_analysis = sentiment_result.get('sentiment_analysis')
+            cached = response_cache.get(user_message, user.id)
+            if cached:
+                ai_message, models = cached
+                models = {**models, 'model_route': 'cache'}
+                current_app.logger.info("AI response served from cache")
+            else:
+                route = model_router.route('reply', user_message, flagged=lambda: flagged)
+                start_time = datetime.utcnow()
+                with generation.interruptible():
+                    response = model_scheduler.call(
+                        model_router.call, route,
+                        self.client.chat.completions.create,
+                        model=route.model,
+                        messages=[
+                            {"role": "system", "content": "You are a helpful therapist assistant. Provide supportive and professional responses while maintaining HIPAA compliance. Do not store or repeat sensitive personal information."},
+                            {"role": "user", "content": user_message}
+                        ],
+                        max_tokens=150
+                    )
+                
+                processing_time = (datetime.utcnow() - start_time).total_seconds()
+                current_app.logger.info(f"AI response generated by {route.model} ({route.reason}) in {processing_time:.2f} seconds")
+                
+                ai_message = response.choices[0].message.content
+                if not ai_message:
+                    return None
+                models = {'model': route.model, 'model_route': route.reason}
+                response_cache.put(user_message, (ai_message, models), user.id)
             
-            db.session.add(chat_message)
-            db.session.commit()
+            # Sentiment always comes from this message, even when the reply was cached
+            sentiment_route = model_router.route('sentiment', user_message)
+            with generation.interruptible():
+                sentiment_result = self.analyze_sentiment(user_message, sentiment_route)
+            models = {**models, 'sentiment_model': sentiment_route.model if sentiment_result else None}
             
-            return ai_message
+            return ai_message, sentiment_result, models
             
         except openai.APIError as e:
             error_context = {
@@ -112,6 +155,72 @@ class ChatService:
             current_app.logger.error(f"Error getting AI response: {json.dumps(error_context)}")
             return None
 
+    def chat_turn(self, content, user, message_type='text', with_audio=False, on_user_message=None, generation=None):
+        """Run one chat turn and save it in a single commit.
+
+        The user's message, the AI reply and its sentiment are written together; if no
+        reply could be generated only the user's message is saved. on_user_message is
+        called with the (unsaved) user message before the model is called, so it can be
+        shown right away. Returns (user_message, ai_message); ai_message may be None.
+
+        If generation is cancelled the user's message is still saved and
+        GenerationCancelled is re-raised once the unfinished reply is dropped.
+        """
+        generation = generation or Generation()
+        # Looked up before the message is added, so nothing is flushed while the model works
+        flagged = recently_flagged(user.id, current_app.config['MODEL_FLAGGED_LOOKBACK_DAYS'])
+        user_message = ChatMessage(
+            user_id=user.id,
+            content=content,
+            is_ai_response=False,
+            message_type=message_type,
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(user_message)
+        if on_user_message:
+            on_user_message(user_message)
+        
+        ai_message = None
+        try:
+            reply = self.generate_reply(content, user, generation, flagged=flagged)
+            if reply and with_audio:
+                generation.check()
+                voice_url = self.generate_audio_response(reply[0])
+            generation.check()
+        except GenerationCancelled:
+            record_turn(user_message)
+            self._commit()
+            raise
+        
+        if reply:
+            ai_text, sentiment_result, models = reply
+            ai_message = ChatMessage(
+                user_id=user.id,
+                content=ai_text,
+                is_ai_response=True,
+                message_type=message_type,
+                timestamp=datetime.utcnow(),
+                **models
+            )
+            if sentiment_result:
+                ai_message.sentiment_score = sentiment_result.get('sentiment_score')
+                ai_message.sentiment_label = sentiment_result.get('sentiment_label')
+                ai_message.sentiment_analysis = sentiment_result.get('sentiment_analysis')
+            if with_audio:
+                ai_message.voice_url = voice_url
+            db.session.add(ai_message)
+        
+        record_turn(user_message, ai_message)
+        self._commit()
+        return user_message, ai_message
+
+    def _commit(self):
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
     def generate_audio_response(self, text):
         try:
             if not text:
@@ -120,46 +229,18 @@ class ChatService:
             start_time = datetime.utcnow()
             current_app.logger.info("Generating audio response")
             
-            response = self.client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=text
-            )
+            audio_bytes, extension = model_scheduler.call(self.text_to_speech.synthesize, text)
             
             processing_time = (datetime.utcnow() - start_time).total_seconds()
             current_app.logger.info(f"Audio generated in {processing_time:.2f} seconds")
             
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid.uuid4())[:8]
-            filename = f'ai_response_{timestamp}_{unique_id}.mp3'
-            
-            static_folder = current_app.static_folder or 'static'
-            voice_messages_dir = os.path.join(static_folder, 'voice_messages')
-            os.makedirs(voice_messages_dir, exist_ok=True)
-            
-            audio_path = os.path.join(voice_messages_dir, filename)
+            if not audio_bytes:
+                raise ValueError("Failed to generate audio file")
             
-            try:
-                response.stream_to_file(audio_path)
-                if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-                    raise ValueError("Failed to generate audio file")
-                
-                file_size = os.path.getsize(audio_path)
-                current_app.logger.info(f"Audio file generated: {filename} ({file_size} bytes)")
-                
-            except Exception as e:
-                error_context = {
-                    'error_type': type(e).__name__,
-                    'error_message': str(e),
-                    'traceback': traceback.format_exc(),
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                current_app.logger.error(f"Error streaming audio to file: {json.dumps(error_context)}")
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-                return None
+            audio_url = audio_store.save(audio_bytes, prefix='ai_response', extension=extension)
+            current_app.logger.info(f"Audio file generated: {audio_url} ({len(audio_bytes)} bytes)")
             
-            return f'/static/voice_messages/{filename}'
+            return audio_url
                 
         except Exception as e:
             error_context = {
@@ -172,6 +253,11 @@ class ChatService:
             return None
             
     def process_voice_message(self, audio_file, user):
+        content_type = audio_file.content_type if audio_file else None
+        audio_bytes = audio_file.read() if content_type else None
+        return self.process_voice_bytes(audio_bytes, content_type, user)
+    
+    def process_voice_bytes(self, audio_bytes, content_type, user):
         temp_file = None
         start_time = datetime.utcnow()
         
@@ -181,18 +267,16 @@ class ChatService:
                 'path': request.path,
                 'ip': request.remote_addr,
                 'user_id': user.id,
-                'content_type': audio_file.content_type if audio_file else None
+                'content_type': content_type
             }
             current_app.logger.info(f"Processing voice message: {json.dumps(request_context)}")
             
-            if not audio_file or not audio_file.content_type:
+            if audio_bytes is None or not content_type:
                 raise ValueError("Invalid audio file")
             
-            if 'audio/webm' not in audio_file.content_type:
-                raise ValueError(f"Unsupported audio format: {audio_file.content_type}. Only WebM audio is supported.")
+            if 'audio/webm' not in content_type:
+                raise ValueError(f"Unsupported audio format: {content_type}. Only WebM audio is supported.")
             
-            # Read audio file bytes
-            audio_bytes = audio_file.read()
             if not audio_bytes:
                 raise ValueError("Empty audio file")
             
@@ -201,27 +285,25 @@ class ChatService:
                 
             current_app.logger.info(f"Audio file received: {len(audio_bytes)} bytes")
             
-            # Create a temporary file with unique name
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid.uuid4())[:8]
-            temp_filename = f'temp_voice_{timestamp}_{unique_id}.webm'
-            static_folder = current_app.static_folder or 'static'
-            voice_messages_dir = os.path.join(static_folder, 'voice_messages')
-            os.makedirs(voice_messages_dir, exist_ok=True)
-            temp_file = os.path.join(voice_messages_dir, temp_filename)
-            
-            # Save audio bytes to temporary file
-            with open(temp_file, 'wb') as f:
+            # Strip silence before upload; silent clips are rejected without an API call
+            upload_format = 'webm'
+            if voice_preprocessor.enabled:
+                try:
+                    audio_bytes, upload_format, stats = voice_preprocessor.process(audio_bytes, 'webm')
+                    current_app.logger.info(f"Voice preprocessing: {json.dumps(stats)}")
+                except NoSpeechError:
+                    raise ValueError("No speech detected, please try again")
+                except Exception as e:
+                    current_app.logger.warning(f"Voice preprocessing skipped ({type(e).__name__}: {str(e)}), sending original audio")
+            
+            # Save audio bytes to a private temporary file, never under the public static folder
+            fd, temp_file = tempfile.mkstemp(prefix='temp_voice_', suffix=f'.{upload_format}')
+            with os.fdopen(fd, 'wb') as f:
                 f.write(audio_bytes)
             
             # Process speech to text using the temporary file
             try:
-                with open(temp_file, 'rb') as f:
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=f,
-                        response_format="text"
-                    )
+                transcript = model_scheduler.call(self.speech_to_text.transcribe, temp_file)
             except openai.APIError as e:
                 error_context = {
                     'error_type': type(e).__name__,
@@ -238,24 +320,13 @@ class ChatService:
                 
             current_app.logger.info(f"Speech to text completed: {transcript}")
             
-            # Save user message
-            user_message = ChatMessage()
-            user_message.user_id = user.id
-            user_message.is_ai_response = False
-            user_message.content = transcript
-            db.session.add(user_message)
-            db.session.commit()
-            
-            # Get AI response
-            ai_response = self.get_ai_response(transcript, user)
+            # Save the transcript, the AI reply and its audio in one commit
+            user_message, ai_message = self.chat_turn(transcript, user, message_type='voice', with_audio=True)
             
-            if not ai_response:
+            if not ai_message:
                 raise ValueError("Failed to get AI response")
             
-            # Generate audio response
-            audio_url = self.generate_audio_response(ai_response)
-            
-            if not audio_url:
+            if not ai_message.voice_url:
                 raise ValueError("Failed to generate audio response")
             
             processing_time = (datetime.utcnow() - start_time).total_seconds()
@@ -263,9 +334,13 @@ class ChatService:
             
             return {
                 'success': True,
+                'message_id': user_message.id,
                 'transcript': transcript,
-                'ai_response': ai_response,
-                'ai_audio_url': audio_url
+                'ai_response': ai_message.content,
+                'ai_audio_url': ai_message.voice_url,
+                'sentiment_label': ai_message.sentiment_label,
+                'sentiment_score': ai_message.sentiment_score,
+                'sentiment_analysis': ai_message.sentiment_analysis
             }
                 
         except ValueError as e:
@@ -311,3 +386,5 @@ class ChatService:
                     'timestamp': datetime.utcnow().isoformat()
                 }
                 current_app.logger.error(f"Error cleaning up temporary file: {json.dumps(error_context)}")
+
+chat_service = ChatService()
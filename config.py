@@ -1,36 +1,55 @@
 import os
 from datetime import timedelta
-from sqlalchemy import create_engine
-from sqlalchemy.exc import OperationalError
-import time
 
 class Config:
     SECRET_KEY = os.environ.get('FLASK_SECRET_KEY', 'your-secret-key-here')
     
-    # Database configuration with SSL and retry logic
+    # Database configuration with SSL
     database_url = os.environ.get('DATABASE_URL')
     if database_url and 'postgresql' in database_url:
         if '?' not in database_url:
             database_url += '?sslmode=require'
     
     SQLALCHEMY_DATABASE_URI = database_url
+    # Green threads are cheap but connections are not: size the pool for the number of
+    # requests that may hit the database at once and let the rest fail fast instead of
+    # queueing on the pool. Keep DB_POOL_SIZE + DB_MAX_OVERFLOW per worker under the
+    # server's max_connections divided by the number of workers.
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'pool_timeout': 900,
-        'pool_size': 10,
-        'max_overflow': 5,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
     }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replicas for admin and analytics reads (comma separated URLs, same SSL rules)
+    replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    SQLALCHEMY_REPLICA_URIS = [
+        url + '?sslmode=require' if 'postgresql' in url and '?' not in url else url
+        for url in replica_urls
+    ]
+    # Oldest replica data a routed read may see, and how often the primary stamps the heartbeat
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+    REPLICA_HEARTBEAT_INTERVAL = float(os.environ.get('REPLICA_HEARTBEAT_INTERVAL', 1))
+    
     # Security settings
     SESSION_PERMANENT = True
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=30)
-    SESSION_TYPE = 'filesystem'
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'filesystem')
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR', 'flask_session')
+    SESSION_FILE_THRESHOLD = int(os.environ.get('SESSION_FILE_THRESHOLD', 5000))
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Authenticated user principal cache (seconds, 0 disables). Admin changes invalidate
+    # the entry only in the process that made them; other workers may keep a deactivated
+    # user or an old role for up to USER_CACHE_TTL seconds
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000))
+    
     # Password policy
     PASSWORD_MIN_LENGTH = 8
     PASSWORD_REQUIRE_UPPERCASE = True
@@ -38,22 +57,136 @@ class Config:
     PASSWORD_REQUIRE_NUMBERS = True
     PASSWORD_REQUIRE_SPECIAL = True
     
+    # Password hashing work factor and worker threads (0 hashes inline)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+    
+    # Outbound email ('sendgrid', 'smtp' or 'file')
+    MAIL_TRANSPORT = os.environ.get('MAIL_TRANSPORT', 'sendgrid')
+    MAIL_FROM = os.environ.get('MAIL_FROM', 'info@l2juice.com')
+    MAIL_FILE_DIR = os.environ.get('MAIL_FILE_DIR', 'outbox')
+    SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 25))
+    SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'false').lower() == 'true'
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 8))
+    MAIL_RETRY_BASE_SECONDS = int(os.environ.get('MAIL_RETRY_BASE_SECONDS', 30))
+    MAIL_POLL_INTERVAL = int(os.environ.get('MAIL_POLL_INTERVAL', 10))
+    MAIL_SEND_LEASE_SECONDS = int(os.environ.get('MAIL_SEND_LEASE_SECONDS', 300))
+    
+    # Voice audio storage ('local' or 's3', which needs the s3 extra)
+    AUDIO_STORAGE_BACKEND = os.environ.get('AUDIO_STORAGE_BACKEND', 'local')
+    AUDIO_STORAGE_DIR = os.path.abspath(os.environ.get('AUDIO_STORAGE_DIR', 'voice_storage'))
+    AUDIO_STORAGE_SHARD_DEPTH = int(os.environ.get('AUDIO_STORAGE_SHARD_DEPTH', 2))
+    AUDIO_S3_BUCKET = os.environ.get('AUDIO_S3_BUCKET')
+    AUDIO_S3_PREFIX = os.environ.get('AUDIO_S3_PREFIX', 'voice_messages')
+    AUDIO_S3_ENDPOINT_URL = os.environ.get('AUDIO_S3_ENDPOINT_URL')
+    AUDIO_S3_URL_EXPIRES = int(os.environ.get('AUDIO_S3_URL_EXPIRES', 3600))
+    AUDIO_TTL_SECONDS = int(os.environ.get('AUDIO_TTL_DAYS', 30)) * 86400
+    AUDIO_QUOTA_BYTES = int(os.environ.get('AUDIO_QUOTA_MB', 1024)) * 1024 * 1024
+    AUDIO_CLEANUP_INTERVAL = int(os.environ.get('AUDIO_CLEANUP_INTERVAL', 3600))
+    AUDIO_CACHE_MAX_AGE = int(os.environ.get('AUDIO_CACHE_MAX_AGE', 31536000))
+    # Let nginx/Apache stream files instead of the eventlet worker
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+    
+    # Static files: serve the `flask assets build` output when there is one, and how long
+    # browsers may cache files that are not fingerprinted (seconds)
+    STATIC_ASSETS_ENABLED = os.environ.get('STATIC_ASSETS_ENABLED', 'true').lower() == 'true'
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+    
+    # Chunked voice uploads
+    VOICE_MAX_DURATION_SECONDS = int(os.environ.get('VOICE_MAX_DURATION_SECONDS', 120))
+    VOICE_MAX_BITRATE = int(os.environ.get('VOICE_MAX_BITRATE', 64000))
+    VOICE_MAX_CHUNK_BYTES = int(os.environ.get('VOICE_MAX_CHUNK_BYTES', 256 * 1024))
+    VOICE_UPLOAD_BUFFER_BYTES = int(os.environ.get('VOICE_UPLOAD_BUFFER_MB', 64)) * 1024 * 1024
+    VOICE_UPLOAD_TTL = int(os.environ.get('VOICE_UPLOAD_TTL', 600))
+    
+    # Silence trimming before transcription (needs ffmpeg on PATH)
+    VOICE_VAD_ENABLED = os.environ.get('VOICE_VAD_ENABLED', 'true').lower() == 'true'
+    VOICE_VAD_FLOOR_DB = float(os.environ.get('VOICE_VAD_FLOOR_DB', -45))
+    VOICE_VAD_PADDING_MS = int(os.environ.get('VOICE_VAD_PADDING_MS', 200))
+    VOICE_VAD_MAX_PAUSE_MS = int(os.environ.get('VOICE_VAD_MAX_PAUSE_MS', 600))
+    VOICE_VAD_MIN_SPEECH_MS = int(os.environ.get('VOICE_VAD_MIN_SPEECH_MS', 250))
+    VOICE_TRANSCODE_BITRATE = os.environ.get('VOICE_TRANSCODE_BITRATE', '24k')
+    
+    # Speech backends ('openai' or 'local'), with optional automatic failover
+    STT_BACKEND = os.environ.get('STT_BACKEND', 'openai')
+    STT_FALLBACK_BACKEND = os.environ.get('STT_FALLBACK_BACKEND', '')
+    TTS_BACKEND = os.environ.get('TTS_BACKEND', 'openai')
+    TTS_FALLBACK_BACKEND = os.environ.get('TTS_FALLBACK_BACKEND', '')
+    OPENAI_STT_MODEL = os.environ.get('OPENAI_STT_MODEL', 'whisper-1')
+    OPENAI_TTS_MODEL = os.environ.get('OPENAI_TTS_MODEL', 'tts-1')
+    OPENAI_TTS_VOICE = os.environ.get('OPENAI_TTS_VOICE', 'alloy')
+    STT_LOCAL_ENGINE = os.environ.get('STT_LOCAL_ENGINE', 'sphinx')
+    STT_LOCAL_LANGUAGE = os.environ.get('STT_LOCAL_LANGUAGE', 'en-US')
+    TTS_LOCAL_COMMAND = os.environ.get('TTS_LOCAL_COMMAND', 'espeak-ng')
+    TTS_LOCAL_VOICE = os.environ.get('TTS_LOCAL_VOICE')
+    SPEECH_REQUEST_TIMEOUT = float(os.environ.get('SPEECH_REQUEST_TIMEOUT', 30))
+    SPEECH_LATENCY_BUDGET_SECONDS = float(os.environ.get('SPEECH_LATENCY_BUDGET_SECONDS', 8))
+    SPEECH_FAILOVER_COOLDOWN_SECONDS = float(os.environ.get('SPEECH_FAILOVER_COOLDOWN_SECONDS', 60))
+    
+    # Chat model routing: short, low-risk replies and sentiment analysis use the fast model,
+    # and a model whose p95 latency is over its path's budget (seconds) fails over to the other
+    MODEL_ROUTING_ENABLED = os.environ.get('MODEL_ROUTING_ENABLED', 'true').lower() == 'true'
+    MODEL_STRONG = os.environ.get('MODEL_STRONG', 'gpt-4')
+    MODEL_FAST = os.environ.get('MODEL_FAST', 'gpt-4o-mini')
+    MODEL_SENTIMENT = os.environ.get('MODEL_SENTIMENT', '')  # Empty uses MODEL_FAST
+    MODEL_SHORT_MESSAGE_CHARS = int(os.environ.get('MODEL_SHORT_MESSAGE_CHARS', 160))
+    MODEL_FLAGGED_LOOKBACK_DAYS = int(os.environ.get('MODEL_FLAGGED_LOOKBACK_DAYS', 30))
+    MODEL_LATENCY_BUDGETS = {
+        name.strip(): float(value)
+        for name, value in (item.split(':') for item in os.environ.get('MODEL_LATENCY_BUDGETS', 'reply:6,sentiment:4').split(',') if item.strip())
+    }
+    MODEL_LATENCY_WINDOW_SECONDS = int(os.environ.get('MODEL_LATENCY_WINDOW_SECONDS', 300))
+    MODEL_LATENCY_MIN_SAMPLES = int(os.environ.get('MODEL_LATENCY_MIN_SAMPLES', 5))
+    # Dollars per 1K tokens, for the cost estimates on the system status page
+    MODEL_COSTS = {
+        name.strip(): float(value)
+        for name, value in (item.rsplit(':', 1) for item in os.environ.get('MODEL_COSTS', 'gpt-4:0.045,gpt-4o-mini:0.0004').split(',') if item.strip())
+    }
+    
+    # Opt-in cache of AI replies to short, repeated messages
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+    # Near matches to the same user's earlier prompts (e.g. 0.92); 0 allows exact matches only
+    RESPONSE_CACHE_SIMILARITY = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', 0))
+    RESPONSE_CACHE_MAX_PROMPT_CHARS = int(os.environ.get('RESPONSE_CACHE_MAX_PROMPT_CHARS', 200))
+    RESPONSE_CACHE_BYPASS_USERS = [int(user_id) for user_id in os.environ.get('RESPONSE_CACHE_BYPASS_USERS', '').split(',') if user_id.strip()]
+    
+    # Chat text at or above this many bytes is stored zlib-compressed (0 disables)
+    TEXT_COMPRESSION_MIN_BYTES = int(os.environ.get('TEXT_COMPRESSION_MIN_BYTES', 1024))
+    TEXT_COMPRESSION_LEVEL = int(os.environ.get('TEXT_COMPRESSION_LEVEL', 6))
+    
+    # Resent chat submissions: how long results are kept, how long a resend waits for the
+    # original, and how long a reply outlives its connection so a resend can pick it up
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 600))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 120))
+    IDEMPOTENCY_RECONNECT_GRACE = float(os.environ.get('IDEMPOTENCY_RECONNECT_GRACE', 30))
+    
+    # Socket.IO wire format ('json' or 'msgpack', which needs the msgpack package) and the
+    # payload size above which polling responses are compressed; WebSocket frames use
+    # permessage-deflate whenever the browser offers it
+    SOCKETIO_SERIALIZER = os.environ.get('SOCKETIO_SERIALIZER', 'json')
+    SOCKETIO_COMPRESSION_THRESHOLD = int(os.environ.get('SOCKETIO_COMPRESSION_THRESHOLD', 1024))
+    
+    # Outbound model calls: total concurrency, each priority class's guaranteed share
+    # (voice, text, admin, background for bulk jobs) and how long a call may queue (0 = no limit)
+    MODEL_MAX_CONCURRENCY = int(os.environ.get('MODEL_MAX_CONCURRENCY', 16))
+    MODEL_CLASS_SHARES = {
+        name.strip(): float(value)
+        for name, value in (item.split(':') for item in os.environ.get('MODEL_CLASS_SHARES', 'voice:0.35,text:0.35,admin:0.15,background:0.15').split(',') if item.strip())
+    }
+    MODEL_CLASS_DEADLINES = {
+        name.strip(): float(value)
+        for name, value in (item.split(':') for item in os.environ.get('MODEL_CLASS_DEADLINES', 'voice:15,text:30,admin:60,background:0').split(',') if item.strip())
+    }
+
+    # Seconds between background database health checks
+    HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL', 30))
+    
     # HIPAA compliance
     MAX_LOGIN_ATTEMPTS = 3
     ACCOUNT_LOCKOUT_DURATION = timedelta(minutes=30)
-    
-    @staticmethod
-    def init_db(app):
-        """Initialize database with retry logic"""
-        max_retries = 3
-        retry_delay = 2
-        
-        for attempt in range(max_retries):
-            try:
-                engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
-                engine.connect()
-                break
-            except OperationalError as e:
-                if attempt == max_retries - 1:
-                    raise e
-                time.sleep(retry_delay * (attempt + 1))
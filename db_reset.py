@@ -1,13 +1,19 @@
+import sys
+from flask_migrate import upgrade
 from app import app
 from extensions import db
 
-def reset_database():
+def reset_database(drop_all=False):
     with app.app_context():
-        print("Dropping all tables...")
-        db.drop_all()
-        print("Creating all tables with updated schema...")
-        db.create_all()
+        if drop_all:
+            print("Dropping all tables...")
+            db.drop_all()
+            db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+            db.session.commit()
+        print("Applying migrations...")
+        upgrade()
         print("Database schema updated successfully!")
 
 if __name__ == "__main__":
-    reset_database()
+    # Existing data is kept unless --drop-all is passed explicitly
+    reset_database(drop_all='--drop-all' in sys.argv[1:])
@@ -1,17 +1,225 @@
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+import smtplib
+import threading
+import traceback
+import json
+from datetime import datetime, timedelta
+from email.message import EmailMessage
 from flask import current_app, url_for
+from sqlalchemy import update
+from extensions import db, socketio
+from models import OutboundEmail
 
-def send_verification_email(user_email, verification_token):
-    sg = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
-    verification_url = url_for('auth.verify_email', 
-                             token=verification_token, 
+class SendGridTransport:
+    def __init__(self, config):
+        self.api_key = os.environ.get('SENDGRID_API_KEY')
+        self.from_email = config['MAIL_FROM']
+        self._client = None
+
+    def send_batch(self, emails):
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
+        # One client for the life of the sender instead of one per email
+        if self._client is None:
+            self._client = SendGridAPIClient(self.api_key)
+
+        results = {}
+        for email in emails:
+            message = Mail(
+                from_email=self.from_email,
+                to_emails=email.to_email,
+                subject=email.subject,
+                html_content=email.html_content
+            )
+            try:
+                self._client.send(message)
+                results[email.id] = None
+            except Exception as e:
+                results[email.id] = str(e)
+        return results
+
+class SMTPTransport:
+    def __init__(self, config):
+        self.host = config['SMTP_HOST']
+        self.port = config['SMTP_PORT']
+        self.username = config['SMTP_USERNAME']
+        self.password = config['SMTP_PASSWORD']
+        self.use_tls = config['SMTP_USE_TLS']
+        self.from_email = config['MAIL_FROM']
+
+    def send_batch(self, emails):
+        results = {}
+        # One connection per batch
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for email in emails:
+                try:
+                    smtp.send_message(build_message(email, self.from_email))
+                    results[email.id] = None
+                except smtplib.SMTPException as e:
+                    results[email.id] = str(e)
+        return results
+
+class FileTransport:
+    """Writes each email to MAIL_FILE_DIR as an .eml file, for development and tests"""
+
+    def __init__(self, config):
+        self.directory = config['MAIL_FILE_DIR']
+        self.from_email = config['MAIL_FROM']
+
+    def send_batch(self, emails):
+        os.makedirs(self.directory, exist_ok=True)
+        results = {}
+        for email in emails:
+            path = os.path.join(self.directory, f'email_{email.id}.eml')
+            with open(path, 'wb') as f:
+                f.write(bytes(build_message(email, self.from_email)))
+            results[email.id] = None
+        return results
+
+MAIL_TRANSPORTS = {
+    'sendgrid': SendGridTransport,
+    'smtp': SMTPTransport,
+    'file': FileTransport,
+}
+
+def build_message(email, from_email):
+    message = EmailMessage()
+    message['From'] = from_email
+    message['To'] = email.to_email
+    message['Subject'] = email.subject
+    message.set_content(email.html_content, subtype='html')
+    return message
+
+class MailQueue:
+    """Database-backed outbound mail queue drained by a background sender"""
+
+    def __init__(self):
+        self.app = None
+        self.transport = None
+        self._wakeup = threading.Event()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        transport_name = app.config['MAIL_TRANSPORT']
+        if transport_name not in MAIL_TRANSPORTS:
+            raise ValueError(f"Unknown mail transport: {transport_name}")
+        self.transport = MAIL_TRANSPORTS[transport_name](app.config)
+
+    def enqueue(self, to_email, subject, html_content):
+        """Add an email to the current session; it is sent once the caller commits"""
+        email = OutboundEmail(
+            to_email=to_email,
+            subject=subject,
+            html_content=html_content
+        )
+        db.session.add(email)
+        return email
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if self._started or self.app is None:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        poll_interval = self.app.config['MAIL_POLL_INTERVAL']
+        while True:
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    while self.process_batch() == self.app.config['MAIL_BATCH_SIZE']:
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    error_context = {
+                        'error_type': type(e).__name__,
+                        'error_message': str(e),
+                        'traceback': traceback.format_exc(),
+                        'timestamp': datetime.utcnow().isoformat()
+                    }
+                    current_app.logger.error(f"Error in mail sender: {json.dumps(error_context)}")
+                finally:
+                    db.session.remove()
+
+    def process_batch(self):
+        """Send one batch of due emails. Returns the number of emails claimed."""
+        config = current_app.config
+        now = datetime.utcnow()
+        # Rows left in 'sending' past their lease belong to a sender that died mid-batch
+        due = OutboundEmail.query.filter(
+            OutboundEmail.status.in_(('pending', 'sending')),
+            OutboundEmail.next_attempt_at <= now
+        ).order_by(OutboundEmail.next_attempt_at).limit(config['MAIL_BATCH_SIZE']).all()
+
+        # Claim rows so another worker process does not send them too
+        lease_expires = now + timedelta(seconds=config['MAIL_SEND_LEASE_SECONDS'])
+        claimed = []
+        for email in due:
+            result = db.session.execute(
+                update(OutboundEmail)
+                .where(
+                    OutboundEmail.id == email.id,
+                    OutboundEmail.status == email.status,
+                    OutboundEmail.next_attempt_at == email.next_attempt_at
+                )
+                .values(status='sending', attempts=OutboundEmail.attempts + 1, next_attempt_at=lease_expires)
+            )
+            if result.rowcount:
+                claimed.append(email)
+        db.session.commit()
+        if not claimed:
+            return 0
+
+        try:
+            results = self.transport.send_batch(claimed)
+        except Exception as e:
+            results = {email.id: str(e) for email in claimed}
+
+        for email in claimed:
+            error = results.get(email.id, 'No result from transport')
+            if error is None:
+                email.status = 'sent'
+                email.sent_at = datetime.utcnow()
+                email.last_error = None
+            elif email.attempts >= config['MAIL_MAX_ATTEMPTS']:
+                email.status = 'failed'
+                email.last_error = error
+                current_app.logger.error(f"Giving up on email {email.id} to {email.to_email}: {error}")
+            else:
+                email.status = 'pending'
+                email.last_error = error
+                delay = config['MAIL_RETRY_BASE_SECONDS'] * (2 ** (email.attempts - 1))
+                email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                current_app.logger.warning(f"Email {email.id} failed (attempt {email.attempts}), retrying in {delay}s: {error}")
+        db.session.commit()
+        return len(claimed)
+
+    def stats(self):
+        counts = db.session.query(OutboundEmail.status, db.func.count(OutboundEmail.id)).group_by(OutboundEmail.status).all()
+        return dict(counts)
+
+mail_queue = MailQueue()
+
+def queue_verification_email(user_email, verification_token):
+    verification_url = url_for('auth.verify_email',
+                             token=verification_token,
                              _external=True)
-    
-    message = Mail(
-        from_email='info@l2juice.com',
-        to_emails=user_email,
+
+    return mail_queue.enqueue(
+        to_email=user_email,
         subject='Verify Your Email - Clinician Assist',
         html_content=f'''
         <h2>Welcome to Clinician Assist!</h2>
@@ -21,10 +229,3 @@ def send_verification_email(user_email, verification_token):
         <p>If you didn't create this account, please ignore this email.</p>
         '''
     )
-    
-    try:
-        response = sg.send(message)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Failed to send verification email: {str(e)}")
-        return False
@@ -2,8 +2,11 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_session import Session
 from flask_socketio import SocketIO
+from flask_migrate import Migrate
+from read_replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 session = Session()
 socketio = SocketIO()
+migrate = Migrate()
@@ -0,0 +1,123 @@
+import time
+import threading
+from contextlib import contextmanager
+import greenlet
+from eventlet import greenthread
+
+class GenerationCancelled(BaseException):
+    """Raised inside a cancelled generation.
+
+    Like asyncio.CancelledError it is not an Exception, so the broad error
+    handlers around the model calls let it through.
+    """
+
+class Generation:
+    """One in-flight AI reply. Model calls made inside interruptible() are
+    aborted as soon as the generation is cancelled; everything else stops at
+    the next check()."""
+
+    def __init__(self, key=None):
+        self.key = key
+        self.reason = None
+        self.started_at = time.monotonic()
+        self.cancelled_at = None
+        self._greenlet = greenlet.getcurrent()
+        self._interruptible = False
+        self.resumable = False  # A client retry may take over the reply after a disconnect
+        self.adopted = False
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def check(self):
+        if self.reason is not None:
+            raise GenerationCancelled(self.reason)
+
+    @contextmanager
+    def interruptible(self):
+        self.check()
+        self._interruptible = True
+        try:
+            yield
+        finally:
+            self._interruptible = False
+        self.check()
+
+    def adopt(self):
+        self.adopted = True
+
+    def cancel(self, reason):
+        if self.reason is not None:
+            return False
+        self.reason = reason
+        self.cancelled_at = time.monotonic()
+        # Abort a blocked model call by raising into its green thread; the socket wait unwinds cleanly
+        if self._interruptible and not self._greenlet.dead and self._greenlet is not greenlet.getcurrent():
+            greenthread.kill(self._greenlet, GenerationCancelled(reason))
+        return True
+
+class GenerationTracker:
+    """Tracks the in-flight generation of each Socket.IO session.
+
+    A new message from the same session supersedes the previous generation and a
+    disconnect cancels it, so abandoned replies stop using tokens and green threads.
+    """
+
+    def __init__(self):
+        self._active = {}
+        self._lock = threading.Lock()
+        self.stats_counts = {'started': 0, 'completed': 0, 'superseded': 0, 'disconnected': 0}
+        self._cancel_latency_total = 0.0
+        self._cancel_latency_count = 0
+
+    def begin(self, key):
+        generation = Generation(key)
+        with self._lock:
+            previous = self._active.get(key)
+            self._active[key] = generation
+            self.stats_counts['started'] += 1
+        if previous is not None:
+            previous.cancel('superseded')
+        return generation
+
+    def cancel(self, key, reason='disconnected', grace=0):
+        with self._lock:
+            generation = self._active.pop(key, None)
+        if generation is None:
+            return
+        if grace and generation.resumable:
+            # Give the client time to reconnect and resend; a resend adopts the reply instead
+            greenthread.spawn_after(grace, self._cancel_unless_adopted, generation, reason)
+        else:
+            generation.cancel(reason)
+
+    def _cancel_unless_adopted(self, generation, reason):
+        if not generation.adopted:
+            generation.cancel(reason)
+
+    def finish(self, generation):
+        with self._lock:
+            if self._active.get(generation.key) is generation:
+                del self._active[generation.key]
+            if generation.cancelled:
+                self.stats_counts[generation.reason] = self.stats_counts.get(generation.reason, 0) + 1
+                # How long the cancelled work kept running after it was abandoned
+                self._cancel_latency_total += time.monotonic() - generation.cancelled_at
+                self._cancel_latency_count += 1
+            else:
+                self.stats_counts['completed'] += 1
+
+    def is_current(self, generation):
+        return self._active.get(generation.key) is generation
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.stats_counts)
+            counts['active'] = len(self._active)
+            counts['avg_cancel_latency_ms'] = round(
+                self._cancel_latency_total / self._cancel_latency_count * 1000, 1
+            ) if self._cancel_latency_count else 0.0
+        return counts
+
+generation_tracker = GenerationTracker()
@@ -0,0 +1,60 @@
+import os
+import time
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import text
+from extensions import db, socketio
+
+class HealthProbe:
+    """Checks the database from a background task.
+
+    Workers start without waiting on the database, and /health answers from the
+    last result instead of opening a connection per probe.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._result = {'ok': False, 'status': 'starting'}
+        self._started = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def check(self):
+        start = time.perf_counter()
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            result = {'ok': True, 'status': 'ok', 'latency_ms': round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:
+            result = {'ok': False, 'status': 'unavailable', 'error': type(e).__name__}
+            if self._result.get('ok') or self._result.get('status') == 'starting':
+                current_app.logger.error(f"Database health check failed: {type(e).__name__}: {str(e)}")
+        result['checked_at'] = datetime.utcnow().isoformat()
+        self._result = result
+        return result
+
+    def start(self):
+        with self._lock:
+            if self._started or self.app is None:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def status(self):
+        # Started on first use too, so the probe also runs under servers that skip app.py's main block
+        self.start()
+        return {
+            'database': self._result,
+            'openai_configured': bool(os.environ.get('OPENAI_API_KEY'))
+        }
+
+    def _run(self):
+        while True:
+            with self.app.app_context():
+                self.check()
+            socketio.sleep(self.app.config['HEALTH_CHECK_INTERVAL'])
+
+health_probe = HealthProbe()
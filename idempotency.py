@@ -0,0 +1,82 @@
+import re
+import threading
+import time
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+class Submission:
+    def __init__(self, key):
+        self.key = key
+        self.result = None
+        self.done = False
+        self.generation = None  # The reply being generated for it, if any
+        self.updated_at = time.monotonic()
+        self._finished = threading.Event()
+
+class IdempotencyStore:
+    """Short-lived record of chat submissions keyed by a client-generated key.
+
+    The first submission with a key runs. A retry while it is still running
+    waits for its result, and a retry after it finished gets the stored result,
+    so a resend after a reconnect never saves the message or calls the model
+    twice. Like voice uploads this is per-process and relies on sticky routing.
+    """
+
+    def __init__(self, ttl=600, wait_timeout=120, reconnect_grace=30, max_entries=10000):
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.reconnect_grace = reconnect_grace
+        self.max_entries = max_entries
+        self._submissions = {}
+        self._lock = threading.Lock()
+
+    def configure(self, ttl=None, wait_timeout=None, reconnect_grace=None, max_entries=None):
+        if ttl is not None:
+            self.ttl = ttl
+        if wait_timeout is not None:
+            self.wait_timeout = wait_timeout
+        if reconnect_grace is not None:
+            self.reconnect_grace = reconnect_grace
+        if max_entries is not None:
+            self.max_entries = max_entries
+
+    @staticmethod
+    def valid_key(key):
+        return isinstance(key, str) and bool(IDEMPOTENCY_KEY_PATTERN.match(key))
+
+    def claim(self, scope, user_id, key):
+        """Return (submission, owner); only the owner should do the work"""
+        with self._lock:
+            self._expire()
+            submission = self._submissions.get((scope, user_id, key))
+            if submission is not None:
+                return submission, False
+            submission = Submission(key)
+            self._submissions[(scope, user_id, key)] = submission
+            return submission, True
+
+    def complete(self, scope, user_id, submission, result):
+        """Store the owner's result; with no result the key is released so a retry runs again"""
+        with self._lock:
+            submission.result = result
+            submission.done = True
+            submission.updated_at = time.monotonic()
+            if result is None and self._submissions.get((scope, user_id, submission.key)) is submission:
+                del self._submissions[(scope, user_id, submission.key)]
+        submission._finished.set()
+
+    def wait(self, submission):
+        """Wait for the owner to finish; returns False if it is still running after wait_timeout"""
+        return submission._finished.wait(self.wait_timeout)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for key in [key for key, s in self._submissions.items() if s.done and s.updated_at < cutoff]:
+            del self._submissions[key]
+        if len(self._submissions) >= self.max_entries:
+            # Drop the oldest finished submissions first; running ones are never evicted
+            finished = sorted((s.updated_at, key) for key, s in self._submissions.items() if s.done)
+            for _, key in finished[:len(self._submissions) - self.max_entries + 1]:
+                del self._submissions[key]
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,266 @@
+from flask import Blueprint, render_template, redirect, url_for, session, request, jsonify, current_app
+from flask_login import current_user, login_required
+from flask_socketio import emit
+from extensions import socketio
+from models import ChatMessage
+from chat_service import chat_service
+from audio_storage import audio_store
+from voice_upload import voice_uploads, VoiceUploadError
+from health import health_probe
+from generation_tracker import generation_tracker, GenerationCancelled
+from idempotency import idempotency_store
+from monitor_feed import monitor_feed
+from model_scheduler import model_scheduler
+
+main = Blueprint('main', __name__)
+
+@main.before_app_request
+def before_request():
+    # Static assets never need the user; skip the loader and the session write
+    if request.endpoint in ('static', 'main.serve_audio', 'main.health'):
+        return
+    # Only mark the session permanent once so it is not rewritten on every request
+    if not session.permanent and current_user.is_authenticated:
+        session.permanent = True
+
+@main.route('/')
+def index():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('auth.login'))
+
+@main.route('/dashboard')
+@login_required
+def dashboard():
+    if current_user.role == 'admin':
+        return render_template('dashboard/admin.html')
+    else:
+        chat_messages = ChatMessage.query.filter_by(user_id=current_user.id).order_by(ChatMessage.timestamp.desc()).all()
+        messages = [{
+            'content': msg.content,
+            'timestamp': msg.timestamp,
+            'is_ai_response': msg.is_ai_response
+        } for msg in chat_messages]
+        if current_user.role == 'therapist':
+            return render_template('dashboard/therapist.html', messages=messages)
+        else:
+            return render_template('dashboard/client.html', messages=messages)
+
+@main.route('/voice-message', methods=['POST'])
+@login_required
+def handle_voice_message():
+    try:
+        if current_user.role not in ['client', 'therapist', 'admin']:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+        
+        if 'audio' not in request.files:
+            return jsonify({'success': False, 'error': 'No audio file provided'}), 400
+        
+        audio_file = request.files['audio']
+        if not audio_file or not audio_file.filename:
+            return jsonify({'success': False, 'error': 'Empty audio file'}), 400
+        
+        # Process the voice message; resumable uploads (/voice-upload) handle retries by upload id
+        with model_scheduler.priority('voice'):
+            result = chat_service.process_voice_message(audio_file, current_user)
+        return voice_result_response(result)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in handle_voice_message: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'An unexpected error occurred: {str(e)}'
+        }), 500
+
+def voice_result_response(result):
+    if result and result.get('success', False):
+        return jsonify({
+            'success': True,
+            'transcript': result.get('transcript'),
+            'ai_response': result.get('ai_response'),
+            'ai_audio_url': result.get('ai_audio_url')
+        })
+    
+    return jsonify({
+        'success': False,
+        'error': (result or {}).get('error', 'Failed to process voice message')
+    }), 500
+
+@main.route('/voice-upload/<upload_id>', methods=['GET'])
+@login_required
+def voice_upload_status(upload_id):
+    try:
+        return jsonify(voice_uploads.status(upload_id, current_user.id))
+    except VoiceUploadError as e:
+        return jsonify({'success': False, 'error': str(e), **e.details}), e.status
+
+@main.route('/voice-upload/<upload_id>/<int:index>', methods=['PUT'])
+@login_required
+def upload_voice_chunk(upload_id, index):
+    if current_user.role not in ['client', 'therapist', 'admin']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    if request.content_length and request.content_length > voice_uploads.max_chunk_bytes:
+        return jsonify({'success': False, 'error': 'Chunk too large'}), 413
+    
+    try:
+        upload = voice_uploads.add_chunk(
+            upload_id,
+            current_user.id,
+            index,
+            request.get_data(),
+            content_type=request.args.get('type', 'audio/webm')
+        )
+        return jsonify({'success': True, 'received': index, 'bytes': upload.size})
+    except VoiceUploadError as e:
+        return jsonify({'success': False, 'error': str(e), **e.details}), e.status
+
+@main.route('/voice-upload/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_voice_upload(upload_id):
+    if current_user.role not in ['client', 'therapist', 'admin']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    
+    try:
+        upload, audio_bytes = voice_uploads.complete(
+            upload_id,
+            current_user.id,
+            request.args.get('total', 0, type=int),
+            duration_ms=request.args.get('duration_ms', type=int)
+        )
+    except VoiceUploadError as e:
+        return jsonify({'success': False, 'error': str(e), **e.details}), e.status
+    
+    # A retried completion after success replays the stored result
+    if audio_bytes is None:
+        return voice_result_response(upload.result)
+    
+    result = None
+    try:
+        # Transcription starts as soon as the last chunk is in
+        with model_scheduler.priority('voice'):
+            result = chat_service.process_voice_bytes(audio_bytes, upload.content_type, current_user)
+    finally:
+        voice_uploads.finish(upload, result)
+    return voice_result_response(result)
+
+@main.route('/audio/<path:key>')
+@login_required
+def serve_audio(key):
+    return audio_store.serve(key)
+
+@main.route('/health')
+def health():
+    status = health_probe.status()
+    return jsonify(status), 200 if status['database']['ok'] else 503
+
+@socketio.on('connect')
+def handle_connect():
+    if not current_user.is_authenticated:
+        return False
+    current_app.logger.info(f"User {current_user.email} connected")
+    return True
+
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    # Stop any reply still being generated for this connection, unless the client resends it
+    generation_tracker.cancel(request.sid, 'disconnected', grace=idempotency_store.reconnect_grace)
+    monitor_feed.forget(request.sid)
+    if current_user.is_authenticated:
+        current_app.logger.info(f"User {current_user.email} disconnected")
+
+@socketio.on_error()
+def error_handler(e):
+    current_app.logger.error(f"SocketIO error: {str(e)}")
+    return False
+
+def message_payload(message, idempotency_key=None):
+    return {
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+        'is_ai_response': message.is_ai_response,
+        'idempotency_key': idempotency_key
+    }
+
+def replay_message(submission):
+    """Answer a resent message from the original submission instead of running it again"""
+    if submission.generation is not None:
+        # Keep the reply going even though the connection that started it is gone
+        submission.generation.adopt()
+    if not submission.done:
+        emit('typing_indicator', {'typing': True})
+    finished = idempotency_store.wait(submission)
+    result = submission.result
+    if not finished or result is None:
+        emit('error', {'message': 'Failed to process message', 'idempotency_key': submission.key})
+    else:
+        emit('new_message', result['user_message'])
+        if result['ai_message']:
+            emit('new_message', result['ai_message'])
+        else:
+            emit('error', {'message': 'Failed to get AI response', 'idempotency_key': submission.key})
+    emit('typing_indicator', {'typing': False})
+
+@socketio.on('send_message')
+def handle_message(data):
+    if not current_user.is_authenticated or current_user.role not in ['client', 'therapist']:
+        emit('error', {'message': 'Unauthorized'})
+        return
+    
+    # Clients resend unanswered messages after a reconnect with the same key
+    key = data.get('idempotency_key')
+    submission = None
+    if key is not None:
+        if not idempotency_store.valid_key(key):
+            emit('error', {'message': 'Invalid idempotency key'})
+            return
+        submission, owner = idempotency_store.claim('send_message', current_user.id, key)
+        if not owner:
+            replay_message(submission)
+            return
+    
+    # A newer message from the same connection cancels the reply still in progress
+    generation = generation_tracker.begin(request.sid)
+    if submission is not None:
+        generation.resumable = True
+        submission.generation = generation
+    result = None
+    saved_message = None
+    try:
+        # Show the user message right away; it is saved with the AI reply in one commit
+        def emit_user_message(user_message):
+            nonlocal saved_message
+            saved_message = user_message
+            emit('new_message', message_payload(user_message, key))
+            emit('typing_indicator', {'typing': True})
+        
+        # Get and emit AI response
+        user_message, ai_message = chat_service.chat_turn(
+            data['message'],
+            current_user,
+            on_user_message=emit_user_message,
+            generation=generation
+        )
+        result = {
+            'user_message': message_payload(user_message, key),
+            'ai_message': message_payload(ai_message, key) if ai_message else None
+        }
+        
+        if ai_message:
+            emit('new_message', result['ai_message'])
+        else:
+            emit('error', {'message': 'Failed to get AI response', 'idempotency_key': key})
+        
+    except GenerationCancelled:
+        # chat_turn saved the user's message before dropping the reply; a resend replays it
+        # instead of saving it again
+        result = {'user_message': message_payload(saved_message, key), 'ai_message': None}
+    except Exception as e:
+        current_app.logger.error(f"Error in handle_message: {str(e)}")
+        emit('error', {'message': 'Failed to process message', 'idempotency_key': key})
+    finally:
+        if submission is not None:
+            idempotency_store.complete('send_message', current_user.id, submission, result)
+        # A cancelled reply leaves the typing indicator to the newer message (or the closed socket)
+        if not generation.cancelled:
+            emit('typing_indicator', {'typing': False})
+        generation_tracker.finish(generation)
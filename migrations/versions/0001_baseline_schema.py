@@ -0,0 +1,94 @@
+"""Baseline schema
+
+Databases created earlier by db.create_all() already have these tables;
+only missing ones are created, so existing data is left untouched.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=256), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('email_verified', sa.Boolean(), nullable=True),
+            sa.Column('verification_token', sa.String(length=100), nullable=True),
+            sa.Column('verification_token_expires', sa.DateTime(), nullable=True),
+            sa.Column('failed_login_attempts', sa.Integer(), nullable=True),
+            sa.Column('last_login', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('verification_token')
+        )
+
+    if 'audit_log' not in existing:
+        op.create_table('audit_log',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('action', sa.String(length=50), nullable=False),
+            sa.Column('details', sa.Text(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('ip_address', sa.String(length=45), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'chat_message' not in existing:
+        op.create_table('chat_message',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('is_ai_response', sa.Boolean(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('message_type', sa.String(length=10), nullable=True),
+            sa.Column('voice_url', sa.String(length=255), nullable=True),
+            sa.Column('monitored', sa.Boolean(), nullable=True),
+            sa.Column('flagged', sa.Boolean(), nullable=True),
+            sa.Column('monitor_notes', sa.Text(), nullable=True),
+            sa.Column('sentiment_score', sa.Float(), nullable=True),
+            sa.Column('sentiment_label', sa.String(length=50), nullable=True),
+            sa.Column('sentiment_analysis', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'outbound_email' not in existing:
+        op.create_table('outbound_email',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('to_email', sa.String(length=120), nullable=False),
+            sa.Column('subject', sa.String(length=255), nullable=False),
+            sa.Column('html_content', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('outbound_email')
+    op.drop_table('chat_message')
+    op.drop_table('audit_log')
+    op.drop_table('user')
@@ -0,0 +1,53 @@
+"""Indexes for hot queries
+
+Built with CREATE INDEX CONCURRENTLY on PostgreSQL so writes are not
+blocked while they build. Indexes that db.create_all() already made are
+skipped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_user_role', 'user', ['role'], None),
+    ('ix_user_is_active', 'user', ['is_active'], None),
+    ('ix_user_created_at', 'user', ['created_at'], None),
+    ('ix_audit_log_timestamp', 'audit_log', ['timestamp'], None),
+    ('ix_audit_log_action_timestamp', 'audit_log', ['action', 'timestamp'], None),
+    ('ix_chat_message_user_id_timestamp', 'chat_message', ['user_id', 'timestamp'], None),
+    ('ix_chat_message_timestamp', 'chat_message', ['timestamp'], None),
+    ('ix_chat_message_flagged_timestamp', 'chat_message', ['timestamp'], 'flagged'),
+    ('ix_outbound_email_status', 'outbound_email', ['status'], None),
+    ('ix_outbound_email_next_attempt_at', 'outbound_email', ['next_attempt_at'], None),
+]
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                sqlite_where=sa.text(where) if where else None
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
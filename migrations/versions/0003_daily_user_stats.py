@@ -0,0 +1,37 @@
+"""Per-user daily conversation rollups
+
+Run `flask analytics backfill` afterwards to fill in existing history.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('voice_count', sa.Integer(), nullable=False),
+        sa.Column('flagged_count', sa.Integer(), nullable=False),
+        sa.Column('sentiment_count', sa.Integer(), nullable=False),
+        sa.Column('sentiment_sum', sa.Float(), nullable=False),
+        sa.Column('sentiment_min', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_user_stats')
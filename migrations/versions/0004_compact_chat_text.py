@@ -0,0 +1,78 @@
+"""Compressed chat text and deduplicated sentiment explanations
+
+Existing rows keep their plain text; run `flask admin compact-text` to
+compress and deduplicate them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 16:00:00
+
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sentiment_explanation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('text_zlib', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('digest')
+    )
+    with op.batch_alter_table('chat_message') as batch_op:
+        batch_op.add_column(sa.Column('content_zlib', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('monitor_notes_zlib', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('sentiment_explanation_id', sa.Integer(), nullable=True))
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=True)
+        batch_op.create_foreign_key(
+            'fk_chat_message_sentiment_explanation_id', 'sentiment_explanation',
+            ['sentiment_explanation_id'], ['id']
+        )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_message_sentiment_explanation_id', 'chat_message', ['sentiment_explanation_id'],
+            if_not_exists=True,
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    # Put compressed and shared text back into the plain columns before dropping them
+    connection = op.get_bind()
+    rows = connection.execute(sa.text(
+        "SELECT m.id, m.content_zlib, m.monitor_notes_zlib, e.text, e.text_zlib FROM chat_message m "
+        "LEFT JOIN sentiment_explanation e ON e.id = m.sentiment_explanation_id "
+        "WHERE m.content_zlib IS NOT NULL OR m.monitor_notes_zlib IS NOT NULL OR m.sentiment_explanation_id IS NOT NULL"
+    ))
+    for message_id, content_zlib, notes_zlib, explanation, explanation_zlib in rows.fetchall():
+        values = {'id': message_id}
+        assignments = []
+        if content_zlib is not None:
+            values['content'] = zlib.decompress(content_zlib).decode('utf-8')
+            assignments.append('content = :content')
+        if notes_zlib is not None:
+            values['notes'] = zlib.decompress(notes_zlib).decode('utf-8')
+            assignments.append('monitor_notes = :notes')
+        if explanation_zlib is not None or explanation is not None:
+            values['analysis'] = zlib.decompress(explanation_zlib).decode('utf-8') if explanation_zlib is not None else explanation
+            assignments.append('sentiment_analysis = :analysis')
+        connection.execute(sa.text(f"UPDATE chat_message SET {', '.join(assignments)} WHERE id = :id"), values)
+    op.execute(sa.text("UPDATE chat_message SET content = '' WHERE content IS NULL"))
+    op.drop_index('ix_chat_message_sentiment_explanation_id', table_name='chat_message', if_exists=True)
+    with op.batch_alter_table('chat_message') as batch_op:
+        batch_op.drop_constraint('fk_chat_message_sentiment_explanation_id', type_='foreignkey')
+        batch_op.alter_column('content', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('sentiment_explanation_id')
+        batch_op.drop_column('monitor_notes_zlib')
+        batch_op.drop_column('content_zlib')
+    op.drop_table('sentiment_explanation')
@@ -0,0 +1,28 @@
+"""Heartbeat row for measuring read replica lag
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('replica_heartbeat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('beat_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('replica_heartbeat')
@@ -0,0 +1,30 @@
+"""Record the model routing decision on chat messages
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message') as batch_op:
+        batch_op.add_column(sa.Column('model', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('model_route', sa.String(length=30), nullable=True))
+        batch_op.add_column(sa.Column('sentiment_model', sa.String(length=50), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message') as batch_op:
+        batch_op.drop_column('sentiment_model')
+        batch_op.drop_column('model_route')
+        batch_op.drop_column('model')
@@ -0,0 +1,38 @@
+"""Index lower(email) for the admin directory's prefix search
+
+text_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%'
+whatever the database collation is.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 23:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_user_email_lower', 'user', [sa.text('lower(email) text_pattern_ops')],
+                if_not_exists=True, postgresql_concurrently=True
+            )
+    else:
+        op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index('ix_user_email_lower', table_name='user', if_exists=True, postgresql_concurrently=True)
+    else:
+        op.drop_index('ix_user_email_lower', table_name='user', if_exists=True)
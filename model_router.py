@@ -0,0 +1,149 @@
+import math
+import re
+import threading
+import time
+from collections import deque
+
+# Turns that touch on risk always get the strong model, whatever its latency
+RISK_PATTERN = re.compile(
+    r"\b(suicid\w*|kill(ing)? myself|end(ing)? (my life|it all)|self[- ]?harm\w*|hurt(ing)? myself|"
+    r"cutting myself|overdos\w*|abus\w*|hopeless|want(ed)? to die|no reason to live|can'?t go on)\b",
+    re.IGNORECASE
+)
+
+class Route:
+    """The model chosen for one call and why ('short', 'complex', 'risk', 'flagged', 'sentiment', 'default';
+    with ':failover' when the preferred model was over its latency budget)"""
+
+    def __init__(self, path, model, reason):
+        self.path = path
+        self.model = model
+        self.reason = reason
+
+class ModelRouter:
+    """Picks the chat model for each reply and sentiment analysis.
+
+    Short, low-risk replies and sentiment analysis go to the fast model; long
+    turns, turns mentioning risk and users with recently flagged messages get
+    the strong model. When a model's p95 latency over the last
+    MODEL_LATENCY_WINDOW_SECONDS exceeds the path's budget, calls fail over to
+    the other model while it is within budget. Risk and flagged turns never
+    fail over to the fast model. Once no new calls reach the slow model its
+    samples age out of the window and it is tried again.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.sentiment_model = None
+        self.configure(
+            enabled=True, strong_model='gpt-4', fast_model='gpt-4o-mini',
+            short_chars=160, budgets={}, costs={}, window=300, min_samples=5
+        )
+
+    def configure(self, enabled=None, strong_model=None, fast_model=None, sentiment_model=None,
+                  short_chars=None, budgets=None, costs=None, window=None, min_samples=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if strong_model is not None:
+            self.strong_model = strong_model
+        if fast_model is not None:
+            self.fast_model = fast_model
+        if sentiment_model is not None:
+            self.sentiment_model = sentiment_model or None  # Empty means the fast model
+        if short_chars is not None:
+            self.short_chars = short_chars
+        if budgets is not None:
+            self.budgets = dict(budgets)
+        if costs is not None:
+            self.costs = dict(costs)  # Dollars per 1K tokens
+        if window is not None:
+            self.window = window
+        if min_samples is not None:
+            self.min_samples = min_samples
+
+    def route(self, path, text='', flagged=None):
+        """Return the Route for a 'reply' or 'sentiment' call; flagged is called only if it could matter"""
+        if not self.enabled:
+            return Route(path, self.strong_model, 'default')
+        if path == 'sentiment':
+            model, reason = self.sentiment_model or self.fast_model, 'sentiment'
+        elif RISK_PATTERN.search(text):
+            return Route(path, self.strong_model, 'risk')
+        elif len(text) > self.short_chars:
+            model, reason = self.strong_model, 'complex'
+        elif flagged is not None and flagged():
+            return Route(path, self.strong_model, 'flagged')
+        else:
+            model, reason = self.fast_model, 'short'
+
+        alternate = self.strong_model if model != self.strong_model else self.fast_model
+        if alternate != model and self._over_budget(path, model) and not self._over_budget(path, alternate):
+            return Route(path, alternate, f'{reason}:failover')
+        return Route(path, model, reason)
+
+    def call(self, route, fn, *args, **kwargs):
+        """Run fn (a model call for route) and record its latency, tokens and estimated cost"""
+        start = time.monotonic()
+        try:
+            response = fn(*args, **kwargs)
+        except Exception:
+            # A failed call counts as slower than any budget
+            self.record(route, math.inf)
+            raise
+        usage = getattr(response, 'usage', None)
+        self.record(route, time.monotonic() - start, getattr(usage, 'total_tokens', None) or 0)
+        return response
+
+    def record(self, route, latency, tokens=0):
+        now = time.monotonic()
+        key = (route.path, route.model)
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=500)).append((now, latency))
+            counts = self._counts.setdefault(key, {'calls': 0, 'failures': 0, 'tokens': 0, 'reasons': {}})
+            counts['calls'] += 1
+            counts['failures'] += 1 if latency == math.inf else 0
+            counts['tokens'] += tokens
+            counts['reasons'][route.reason] = counts['reasons'].get(route.reason, 0) + 1
+
+    def p95(self, path, model):
+        """p95 latency in seconds over the window, or None with too few samples"""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            samples = self._samples.get((path, model))
+            if samples is None:
+                return None
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            latencies = sorted(latency for _, latency in samples)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def _over_budget(self, path, model):
+        budget = self.budgets.get(path)
+        if not budget:
+            return False
+        p95 = self.p95(path, model)
+        return p95 is not None and p95 > budget
+
+    def stats(self):
+        with self._lock:
+            counts = {key: {**value, 'reasons': dict(value['reasons'])} for key, value in self._counts.items()}
+        models = []
+        for (path, model), value in sorted(counts.items()):
+            p95 = self.p95(path, model)
+            models.append({
+                'path': path,
+                'model': model,
+                'calls': value['calls'],
+                'failures': value['failures'],
+                'reasons': value['reasons'],
+                'p95_seconds': None if p95 is None else (round(p95, 2) if p95 != math.inf else 'failing'),
+                'budget_seconds': self.budgets.get(path),
+                'estimated_cost': round(value['tokens'] / 1000 * self.costs.get(model, 0.0), 4)
+            })
+        return {'enabled': self.enabled, 'models': models}
+
+model_router = ModelRouter()
@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from flask import g, has_app_context
+
+# Highest priority first
+PRIORITY_CLASSES = ('voice', 'text', 'admin', 'background')
+
+class ModelCallExpired(Exception):
+    """A queued model call was dropped because its deadline passed before it could start"""
+
+class _Waiter:
+    def __init__(self, priority, deadline):
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.started = False
+        self.event = threading.Event()
+
+class ModelScheduler:
+    """Admits every outbound model call (chat, sentiment, speech) through one queue.
+
+    Each priority class is guaranteed its share of MODEL_MAX_CONCURRENCY slots.
+    Idle capacity is lent to lower classes only while the unused shares of the
+    classes above them stay free, so a burst of admin or background work cannot
+    take the slots an in-session reply needs. Within a class, calls start
+    earliest deadline first, and calls still queued at their deadline are
+    dropped with ModelCallExpired instead of being answered too late to matter.
+    """
+
+    def __init__(self, max_concurrency=16, shares=None, deadlines=None):
+        self._lock = threading.Lock()
+        self._queues = {name: [] for name in PRIORITY_CLASSES}
+        self._running = {name: 0 for name in PRIORITY_CLASSES}
+        self._sequence = itertools.count()
+        self._stats = {name: {'started': 0, 'expired': 0, 'waits': deque(maxlen=500)} for name in PRIORITY_CLASSES}
+        self.configure(max_concurrency, shares or {'voice': 0.35, 'text': 0.35, 'admin': 0.15, 'background': 0.15}, deadlines or {})
+
+    def configure(self, max_concurrency=None, shares=None, deadlines=None):
+        with self._lock:
+            if max_concurrency is not None:
+                self.max_concurrency = max(1, max_concurrency)
+            if shares is not None:
+                self.shares = {name: shares.get(name, 0.0) for name in PRIORITY_CLASSES}
+            if deadlines is not None:
+                self.deadlines = {name: deadlines.get(name) or None for name in PRIORITY_CLASSES}
+            # Every class with a share gets at least one slot of its own
+            self.reserved = {
+                name: max(1, int(self.max_concurrency * share)) if share > 0 else 0
+                for name, share in self.shares.items()
+            }
+
+    @contextmanager
+    def priority(self, name):
+        """Run the model calls made inside the block in the given class"""
+        if name not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown model call priority: {name}")
+        previous = g.get('model_priority')
+        g.model_priority = name
+        try:
+            yield
+        finally:
+            g.model_priority = previous
+
+    def current_priority(self):
+        return (g.get('model_priority') if has_app_context() else None) or 'text'
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn once a slot for the current priority class is free"""
+        name = self.current_priority()
+        self._acquire(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release(name)
+
+    def _acquire(self, name):
+        deadline = self.deadlines.get(name)
+        waiter = _Waiter(name, time.monotonic() + deadline if deadline else None)
+        with self._lock:
+            if not self._queues[name] and self._can_start(name):
+                self._start(waiter)
+                return
+            heapq.heappush(self._queues[name], (waiter.deadline or float('inf'), next(self._sequence), waiter))
+
+        try:
+            timeout = waiter.deadline - time.monotonic() if waiter.deadline else None
+            waiter.event.wait(timeout)
+        except BaseException:
+            # Cancelled while queued (e.g. the client went away): give up the place or the slot
+            with self._lock:
+                if waiter.started:
+                    self._running[name] -= 1
+                    self._dispatch()
+                else:
+                    self._remove(waiter)
+            raise
+
+        with self._lock:
+            if not waiter.started:
+                self._remove(waiter)
+                self._stats[name]['expired'] += 1
+                raise ModelCallExpired(f"{name} model call waited past its {deadline}s deadline")
+
+    def _release(self, name):
+        with self._lock:
+            self._running[name] -= 1
+            self._dispatch()
+
+    def _can_start(self, name):
+        running = sum(self._running.values())
+        if running >= self.max_concurrency:
+            return False
+        if self._running[name] < self.reserved[name]:
+            return True
+        # Borrow idle capacity, but never the unused share of a class above this one
+        higher = PRIORITY_CLASSES[:PRIORITY_CLASSES.index(name)]
+        if any(self._queues[other] for other in higher):
+            return False
+        held_back = sum(max(0, self.reserved[other] - self._running[other]) for other in higher)
+        return self.max_concurrency - running > held_back
+
+    def _start(self, waiter):
+        waiter.started = True
+        self._running[waiter.priority] += 1
+        stats = self._stats[waiter.priority]
+        stats['started'] += 1
+        stats['waits'].append(time.monotonic() - waiter.enqueued_at)
+        waiter.event.set()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for name in PRIORITY_CLASSES:
+            queue = self._queues[name]
+            while queue:
+                _, _, waiter = queue[0]
+                if waiter.deadline is not None and waiter.deadline <= now:
+                    # Past its deadline: wake it so it raises ModelCallExpired
+                    heapq.heappop(queue)
+                    waiter.event.set()
+                    continue
+                if not self._can_start(name):
+                    break
+                heapq.heappop(queue)
+                self._start(waiter)
+
+    def _remove(self, waiter):
+        queue = self._queues[waiter.priority]
+        for index, (_, _, queued) in enumerate(queue):
+            if queued is waiter:
+                queue[index] = queue[-1]
+                queue.pop()
+                heapq.heapify(queue)
+                return
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            for name in PRIORITY_CLASSES:
+                waits = sorted(self._stats[name]['waits'])
+                classes[name] = {
+                    'reserved': self.reserved[name],
+                    'running': self._running[name],
+                    'queued': len(self._queues[name]),
+                    'started': self._stats[name]['started'],
+                    'expired': self._stats[name]['expired'],
+                    'avg_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    'p95_wait_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0
+                }
+            return {'max_concurrency': self.max_concurrency, 'classes': classes}
+
+model_scheduler = ModelScheduler()
@@ -1,29 +1,53 @@
 from datetime import datetime, timedelta
 from extensions import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects import postgresql, sqlite
+from password_service import password_hasher
+from text_compression import compressed_text_property, text_compression
+import hashlib
 import secrets
 
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def upsert_insert(table):
+    """INSERT supporting ON CONFLICT for the session's database, or None if it has none"""
+    insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    return insert(table) if insert else None
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
-    is_active = db.Column(db.Boolean, default=False)
+    role = db.Column(db.String(20), nullable=False, index=True)
+    is_active = db.Column(db.Boolean, default=False, index=True)
     email_verified = db.Column(db.Boolean, default=False)
     verification_token = db.Column(db.String(100), unique=True)
     verification_token_expires = db.Column(db.DateTime)
     failed_login_attempts = db.Column(db.Integer, default=0)
     last_login = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     audit_logs = db.relationship('AuditLog', backref='user', lazy=True)
     chat_messages = db.relationship('ChatMessage', backref='user', lazy=True)
+
+    __table_args__ = (
+        # Serves the admin directory's case-insensitive "email starts with" search
+        db.Index(
+            'ix_user_email_lower', db.func.lower(email).label('email_lower'),
+            postgresql_ops={'email_lower': 'text_pattern_ops'}
+        ),
+    )
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def generate_verification_token(self):
         self.verification_token = secrets.token_urlsafe(32)
@@ -35,26 +59,127 @@ class AuditLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     action = db.Column(db.String(50), nullable=False)
     details = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     ip_address = db.Column(db.String(45))
 
+    __table_args__ = (
+        # Per-action counts over a time window (system status)
+        db.Index('ix_audit_log_action_timestamp', 'action', 'timestamp'),
+    )
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    _content = db.Column('content', db.Text)
+    _content_zlib = db.Column('content_zlib', db.LargeBinary)
+    content = compressed_text_property('_content', '_content_zlib')
     is_ai_response = db.Column(db.Boolean, default=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     message_type = db.Column(db.String(10), default='text')  # 'text' or 'voice'
     voice_url = db.Column(db.String(255))  # URL for voice messages
     monitored = db.Column(db.Boolean, default=False)  # For admin monitoring
     flagged = db.Column(db.Boolean, default=False)  # For flagging concerning messages
-    monitor_notes = db.Column(db.Text)  # Admin notes on monitored messages
+    # Admin notes on monitored messages; deferred so chat history queries skip them
+    _monitor_notes = db.deferred(db.Column('monitor_notes', db.Text), group='details')
+    _monitor_notes_zlib = db.deferred(db.Column('monitor_notes_zlib', db.LargeBinary), group='details')
+    monitor_notes = compressed_text_property('_monitor_notes', '_monitor_notes_zlib')
     sentiment_score = db.Column(db.Float)  # Sentiment score from -1 to 1
     sentiment_label = db.Column(db.String(50))  # Positive, Negative, or Neutral
-    sentiment_analysis = db.Column(db.Text)  # Detailed sentiment analysis
+    # Detailed sentiment analysis, shared between messages with the same explanation
+    sentiment_explanation_id = db.Column(db.Integer, db.ForeignKey('sentiment_explanation.id'), index=True)
+    sentiment_explanation = db.relationship('SentimentExplanation', lazy='select')
+    # Explanations saved before they were deduplicated
+    _sentiment_analysis = db.deferred(db.Column('sentiment_analysis', db.Text), group='details')
+    # Models that wrote an AI reply and its sentiment, and why the reply's model was chosen
+    model = db.Column(db.String(50))
+    model_route = db.Column(db.String(30))
+    sentiment_model = db.Column(db.String(50))
+
+    __table_args__ = (
+        # Chat history for one user, newest first; also serves lookups by user_id alone
+        db.Index('ix_chat_message_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_chat_message_timestamp', 'timestamp'),
+        # Flagged messages are rare, so only index those rows
+        db.Index(
+            'ix_chat_message_flagged_timestamp', 'timestamp',
+            postgresql_where=db.text('flagged'),
+            sqlite_where=db.text('flagged')
+        ),
+    )
+
+    @property
+    def sentiment_analysis(self):
+        if self.sentiment_explanation is not None:
+            return self.sentiment_explanation.text
+        return self._sentiment_analysis
+
+    @sentiment_analysis.setter
+    def sentiment_analysis(self, value):
+        self.sentiment_explanation = SentimentExplanation.for_text(value) if value else None
+        self._sentiment_analysis = None
 
     def set_content(self, content):
         self.content = content
 
     def get_content(self):
         return self.content
+
+class SentimentExplanation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of the text
+    _text = db.Column('text', db.Text)
+    _text_zlib = db.Column('text_zlib', db.LargeBinary)
+    text = compressed_text_property('_text', '_text_zlib')
+
+    @classmethod
+    def for_text(cls, text):
+        """Return the stored explanation with this text, adding it if it is new"""
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        explanation = cls.query.filter_by(digest=digest).first()
+        if explanation is not None:
+            return explanation
+
+        statement = upsert_insert(cls.__table__)
+        if statement is None:
+            explanation = cls(digest=digest, text=text)
+            db.session.add(explanation)
+            return explanation
+        # Concurrent turns may add the same explanation; whichever inserts first wins
+        plain, compressed = text_compression.encode(text)
+        db.session.execute(
+            statement.values(digest=digest, text=plain, text_zlib=compressed)
+            .on_conflict_do_nothing(index_elements=['digest'])
+        )
+        return cls.query.filter_by(digest=digest).one()
+
+class DailyUserStats(db.Model):
+    """Per-user daily conversation rollup, kept current as chat turns are saved"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    message_count = db.Column(db.Integer, default=0, nullable=False)  # Messages written by the user
+    voice_count = db.Column(db.Integer, default=0, nullable=False)  # Of those, sent as voice
+    flagged_count = db.Column(db.Integer, default=0, nullable=False)
+    sentiment_count = db.Column(db.Integer, default=0, nullable=False)
+    sentiment_sum = db.Column(db.Float, default=0.0, nullable=False)
+    sentiment_min = db.Column(db.Float)
+
+    @property
+    def sentiment_mean(self):
+        return self.sentiment_sum / self.sentiment_count if self.sentiment_count else None
+
+class ReplicaHeartbeat(db.Model):
+    """Single row the primary stamps regularly; its age on a replica is that replica's lag"""
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
+
+class OutboundEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_content = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False, index=True)  # pending, sending, sent or failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
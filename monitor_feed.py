@@ -0,0 +1,47 @@
+import threading
+
+class MonitorFeed:
+    """Tracks what each admin connection was last sent for the monitoring view.
+
+    After the first listing a connection only receives fields that changed
+    since it last saw a message, plus the order of the messages to show; the
+    dashboard keeps the full messages and applies the changes.
+    """
+
+    def __init__(self, max_messages=1000):
+        self.max_messages = max_messages
+        self._sent = {}
+        self._lock = threading.Lock()
+
+    def diff(self, sid, messages):
+        """Return the admin_messages payload for messages, a list of dicts with an 'id'"""
+        with self._lock:
+            sent = self._sent.setdefault(sid, {})
+            unseen = sum(1 for message in messages if message['id'] not in sent)
+            if len(sent) + unseen > self.max_messages:
+                # The client keeps every message it was sent, so starting over only costs full payloads
+                sent.clear()
+            changes = []
+            for message in messages:
+                previous = sent.get(message['id'])
+                if previous is None:
+                    changes.append(message)
+                else:
+                    changed = {key: value for key, value in message.items() if previous.get(key) != value}
+                    if changed:
+                        changes.append({'id': message['id'], **changed})
+                sent[message['id']] = message
+        return {'order': [message['id'] for message in messages], 'changes': changes}
+
+    def update(self, sid, message_id, **fields):
+        """Record fields the connection was sent outside a listing"""
+        with self._lock:
+            message = self._sent.get(sid, {}).get(message_id)
+            if message is not None:
+                self._sent[sid][message_id] = {**message, **{key: value for key, value in fields.items() if key in message}}
+
+    def forget(self, sid):
+        with self._lock:
+            self._sent.pop(sid, None)
+
+monitor_feed = MonitorFeed()
@@ -0,0 +1,70 @@
+import threading
+from eventlet import tpool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasher:
+    """Runs password hashing on native worker threads so it never blocks the eventlet hub.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so hashes run in parallel with
+    socket traffic. With workers=0 hashing runs inline, which is what CLI tools use.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=0):
+        self.method = method
+        self.workers = workers
+        self._slots = threading.Semaphore(workers) if workers > 0 else None
+        self._canonical_method = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def configure(self, method=None, workers=None):
+        if method is not None:
+            self.method = method
+            self._canonical_method = None
+        if workers is not None:
+            self.workers = workers
+            self._slots = threading.Semaphore(workers) if workers > 0 else None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when password_hash was produced with different parameters than self.method"""
+        if not password_hash or '$' not in password_hash:
+            return True
+        if self._canonical_method is None:
+            # Werkzeug fills in default parameters, so ask it what the configured method expands to
+            self._canonical_method = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._canonical_method
+
+    def queue_depth(self):
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'queue_depth': self.queue_depth()
+        }
+
+    def _run(self, func, *args):
+        slots = self._slots
+        if slots is None:
+            return func(*args)
+
+        with self._lock:
+            self._pending += 1
+        try:
+            with slots:
+                return tpool.execute(func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+password_hasher = PasswordHasher()
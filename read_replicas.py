@@ -0,0 +1,212 @@
+import random
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, select, update
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+class RoutingSession(Session):
+    """db.session class that lets replica_router send plain SELECTs to a read replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None:
+            engine = replica_router.engine_for(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush(session, flush_context):
+    # Anything read after a write in the same transaction must come from the primary
+    session.info['wrote'] = True
+    if has_request_context() and current_user.is_authenticated:
+        session.info['writer'] = current_user.id
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _note_commit(session):
+    wrote = session.info.pop('wrote', False)
+    writer = session.info.pop('writer', None)
+    if wrote and writer is not None:
+        replica_router.note_write(writer)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _note_rollback(session):
+    session.info.pop('wrote', None)
+    session.info.pop('writer', None)
+
+class ReplicaRouter:
+    """Sends read-only admin and analytics queries to read replicas.
+
+    Only views marked with replica_reads are routed, and only SELECTs issued
+    before the session writes anything. The primary stamps a heartbeat row every
+    REPLICA_HEARTBEAT_INTERVAL seconds; a replica is used while the newest
+    heartbeat it has replayed is at most REPLICA_MAX_LAG_SECONDS old, and for
+    a user who just wrote, only once it has replayed a heartbeat stamped after
+    that write. Otherwise, or when no replica answers, reads stay on the primary.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.max_lag = 10.0
+        self.heartbeat_interval = 1.0
+        self._replicas = {}
+        self._last_writes = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self.stats_counts = {'replica_reads': 0, 'primary_reads': 0, 'fallbacks': 0}
+
+    def init_app(self, app):
+        """Register the replicas as SQLAlchemy binds; call before db.init_app(app)"""
+        self.app = app
+        self.max_lag = app.config['REPLICA_MAX_LAG_SECONDS']
+        self.heartbeat_interval = app.config['REPLICA_HEARTBEAT_INTERVAL']
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        self._replicas = {}
+        for index, url in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+            name = f'{REPLICA_BIND_PREFIX}{index}'
+            binds[name] = url
+            self._replicas[name] = {'healthy': False, 'heartbeat_at': None, 'error': None}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    @property
+    def enabled(self):
+        return bool(self._replicas)
+
+    def engine_for(self, session, clause):
+        """The replica engine for this statement, or None to use the primary"""
+        if not self._replicas or not has_app_context() or not g.get('replica_reads'):
+            return None
+        if not getattr(clause, 'is_select', False) or getattr(clause, '_for_update_arg', None) is not None:
+            return None
+        if session._flushing or session.info.get('wrote'):
+            self.stats_counts['primary_reads'] += 1
+            return None
+
+        self.start()
+        name = session.info.get('replica')
+        if name is None or not self._usable(name):
+            candidates = [name for name in self._replicas if self._usable(name)]
+            if not candidates:
+                self.stats_counts['fallbacks'] += 1
+                return None
+            # Keep one replica per session so reads within a request agree with each other
+            name = session.info['replica'] = random.choice(candidates)
+        self.stats_counts['replica_reads'] += 1
+        return session._db.engines[name]
+
+    def _usable(self, name):
+        state = self._replicas[name]
+        heartbeat_at = state['heartbeat_at']
+        if not state['healthy'] or heartbeat_at is None:
+            return False
+        if datetime.utcnow() - heartbeat_at > timedelta(seconds=self.max_lag):
+            return False
+        if has_request_context() and current_user.is_authenticated:
+            last_write = self._last_writes.get(current_user.id)
+            if last_write is not None and heartbeat_at < last_write:
+                return False
+        return True
+
+    def note_write(self, user_id):
+        now = datetime.utcnow()
+        self._last_writes[user_id] = now
+        if len(self._last_writes) > 10000:
+            # Writes older than the lag bound are on every usable replica already
+            horizon = now - timedelta(seconds=self.max_lag)
+            self._last_writes = {key: value for key, value in self._last_writes.items() if value >= horizon}
+
+    def mark_unavailable(self, name, error):
+        state = self._replicas.get(name)
+        if state is None:
+            return
+        if state['healthy']:
+            current_app.logger.error(f"Read replica {name} unavailable, reading from primary: {error}")
+        state['healthy'] = False
+        state['error'] = type(error).__name__
+
+    def check(self):
+        """Stamp the heartbeat on the primary and read back each replica's copy"""
+        from models import ReplicaHeartbeat
+        db = self.app.extensions['sqlalchemy']
+        try:
+            with db.engine.begin() as connection:
+                updated = connection.execute(
+                    update(ReplicaHeartbeat).where(ReplicaHeartbeat.id == 1).values(beat_at=datetime.utcnow())
+                ).rowcount
+                if not updated:
+                    connection.execute(ReplicaHeartbeat.__table__.insert().values(id=1, beat_at=datetime.utcnow()))
+        except Exception as e:
+            current_app.logger.error(f"Failed to write replica heartbeat: {type(e).__name__}: {str(e)}")
+
+        for name, state in self._replicas.items():
+            try:
+                with db.engines[name].connect() as connection:
+                    heartbeat_at = connection.execute(
+                        select(ReplicaHeartbeat.beat_at).where(ReplicaHeartbeat.id == 1)
+                    ).scalar()
+                state.update(healthy=True, heartbeat_at=heartbeat_at, error=None)
+            except Exception as e:
+                self.mark_unavailable(name, e)
+
+    def start(self):
+        with self._lock:
+            if self._started or self.app is None or not self._replicas:
+                return
+            self._started = True
+        self.app.extensions['socketio'].start_background_task(self._run)
+
+    def _run(self):
+        socketio = self.app.extensions['socketio']
+        with self.app.app_context():
+            db = self.app.extensions['sqlalchemy']
+            for name in self._replicas:
+                event.listen(db.engines[name], 'handle_error', self._handle_error(name))
+        while True:
+            with self.app.app_context():
+                self.check()
+            socketio.sleep(self.heartbeat_interval)
+
+    def _handle_error(self, name):
+        def handle_error(context):
+            # Stop routing to a replica as soon as it fails instead of waiting for the next check
+            if context.is_disconnect or isinstance(context.original_exception, exc.OperationalError):
+                self.mark_unavailable(name, context.original_exception)
+        return handle_error
+
+    def stats(self):
+        now = datetime.utcnow()
+        return {
+            **self.stats_counts,
+            'max_lag_seconds': self.max_lag,
+            'replicas': [{
+                'name': name,
+                'healthy': state['healthy'],
+                'lag_seconds': round((now - state['heartbeat_at']).total_seconds(), 1) if state['heartbeat_at'] else None,
+                'error': state['error']
+            } for name, state in self._replicas.items()]
+        }
+
+replica_router = ReplicaRouter()
+
+def replica_reads(f):
+    """Let the view's read-only queries go to a replica; retried on the primary if the replica fails"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.replica_reads = True
+        try:
+            return f(*args, **kwargs)
+        except exc.DBAPIError:
+            db = current_app.extensions['sqlalchemy']
+            if db.session.info.get('replica') is None:
+                raise
+            db.session.rollback()
+            db.session.info.pop('replica', None)
+            g.replica_reads = False
+            return f(*args, **kwargs)
+        finally:
+            g.replica_reads = False
+    return decorated_function
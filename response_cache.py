@@ -0,0 +1,165 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from model_router import RISK_PATTERN
+
+NON_WORD = re.compile(r'[^\w\s]')
+WHITESPACE = re.compile(r'\s+')
+# One word flips the meaning of these, so they are never answered from a near match
+NEGATION_PATTERN = re.compile(r"\b(not|no|never|nothing|nobody|none|neither|nor|cannot|without|\w+n'?t)\b", re.IGNORECASE)
+
+def normalize(text):
+    text = NON_WORD.sub('', text.lower())
+    return WHITESPACE.sub(' ', text).strip()
+
+def ngram_vector(text, dimensions, n=3):
+    """L2-normalised hashed character n-gram counts, good enough to catch rewordings of short check-ins"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    padded = f' {text} '
+    for i in range(max(len(padded) - n + 1, 1)):
+        vector[zlib.crc32(padded[i:i + n].encode('utf-8')) % dimensions] += 1
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+class ResponseCache:
+    """Opt-in cache of AI replies for repeated short prompts.
+
+    Exact matches are looked up by normalised text and may be shared between
+    users. Near matches (cosine similarity over an n-gram matrix held in a
+    single NumPy array) are off unless similarity_threshold is set, only ever
+    match the same user's earlier prompts, and are never used for prompts with
+    a negation. Prompts that touch on risk are never cached. Only the reply is
+    stored; sentiment is always analysed on the actual message.
+    """
+
+    def __init__(self, enabled=False, ttl=3600, max_entries=2048, similarity_threshold=0,
+                 max_prompt_chars=200, dimensions=512):
+        self.enabled = enabled
+        self.bypass_user_ids = set()
+        self._lock = threading.Lock()
+        self._setup(ttl, max_entries, similarity_threshold, max_prompt_chars, dimensions)
+
+    def configure(self, enabled=None, ttl=None, max_entries=None, similarity_threshold=None,
+                  max_prompt_chars=None, bypass_user_ids=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if bypass_user_ids is not None:
+                self.bypass_user_ids = set(bypass_user_ids)
+            self._setup(
+                self.ttl if ttl is None else ttl,
+                self.max_entries if max_entries is None else max_entries,
+                self.similarity_threshold if similarity_threshold is None else similarity_threshold,
+                self.max_prompt_chars if max_prompt_chars is None else max_prompt_chars,
+                self.dimensions
+            )
+
+    def _setup(self, ttl, max_entries, similarity_threshold, max_prompt_chars, dimensions):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.max_prompt_chars = max_prompt_chars
+        self.dimensions = dimensions
+        # key -> (slot, expires_at, value); ordered oldest-used first
+        self._entries = OrderedDict()
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._slot_keys = [None] * max_entries
+        self._slot_users = np.full(max_entries, -1, dtype=np.int64)  # Who asked the cached prompt
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self.stats_counts = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0}
+
+    def cacheable(self, prompt, user_id=None):
+        return (
+            self.enabled
+            and user_id not in self.bypass_user_ids
+            and len(prompt) <= self.max_prompt_chars
+            and not RISK_PATTERN.search(prompt)
+        )
+
+    def _near_match_allowed(self, key, user_id):
+        return self.similarity_threshold > 0 and user_id is not None and not NEGATION_PATTERN.search(key)
+
+    def get(self, prompt, user_id=None):
+        """Return the cached value for prompt (or a near match from the same user), or None"""
+        if not self.cacheable(prompt, user_id):
+            if self.enabled:
+                with self._lock:
+                    self.stats_counts['bypassed'] += 1
+            return None
+
+        key = normalize(prompt)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.stats_counts['exact_hits'] += 1
+                return entry[2]
+            if entry:
+                self._remove(key)
+
+            if self._entries and self._near_match_allowed(key, user_id):
+                similarities = self._vectors @ ngram_vector(key, self.dimensions)
+                similarities[self._slot_users != user_id] = -1
+                slot = int(np.argmax(similarities))
+                similar_key = self._slot_keys[slot]
+                if (similar_key is not None and similarities[slot] >= self.similarity_threshold
+                        and not NEGATION_PATTERN.search(similar_key)):
+                    entry = self._entries[similar_key]
+                    if entry[1] > now:
+                        self._entries.move_to_end(similar_key)
+                        self.stats_counts['similar_hits'] += 1
+                        return entry[2]
+                    self._remove(similar_key)
+
+            self.stats_counts['misses'] += 1
+            return None
+
+    def put(self, prompt, value, user_id=None):
+        if not self.cacheable(prompt, user_id):
+            return
+        key = normalize(prompt)
+        if not key:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))
+                self.stats_counts['evictions'] += 1
+            slot = self._free_slots.pop()
+            self._vectors[slot] = ngram_vector(key, self.dimensions)
+            self._slot_keys[slot] = key
+            self._slot_users[slot] = user_id if user_id is not None else -1
+            self._entries[key] = (slot, time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._setup(self.ttl, self.max_entries, self.similarity_threshold, self.max_prompt_chars, self.dimensions)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.stats_counts)
+            entries = len(self._entries)
+        hits = counts['exact_hits'] + counts['similar_hits']
+        lookups = hits + counts['misses']
+        counts.update({
+            'enabled': self.enabled,
+            'entries': entries,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0
+        })
+        return counts
+
+    def _remove(self, key):
+        slot = self._entries.pop(key)[0]
+        self._vectors[slot] = 0
+        self._slot_keys[slot] = None
+        self._slot_users[slot] = -1
+        self._free_slots.append(slot)
+
+response_cache = ResponseCache()
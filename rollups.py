@@ -0,0 +1,168 @@
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import case, insert, select
+from extensions import db
+from models import ChatMessage, DailyUserStats, upsert_insert
+
+ROLLUP_COLUMNS = ['message_count', 'voice_count', 'flagged_count', 'sentiment_count', 'sentiment_sum', 'sentiment_min']
+
+def _score(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _increment(user_id, day, message_count=0, voice_count=0, flagged_count=0, sentiment=None):
+    """Add to one user's rollup for one day within the current transaction"""
+    values = {
+        'user_id': user_id,
+        'day': day,
+        'message_count': message_count,
+        'voice_count': voice_count,
+        'flagged_count': flagged_count,
+        'sentiment_count': 1 if sentiment is not None else 0,
+        'sentiment_sum': sentiment or 0.0,
+        'sentiment_min': sentiment,
+    }
+    table = DailyUserStats.__table__
+    statement = upsert_insert(table)
+    if statement is None:
+        _increment_orm(values)
+        return
+
+    statement = statement.values(**values)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'day'],
+        set_={
+            'message_count': table.c.message_count + excluded.message_count,
+            'voice_count': table.c.voice_count + excluded.voice_count,
+            'flagged_count': table.c.flagged_count + excluded.flagged_count,
+            'sentiment_count': table.c.sentiment_count + excluded.sentiment_count,
+            'sentiment_sum': table.c.sentiment_sum + excluded.sentiment_sum,
+            'sentiment_min': case(
+                (table.c.sentiment_min.is_(None), excluded.sentiment_min),
+                (excluded.sentiment_min < table.c.sentiment_min, excluded.sentiment_min),
+                else_=table.c.sentiment_min
+            ),
+        }
+    )
+    db.session.execute(statement)
+
+def _increment_orm(values):
+    stats = db.session.get(DailyUserStats, (values['user_id'], values['day']), with_for_update=True)
+    if stats is None:
+        db.session.add(DailyUserStats(**values))
+        return
+    for column in ['message_count', 'voice_count', 'flagged_count', 'sentiment_count', 'sentiment_sum']:
+        setattr(stats, column, getattr(stats, column) + values[column])
+    if values['sentiment_min'] is not None and (stats.sentiment_min is None or values['sentiment_min'] < stats.sentiment_min):
+        stats.sentiment_min = values['sentiment_min']
+
+def record_turn(user_message, ai_message=None):
+    """Count a chat turn in the user's rollup; call before the turn is committed"""
+    _increment(
+        user_message.user_id,
+        user_message.timestamp.date(),
+        message_count=1,
+        voice_count=1 if user_message.message_type == 'voice' else 0,
+        sentiment=_score(ai_message.sentiment_score) if ai_message is not None else None
+    )
+
+def record_sentiment(user_message, score):
+    """Count a sentiment found after the turn was saved; call before it is committed"""
+    _increment(user_message.user_id, user_message.timestamp.date(), sentiment=_score(score))
+
+def record_flag_change(message, flagged):
+    if bool(message.flagged) == bool(flagged):
+        return
+    _increment(message.user_id, message.timestamp.date(), flagged_count=1 if flagged else -1)
+
+def recently_flagged(user_id, days=30):
+    """Whether any of the user's messages from the last days days are flagged.
+
+    Read on a connection of its own, so it neither flushes nor opens the session's transaction.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days)
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(DailyUserStats.user_id).where(
+                DailyUserStats.user_id == user_id,
+                DailyUserStats.day >= since,
+                DailyUserStats.flagged_count > 0
+            ).limit(1)
+        ).first() is not None
+
+def delete_user_rollups(user_id):
+    DailyUserStats.query.filter_by(user_id=user_id).delete()
+
+def _aggregate(frame):
+    """Collapse a chunk of chat_message rows into partial (user_id, day) rollups"""
+    frame = frame.dropna(subset=['timestamp'])
+    from_user = ~frame['is_ai_response'].fillna(False).astype(bool)
+    sentiment = pd.to_numeric(frame['sentiment_score'], errors='coerce')
+    frame = pd.DataFrame({
+        'user_id': frame['user_id'],
+        'day': pd.to_datetime(frame['timestamp']).dt.date,
+        'message_count': from_user.astype(int),
+        # Counted on the user's message only, as record_turn does
+        'voice_count': (from_user & (frame['message_type'] == 'voice')).astype(int),
+        'flagged_count': frame['flagged'].fillna(False).astype(bool).astype(int),
+        'sentiment_count': sentiment.notna().astype(int),
+        'sentiment_sum': sentiment.fillna(0.0),
+        'sentiment_min': sentiment,
+    })
+    return frame.groupby(['user_id', 'day']).agg(
+        message_count=('message_count', 'sum'),
+        voice_count=('voice_count', 'sum'),
+        flagged_count=('flagged_count', 'sum'),
+        sentiment_count=('sentiment_count', 'sum'),
+        sentiment_sum=('sentiment_sum', 'sum'),
+        sentiment_min=('sentiment_min', 'min'),
+    )
+
+def backfill(user_ids=None, chunksize=100000):
+    """Rebuild rollups from chat history and return the number of (user, day) rows written.
+
+    History is read in chunks and aggregated with pandas, then the affected
+    rollups are replaced in one transaction. Turns saved while this runs may be
+    counted twice, so run it right after the migration or at a quiet time.
+    """
+    query = select(
+        ChatMessage.user_id,
+        ChatMessage.timestamp,
+        ChatMessage.is_ai_response,
+        ChatMessage.message_type,
+        ChatMessage.flagged,
+        ChatMessage.sentiment_score
+    )
+    if user_ids:
+        query = query.where(ChatMessage.user_id.in_(user_ids))
+
+    partials = []
+    with db.engine.connect() as connection:
+        for chunk in pd.read_sql(query, connection, chunksize=chunksize):
+            partials.append(_aggregate(chunk))
+
+    rows = []
+    if partials:
+        # Partial sums, counts and minimums from each chunk combine exactly
+        combined = pd.concat(partials).groupby(level=['user_id', 'day']).agg({
+            'message_count': 'sum',
+            'voice_count': 'sum',
+            'flagged_count': 'sum',
+            'sentiment_count': 'sum',
+            'sentiment_sum': 'sum',
+            'sentiment_min': 'min',
+        }).reset_index()
+        combined = combined.astype(object).where(combined.notna(), None)
+        rows = combined[['user_id', 'day'] + ROLLUP_COLUMNS].to_dict('records')
+
+    stale = DailyUserStats.query
+    if user_ids:
+        stale = stale.filter(DailyUserStats.user_id.in_(user_ids))
+    stale.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(DailyUserStats), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,197 @@
+import io
+import subprocess
+import threading
+import time
+import eventlet
+from eventlet import tpool
+from flask import current_app
+
+class OpenAISpeechToText:
+    name = 'openai'
+
+    def __init__(self, get_client, model='whisper-1', timeout=None):
+        self.get_client = get_client  # Called per request, so local-only setups never need an API key
+        self.model = model
+        self.timeout = timeout
+
+    def transcribe(self, audio_path):
+        client = self.get_client()
+        if self.timeout:
+            client = client.with_options(timeout=self.timeout)
+        with open(audio_path, 'rb') as f:
+            return client.audio.transcriptions.create(
+                model=self.model,
+                file=f,
+                response_format="text"
+            )
+
+class OpenAITextToSpeech:
+    name = 'openai'
+
+    def __init__(self, get_client, model='tts-1', voice='alloy', timeout=None):
+        self.get_client = get_client
+        self.model = model
+        self.voice = voice
+        self.timeout = timeout
+
+    def synthesize(self, text):
+        """Return (audio_bytes, file_extension)"""
+        client = self.get_client()
+        if self.timeout:
+            client = client.with_options(timeout=self.timeout)
+        response = client.audio.speech.create(
+            model=self.model,
+            voice=self.voice,
+            input=text
+        )
+        return response.content, 'mp3'
+
+def run_off_hub(timeout, func, *args):
+    """Run CPU-bound work on a native thread so the eventlet hub keeps serving; raises TimeoutError after timeout.
+
+    A timed-out call stops blocking its caller, but its thread runs on until the work finishes.
+    """
+    with eventlet.Timeout(timeout, TimeoutError(f"Local speech processing took longer than {timeout}s")):
+        return tpool.execute(func, *args)
+
+class LocalSpeechToText:
+    """Offline recognition through the speech_recognition package (sphinx, vosk, whisper, ...)"""
+    name = 'local'
+
+    def __init__(self, engine='sphinx', language='en-US', timeout=30):
+        self.engine = engine
+        self.language = language
+        self.timeout = timeout
+        self._recognizer = None
+
+    def transcribe(self, audio_path):
+        return run_off_hub(self.timeout, self._transcribe, audio_path)
+
+    def _transcribe(self, audio_path):
+        import speech_recognition as sr
+        from pydub import AudioSegment
+
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+
+        # speech_recognition only reads WAV/AIFF/FLAC, so convert in memory first
+        extension = audio_path.rsplit('.', 1)[-1].lower()
+        codec = {'webm': 'opus', 'ogg': 'opus'}.get(extension)
+        segment = AudioSegment.from_file(audio_path, format=extension, codec=codec)
+        wav = io.BytesIO()
+        segment.set_channels(1).set_frame_rate(16000).set_sample_width(2).export(wav, format='wav')
+        wav.seek(0)
+
+        with sr.AudioFile(wav) as source:
+            audio = self._recognizer.record(source)
+        recognize = getattr(self._recognizer, f'recognize_{self.engine}')
+        if self.engine == 'sphinx':
+            return recognize(audio, language=self.language)
+        return recognize(audio)
+
+class LocalTextToSpeech:
+    """Offline synthesis with espeak-ng (or any command that writes WAV to stdout)"""
+    name = 'local'
+
+    def __init__(self, command='espeak-ng', voice=None, timeout=30):
+        self.command = command
+        self.voice = voice
+        self.timeout = timeout
+
+    def synthesize(self, text):
+        return run_off_hub(self.timeout, self._synthesize, text)
+
+    def _synthesize(self, text):
+        from pydub import AudioSegment
+
+        args = [self.command, '--stdout']
+        if self.voice:
+            args += ['-v', self.voice]
+        result = subprocess.run(args, input=text.encode('utf-8'), capture_output=True, timeout=self.timeout, check=True)
+
+        mp3 = io.BytesIO()
+        AudioSegment.from_file(io.BytesIO(result.stdout), format='wav').export(mp3, format='mp3', bitrate='48k')
+        return mp3.getvalue(), 'mp3'
+
+class FailoverSpeechBackend:
+    """Uses the primary backend until it fails or runs over its latency budget, then the fallback.
+
+    After tripping, the primary is retried once the cooldown has passed.
+    """
+
+    def __init__(self, primary, fallback, latency_budget=8.0, cooldown=60.0, slow_threshold=2):
+        self.primary = primary
+        self.fallback = fallback
+        self.latency_budget = latency_budget
+        self.cooldown = cooldown
+        self.slow_threshold = slow_threshold
+        self.name = f'{primary.name}+{fallback.name}'
+        self._tripped_until = 0
+        self._slow_calls = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio_path):
+        return self._call('transcribe', audio_path)
+
+    def synthesize(self, text):
+        return self._call('synthesize', text)
+
+    def _call(self, method, *args):
+        if time.monotonic() >= self._tripped_until:
+            start = time.monotonic()
+            try:
+                result = getattr(self.primary, method)(*args)
+            except Exception as e:
+                self._trip(f"{type(e).__name__}: {str(e)}")
+            else:
+                self._record_latency(time.monotonic() - start)
+                return result
+        return getattr(self.fallback, method)(*args)
+
+    def _record_latency(self, latency):
+        with self._lock:
+            if latency <= self.latency_budget:
+                self._slow_calls = 0
+                return
+            self._slow_calls += 1
+            slow_calls = self._slow_calls
+        if slow_calls >= self.slow_threshold:
+            self._trip(f"{slow_calls} calls over the {self.latency_budget}s latency budget")
+
+    def _trip(self, reason):
+        with self._lock:
+            self._tripped_until = time.monotonic() + self.cooldown
+            self._slow_calls = 0
+        current_app.logger.warning(f"Speech backend {self.primary.name} unavailable ({reason}), using {self.fallback.name} for {self.cooldown}s")
+
+def build_speech_to_text(name, get_client, config):
+    if name == 'openai':
+        return OpenAISpeechToText(get_client, model=config['OPENAI_STT_MODEL'], timeout=config['SPEECH_REQUEST_TIMEOUT'])
+    if name == 'local':
+        return LocalSpeechToText(engine=config['STT_LOCAL_ENGINE'], language=config['STT_LOCAL_LANGUAGE'], timeout=config['SPEECH_REQUEST_TIMEOUT'])
+    raise ValueError(f"Unknown speech-to-text backend: {name}")
+
+def build_text_to_speech(name, get_client, config):
+    if name == 'openai':
+        return OpenAITextToSpeech(get_client, model=config['OPENAI_TTS_MODEL'], voice=config['OPENAI_TTS_VOICE'], timeout=config['SPEECH_REQUEST_TIMEOUT'])
+    if name == 'local':
+        return LocalTextToSpeech(command=config['TTS_LOCAL_COMMAND'], voice=config['TTS_LOCAL_VOICE'], timeout=config['SPEECH_REQUEST_TIMEOUT'])
+    raise ValueError(f"Unknown text-to-speech backend: {name}")
+
+def build_speech_backend(kind, get_client, config):
+    """Build the configured STT ('stt') or TTS ('tts') backend, wrapped for failover if a fallback is set.
+
+    get_client returns the OpenAI client and is only called by the OpenAI backends.
+    """
+    build = build_speech_to_text if kind == 'stt' else build_text_to_speech
+    prefix = kind.upper()
+    backend = build(config[f'{prefix}_BACKEND'], get_client, config)
+    fallback_name = config[f'{prefix}_FALLBACK_BACKEND']
+    if not fallback_name or fallback_name == config[f'{prefix}_BACKEND']:
+        return backend
+    return FailoverSpeechBackend(
+        backend,
+        build(fallback_name, get_client, config),
+        latency_budget=config['SPEECH_LATENCY_BUDGET_SECONDS'],
+        cooldown=config['SPEECH_FAILOVER_COOLDOWN_SECONDS']
+    )
@@ -0,0 +1,109 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const clientSelect = document.getElementById('trend-client');
+    const daysSelect = document.getElementById('trend-days');
+    const chart = document.getElementById('trend-chart');
+    const summary = document.getElementById('trend-summary');
+    if (!clientSelect || !chart) {
+        return;
+    }
+
+    const WIDTH = 720;
+    const HEIGHT = 180;
+    const PADDING = 24;
+    const DAY_MS = 24 * 60 * 60 * 1000;
+
+    function escapeHtml(value) {
+        return String(value ?? '').replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
+    }
+
+    function loadClients() {
+        fetch(`/analytics/clients?days=${daysSelect.value}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                const selected = clientSelect.value;
+                clientSelect.innerHTML = '<option value="">Select a client...</option>' +
+                    (data.clients || []).map(client =>
+                        `<option value="${client.id}">${escapeHtml(client.email)} (${client.message_count})</option>`
+                    ).join('');
+                clientSelect.value = selected;
+            })
+            .catch(error => console.error('Error loading clients:', error));
+    }
+
+    // Polyline segments for one series; days without a value break the line
+    function linePath(points) {
+        let path = '';
+        let drawing = false;
+        points.forEach(point => {
+            if (point === null) {
+                drawing = false;
+                return;
+            }
+            path += `${drawing ? 'L' : 'M'}${point[0].toFixed(1)},${point[1].toFixed(1)} `;
+            drawing = true;
+        });
+        return path;
+    }
+
+    function render(data) {
+        const byDay = new Map(data.series.map(row => [row.day, row]));
+        const start = new Date(`${data.since}T00:00:00Z`).getTime();
+        const step = (WIDTH - 2 * PADDING) / Math.max(data.days - 1, 1);
+        const y = score => PADDING + (1 - score) / 2 * (HEIGHT - 2 * PADDING);
+        const meanPoints = [];
+        const minPoints = [];
+
+        for (let i = 0; i < data.days; i++) {
+            const day = new Date(start + i * DAY_MS).toISOString().slice(0, 10);
+            const row = byDay.get(day);
+            const x = PADDING + i * step;
+            meanPoints.push(row && row.sentiment_mean !== null ? [x, y(row.sentiment_mean)] : null);
+            minPoints.push(row && row.sentiment_min !== null ? [x, y(row.sentiment_min)] : null);
+        }
+
+        if (!data.series.length) {
+            chart.innerHTML = 'No conversations in this period.';
+        } else {
+            chart.innerHTML = `
+                <svg viewBox="0 0 ${WIDTH} ${HEIGHT}" class="w-100" role="img" aria-label="Daily sentiment">
+                    <line x1="${PADDING}" x2="${WIDTH - PADDING}" y1="${y(0)}" y2="${y(0)}" stroke="currentColor" stroke-opacity="0.2"/>
+                    <text x="2" y="${y(1) + 4}" font-size="10" fill="currentColor">+1</text>
+                    <text x="2" y="${y(-1) + 4}" font-size="10" fill="currentColor">-1</text>
+                    <path d="${linePath(minPoints)}" fill="none" stroke="#dc3545" stroke-dasharray="4 3" stroke-width="1.5"/>
+                    <path d="${linePath(meanPoints)}" fill="none" stroke="#0d6efd" stroke-width="2"/>
+                </svg>`;
+        }
+
+        const totals = data.series.reduce((acc, row) => {
+            acc.messages += row.message_count;
+            acc.voice += row.voice_ratio * row.message_count;
+            acc.flagged += row.flagged_count;
+            return acc;
+        }, { messages: 0, voice: 0, flagged: 0 });
+        summary.innerHTML = `
+            <span><span class="badge bg-primary">&nbsp;</span> Mean sentiment</span>
+            <span><span class="badge bg-danger">&nbsp;</span> Lowest sentiment</span>
+            <span>Messages: <strong>${totals.messages}</strong></span>
+            <span>Voice: <strong>${totals.messages ? Math.round(totals.voice / totals.messages * 100) : 0}%</strong></span>
+            <span>Flagged: <strong>${totals.flagged}</strong></span>`;
+    }
+
+    function loadTrend() {
+        if (!clientSelect.value) {
+            return;
+        }
+        fetch(`/analytics/users/${clientSelect.value}/trend?days=${daysSelect.value}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(render)
+            .catch(error => console.error('Error loading sentiment trend:', error));
+    }
+
+    clientSelect.addEventListener('change', loadTrend);
+    daysSelect.addEventListener('change', () => {
+        loadClients();
+        loadTrend();
+    });
+    loadClients();
+});
@@ -3,13 +3,16 @@ document.addEventListener('DOMContentLoaded', function() {
     const recordButtonText = document.querySelector('.record-text');
     const voiceMessages = document.getElementById('voice-messages');
     let mediaRecorder;
-    let audioChunks = [];
+    let currentUpload = null;
     let recordingTimer;
     let startTime;
     let audioElements = new Map();
-    let retryCount = 0;
     const MAX_RETRIES = 3;
     const RETRY_DELAY = 2000;
+    // Chunks are uploaded while recording so only the last second is left when the user lets go
+    const CHUNK_INTERVAL_MS = 1000;
+    const AUDIO_BITS_PER_SECOND = 24000;
+    const MAX_RECORDING_SECONDS = 120;
     
     async function setupRecording() {
         try {
@@ -21,17 +24,24 @@ document.addEventListener('DOMContentLoaded', function() {
             });
             
             mediaRecorder = new MediaRecorder(stream, {
-                mimeType: 'audio/webm;codecs=opus'
+                mimeType: 'audio/webm;codecs=opus',
+                audioBitsPerSecond: AUDIO_BITS_PER_SECOND
             });
             
             mediaRecorder.ondataavailable = (event) => {
-                if (event.data.size > 0) {
-                    audioChunks.push(event.data);
+                const upload = currentUpload;
+                if (event.data.size > 0 && upload) {
+                    const index = upload.chunks.length;
+                    upload.chunks.push(event.data);
+                    upload.queue = upload.queue.then(() => sendChunk(upload, index));
                 }
             };
             
             mediaRecorder.onstop = async () => {
-                const duration = (Date.now() - startTime) / 1000;
+                const upload = currentUpload;
+                currentUpload = null;
+                const durationMs = Date.now() - startTime;
+                const duration = durationMs / 1000;
                 if (duration < 0.5) {
                     recordButtonText.textContent = 'Message too short. Hold longer to speak.';
                     setTimeout(() => {
@@ -40,7 +50,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
 
-                if (audioChunks.length === 0) {
+                if (!upload || upload.chunks.length === 0) {
                     console.error('No audio data recorded');
                     recordButtonText.textContent = 'No audio recorded. Please try again.';
                     setTimeout(() => {
@@ -49,9 +59,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
 
-                const audioBlob = new Blob(audioChunks, { type: 'audio/webm;codecs=opus' });
-                if (audioBlob.size < 1000) {
-                    console.error('Audio data too small', { size: audioBlob.size });
+                const size = upload.chunks.reduce((total, chunk) => total + chunk.size, 0);
+                if (size < 1000) {
+                    console.error('Audio data too small', { size: size });
                     recordButtonText.textContent = 'Recording too quiet. Please speak closer to the microphone.';
                     setTimeout(() => {
                         recordButtonText.textContent = 'Press and Hold to Speak';
@@ -59,8 +69,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
 
-                await sendVoiceMessage(audioBlob);
-                audioChunks = [];
+                await sendVoiceMessage(upload, durationMs);
             };
             
             return true;
@@ -104,6 +113,16 @@ document.addEventListener('DOMContentLoaded', function() {
         const minutes = Math.floor(elapsed / 60);
         const seconds = elapsed % 60;
         recordButtonText.textContent = `Recording... ${minutes}:${seconds.toString().padStart(2, '0')}`;
+        if (elapsed >= MAX_RECORDING_SECONDS) {
+            stopRecording();
+        }
+    }
+    
+    function newUploadId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID().replace(/-/g, '');
+        }
+        return Date.now().toString(36) + Math.random().toString(36).slice(2, 12);
     }
     
     async function startRecording() {
@@ -115,8 +134,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (!setup) return;
             }
             
-            audioChunks = [];
-            mediaRecorder.start(100);
+            currentUpload = {
+                id: newUploadId(),
+                chunks: [],
+                queue: Promise.resolve()
+            };
+            mediaRecorder.start(CHUNK_INTERVAL_MS);
             startTime = Date.now();
             recordButton.classList.add('recording');
             recordButtonText.textContent = 'Recording...';
@@ -150,64 +173,130 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    async function sendVoiceMessage(audioBlob) {
-        const formData = new FormData();
-        formData.append('audio', audioBlob, 'voice_message.webm');
-        
-        try {
-            recordButtonText.textContent = 'Sending message...';
-            const response = await fetch('/voice-message', {
-                method: 'POST',
-                body: formData,
-                headers: {
-                    'Accept': 'application/json'
-                }
-            });
-            
-            const responseText = await response.text();
-            let data;
-            
+    async function sendChunk(upload, index) {
+        for (let attempt = 0; attempt <= MAX_RETRIES; attempt++) {
             try {
-                data = JSON.parse(responseText);
-            } catch (e) {
-                console.error('Error parsing response:', {
-                    responseText,
-                    error: e.message,
-                    stack: e.stack,
+                const response = await fetch(`/voice-upload/${upload.id}/${index}?type=audio/webm`, {
+                    method: 'PUT',
+                    body: upload.chunks[index],
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'Accept': 'application/json'
+                    }
+                });
+                if (response.ok) {
+                    return true;
+                }
+                // Size and ownership errors will not get better on retry
+                if (response.status !== 503 && response.status < 500) {
+                    const data = await response.json().catch(() => ({}));
+                    console.error('Chunk rejected:', { index, status: response.status, error: data.error });
+                    return false;
+                }
+            } catch (error) {
+                console.error('Error uploading chunk:', {
+                    index: index,
+                    message: error.message,
+                    attempt: attempt,
                     timestamp: new Date().toISOString()
                 });
-                throw new Error(`Invalid server response: ${responseText}`);
             }
+            await new Promise(resolve => setTimeout(resolve, RETRY_DELAY));
+        }
+        // The completion request reports anything still missing and it is resent then
+        return false;
+    }
+    
+    async function completeUpload(upload, durationMs) {
+        const params = new URLSearchParams({ total: upload.chunks.length, duration_ms: Math.round(durationMs) });
+        const response = await fetch(`/voice-upload/${upload.id}/complete?${params}`, {
+            method: 'POST',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+        
+        const responseText = await response.text();
+        try {
+            return { response, data: JSON.parse(responseText) };
+        } catch (e) {
+            console.error('Error parsing response:', {
+                responseText,
+                error: e.message,
+                stack: e.stack,
+                timestamp: new Date().toISOString()
+            });
+            throw new Error(`Invalid server response: ${responseText}`);
+        }
+    }
+    
+    async function fetchUploadResult(upload) {
+        try {
+            const response = await fetch(`/voice-upload/${upload.id}`, { headers: { 'Accept': 'application/json' } });
+            if (response.ok) {
+                const status = await response.json();
+                return status.result;
+            }
+        } catch (error) {
+            console.error('Error checking upload status:', error.message);
+        }
+        return null;
+    }
+    
+    async function sendVoiceMessage(upload, durationMs) {
+        try {
+            recordButtonText.textContent = 'Sending message...';
+            await upload.queue;
             
-            if (!response.ok) {
-                throw new Error(`Server error: ${response.status} - ${data.error || responseText}`);
+            let data = null;
+            for (let attempt = 0; attempt <= MAX_RETRIES; attempt++) {
+                let response;
+                try {
+                    ({ response, data } = await completeUpload(upload, durationMs));
+                } catch (error) {
+                    if (error.message.includes('Invalid server response')) {
+                        throw error;
+                    }
+                    // The request may have reached the server; pick up its result if so
+                    const result = await fetchUploadResult(upload);
+                    if (result) {
+                        data = result;
+                        break;
+                    }
+                    recordButtonText.textContent = `Retrying... (${attempt + 1}/${MAX_RETRIES})`;
+                    await new Promise(resolve => setTimeout(resolve, RETRY_DELAY));
+                    continue;
+                }
+                
+                if (response.status === 409 && data.missing) {
+                    recordButtonText.textContent = `Resending audio... (${attempt + 1}/${MAX_RETRIES})`;
+                    for (const index of data.missing) {
+                        await sendChunk(upload, index);
+                    }
+                    continue;
+                }
+                if (!response.ok) {
+                    throw new Error(`Server error: ${response.status} - ${data.error || 'Unknown error'}`);
+                }
+                break;
             }
             
-            if (data.success) {
-                retryCount = 0;
+            if (data && data.success) {
                 if (data.ai_audio_url) {
                     addVoiceMessage(data.ai_audio_url);
                 }
                 recordButtonText.textContent = 'Message sent successfully';
             } else {
-                throw new Error(data.error || 'Unknown error occurred');
+                throw new Error((data && data.error) || 'Unknown error occurred');
             }
         } catch (error) {
             console.error('Error sending voice message:', {
                 name: error.name,
                 message: error.message,
                 stack: error.stack,
-                retryCount: retryCount,
                 timestamp: new Date().toISOString()
             });
 
-            if (retryCount < MAX_RETRIES) {
-                retryCount++;
-                recordButtonText.textContent = `Retrying... (${retryCount}/${MAX_RETRIES})`;
-                await new Promise(resolve => setTimeout(resolve, RETRY_DELAY));
-                return sendVoiceMessage(audioBlob);
-            }
-
             let errorMessage = 'Error sending message. Please try again.';
             if (error.message.includes('Invalid server response')) {
                 errorMessage = 'Server communication error. Please try again.';
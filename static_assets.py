@@ -0,0 +1,335 @@
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import mimetypes
+import os
+import re
+import urllib.request
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+BUILD_DIR = 'dist'
+SOURCE_DIRS = ('css', 'js', 'images', 'vendor')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+SOCKETIO_CLIENT_VERSION = '4.0.1'
+# Fetched once by `flask assets vendor` and committed with their SHA-384 in VENDOR_CHECKSUMS;
+# the build only verifies them, so deploys never reach the network
+VENDOR_FILES = {
+    f'vendor/socket.io/{SOCKETIO_CLIENT_VERSION}/{name}': f'https://cdnjs.cloudflare.com/ajax/libs/socket.io/{SOCKETIO_CLIENT_VERSION}/{name}'
+    for name in ('socket.io.min.js', 'socket.io.msgpack.min.js')
+}
+VENDOR_CHECKSUMS = 'vendor/SHA384SUMS'
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+class StaticAssets:
+    """Serves the fingerprinted, precompressed build of the static folder.
+
+    `flask assets build` writes minified copies of static/css, static/js,
+    static/images and static/vendor to static/dist with a content hash in the
+    name, plus .br and .gz variants and a manifest. With a manifest present,
+    url_for('static', ...) points at the build, and those files are served in
+    the best encoding the browser accepts with an immutable cache header, so
+    repeat page loads do not ask for them at all. Without a build the original
+    files are served as before with STATIC_MAX_AGE.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.files = {}
+        self._built = {}
+        self.max_age = 3600
+
+    def init_app(self, app):
+        self.app = app
+        self.max_age = app.config['STATIC_MAX_AGE']
+        self.files = self.load_manifest(app.static_folder) if app.config['STATIC_ASSETS_ENABLED'] else {}
+        self._built = {entry['path']: entry for entry in self.files.values()}
+        app.url_defaults(self._fingerprint_url)
+        # The built-in static route is the only one for /static; it now goes through serve()
+        app.view_functions['static'] = self.serve
+        app.jinja_env.globals['static_assets'] = self
+        app.cli.add_command(assets_cli)
+
+    @staticmethod
+    def load_manifest(static_folder):
+        path = os.path.join(static_folder, BUILD_DIR, 'manifest.json')
+        try:
+            with open(path) as f:
+                return json.load(f)['files']
+        except FileNotFoundError:
+            return {}
+
+    def built(self, filename):
+        """Whether filename (relative to static/) is part of the current build"""
+        return filename in self.files
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]['path']
+
+    def serve(self, filename):
+        static_folder = current_app.static_folder
+        entry = self._built.get(filename)
+        if entry is None:
+            return send_from_directory(static_folder, filename, max_age=self.max_age)
+
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in entry['encodings'] and request.accept_encodings[encoding]:
+                response = send_from_directory(
+                    static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                )
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(static_folder, filename)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        return response
+
+static_assets = StaticAssets()
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+def _minify(source, data):
+    """Minify CSS with rcssmin or JS with rjsmin, when installed"""
+    if source.endswith(('.min.js', '.min.css')):
+        return data
+    if source.endswith('.css') and _installed('rcssmin'):
+        import rcssmin
+        return rcssmin.cssmin(data.decode('utf-8')).encode('utf-8')
+    if source.endswith('.js') and _installed('rjsmin'):
+        import rjsmin
+        return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+    return data
+
+def _optimize_image(data, extension, max_size):
+    """Downscale to max_size pixels on the longest side and re-encode with Pillow, when installed.
+
+    PNGs are reduced to a 256 colour palette, which suits the logos and icons kept here.
+    """
+    if not _installed('PIL'):
+        return data
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    if extension == '.png':
+        if image.mode not in ('P', 'L'):
+            image = image.quantize(256, method=Image.Quantize.FASTOCTREE)
+        image.save(output, format='PNG', optimize=True)
+    else:
+        image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True, progressive=True)
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(data) else data
+
+def _compressed_variants(data):
+    """Return (encoding, suffix, bytes) for each encoding that actually shrinks data"""
+    variants = [('gzip', '.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if _installed('brotli'):
+        import brotli
+        variants.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+    return [variant for variant in variants if len(variant[2]) < len(data)]
+
+def _rewrite_css_urls(data, source, files):
+    """Point url(...) references in a stylesheet at the fingerprinted files"""
+    base = os.path.dirname(source)
+
+    def replace(match):
+        reference = match.group(2)
+        if '://' in reference or reference.startswith(('data:', '/', '#')):
+            return match.group(0)
+        path, _, suffix = reference.partition('?')
+        target = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        if target not in files:
+            return match.group(0)
+        # The built stylesheet sits in the same place under dist/ as its source
+        built = os.path.relpath(files[target]['path'], f'{BUILD_DIR}/{base}').replace(os.sep, '/')
+        return f'url({match.group(1)}{built}{"?" + suffix if suffix else ""}{match.group(1)})'
+
+    return CSS_URL_PATTERN.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+def _sha384(data):
+    return hashlib.sha384(data).hexdigest()
+
+def load_vendor_checksums(static_folder):
+    """Pinned SHA-384 of each vendored file, from static/vendor/SHA384SUMS (sha384sum format)"""
+    checksums = {}
+    try:
+        with open(os.path.join(static_folder, *VENDOR_CHECKSUMS.split('/'))) as f:
+            for line in f:
+                if line.strip():
+                    digest, name = line.split(None, 1)
+                    checksums[f'vendor/{name.strip().lstrip("*")}'] = digest.lower()
+    except FileNotFoundError:
+        pass
+    return checksums
+
+def _write_vendor_checksums(static_folder, checksums):
+    path = os.path.join(static_folder, *VENDOR_CHECKSUMS.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for name in sorted(checksums):
+            f.write(f"{checksums[name]}  {name.removeprefix('vendor/')}\n")
+
+def verify_vendor_files(static_folder):
+    """Return a problem for each file in static/vendor that has no pinned checksum or does not match it"""
+    checksums = load_vendor_checksums(static_folder)
+    problems = []
+    for dirpath, _, filenames in os.walk(os.path.join(static_folder, 'vendor')):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            if name == VENDOR_CHECKSUMS:
+                continue
+            with open(path, 'rb') as f:
+                digest = _sha384(f.read())
+            if name not in checksums:
+                problems.append(f"{name} has no pinned checksum in static/{VENDOR_CHECKSUMS}")
+            elif digest != checksums[name]:
+                problems.append(f"{name} does not match its pinned SHA-384")
+    return problems
+
+def fetch_vendor_files(static_folder, pin=False):
+    """Download vendored libraries missing from static/vendor, checking each against its pinned SHA-384.
+
+    With pin, a library that has no checksum yet is saved and its checksum recorded, to be
+    reviewed and committed with it. Returns the libraries still missing.
+    """
+    checksums = load_vendor_checksums(static_folder)
+    missing = []
+    pinned = False
+    for name, url in VENDOR_FILES.items():
+        path = os.path.join(static_folder, *name.split('/'))
+        if os.path.exists(path):
+            continue
+        expected = checksums.get(name)
+        if expected is None and not pin:
+            click.echo(f"{name} has no pinned checksum; fetch it with --pin and review it before committing", err=True)
+            missing.append(name)
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+        except OSError as e:
+            click.echo(f"Could not fetch {url} ({type(e).__name__}: {e})", err=True)
+            missing.append(name)
+            continue
+        digest = _sha384(data)
+        if expected is not None and digest != expected:
+            click.echo(f"{url} does not match the pinned SHA-384 of {name}; not saved", err=True)
+            missing.append(name)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if expected is None:
+            checksums[name] = digest
+            pinned = True
+            click.echo(f"Vendored {name}, pinned SHA-384 {digest}")
+        else:
+            click.echo(f"Vendored {name}")
+    if pinned:
+        _write_vendor_checksums(static_folder, checksums)
+    return missing
+
+def build(static_folder, max_image_size=256, clean=False):
+    """Write the fingerprinted build and its manifest; returns the manifest's files"""
+    sources = []
+    for directory in SOURCE_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(static_folder, directory)):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                source = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                if source != VENDOR_CHECKSUMS:
+                    sources.append(source)
+    # Stylesheets last so their url() references can point at the built images and fonts
+    sources.sort(key=lambda source: (source.endswith('.css'), source))
+
+    files = {}
+    for source in sources:
+        with open(os.path.join(static_folder, *source.split('/')), 'rb') as f:
+            data = f.read()
+        stem, extension = os.path.splitext(source)
+        extension = extension.lower()
+
+        if extension in ('.css', '.js'):
+            data = _minify(source, data)
+            if extension == '.css':
+                data = _rewrite_css_urls(data, source, files)
+        elif extension in IMAGE_EXTENSIONS:
+            data = _optimize_image(data, extension, max_image_size)
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        path = f'{BUILD_DIR}/{stem}.{digest}{extension}'
+        output = os.path.join(static_folder, *path.split('/'))
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'wb') as f:
+            f.write(data)
+
+        encodings = []
+        if extension in COMPRESSIBLE_EXTENSIONS:
+            for encoding, suffix, compressed in _compressed_variants(data):
+                with open(output + suffix, 'wb') as f:
+                    f.write(compressed)
+                encodings.append(encoding)
+        files[source] = {'path': path, 'size': len(data), 'encodings': encodings}
+
+    manifest_path = os.path.join(static_folder, BUILD_DIR, 'manifest.json')
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(f'{manifest_path}.part', 'w') as f:
+        json.dump({'files': files}, f, indent=2, sort_keys=True)
+    os.replace(f'{manifest_path}.part', manifest_path)
+
+    if clean:
+        # Earlier builds are kept by default so pages rendered before a deploy still load
+        keep = {os.path.join(static_folder, *entry['path'].split('/')) + suffix
+                for entry in files.values() for suffix in ('', '.br', '.gz')}
+        keep.add(manifest_path)
+        for dirpath, _, filenames in os.walk(os.path.join(static_folder, BUILD_DIR)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if path not in keep:
+                    os.remove(path)
+
+    return files
+
+assets_cli = AppGroup('assets', help='Build the fingerprinted static assets.')
+
+@assets_cli.command('build')
+@click.option('--max-image-size', default=256, show_default=True, help='Longest side of optimized images, in pixels.')
+@click.option('--clean', is_flag=True, help='Delete files left over from earlier builds.')
+def build_command(max_image_size, clean):
+    """Fingerprint, minify and precompress static/css, js, images and vendor into static/dist.
+
+    Never downloads anything; vendored libraries must match their pinned SHA-384.
+    """
+    static_folder = current_app.static_folder
+    problems = verify_vendor_files(static_folder)
+    if problems:
+        raise click.ClickException('; '.join(problems))
+    for module, package, skipped in (('rcssmin', 'rcssmin', 'CSS minification'), ('rjsmin', 'rjsmin', 'JS minification'),
+                                     ('brotli', 'brotli', 'Brotli variants'), ('PIL', 'Pillow', 'image optimization')):
+        if not _installed(module):
+            click.echo(f"Warning: {package} is not installed, skipping {skipped}", err=True)
+    files = build(static_folder, max_image_size=max_image_size, clean=clean)
+    source_bytes = sum(os.path.getsize(os.path.join(static_folder, *source.split('/'))) for source in files)
+    built_bytes = sum(entry['size'] for entry in files.values())
+    click.echo(f"Built {len(files)} static files: {source_bytes} bytes -> {built_bytes} bytes before compression")
+
+@assets_cli.command('vendor')
+@click.option('--pin', is_flag=True, help='Save libraries that have no pinned checksum yet and record theirs.')
+def vendor_command(pin):
+    """Download missing vendored libraries into static/vendor; commit them with static/vendor/SHA384SUMS."""
+    missing = fetch_vendor_files(current_app.static_folder, pin=pin)
+    if missing:
+        raise click.ClickException(f"Not vendored: {', '.join(missing)}; pages keep loading them from the CDN")
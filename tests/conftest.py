@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Config reads the environment once, when app is first imported; nothing here reaches the network
+_scratch = tempfile.mkdtemp(prefix='tests_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_scratch, 'import.db')}")
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('MAIL_TRANSPORT', 'file')
+os.environ.setdefault('SESSION_FILE_DIR', os.path.join(_scratch, 'sessions'))
+os.environ.setdefault('AUDIO_STORAGE_DIR', os.path.join(_scratch, 'voice_storage'))
+
+import pytest
+from app import create_app
+from config import Config
+from extensions import db
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on its own SQLite database, with config overrides"""
+    def make(**overrides):
+        config_class = type('TestConfig', (Config,), {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'MAIL_FILE_DIR': str(tmp_path / 'outbox'),
+            **overrides
+        })
+        app = create_app(config_class)
+        with app.app_context():
+            db.create_all(bind_key=None)
+        return app
+    return make
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
@@ -0,0 +1,52 @@
+from app import load_user
+from extensions import db
+from models import User
+
+def new_user(email, role='client'):
+    user = User(email=email, password_hash='unused', role=role, is_active=True, email_verified=True, failed_login_attempts=0)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def logged_in(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    return client
+
+def cached_principal(app, user_id):
+    with app.test_request_context():
+        principal = load_user(user_id)
+        return principal.role, principal.is_active
+
+def search_directory(app, admin_id, search):
+    client = logged_in(app, admin_id)
+    response = client.get('/admin/api/users', query_string={'q': search, 'view': 'options'})
+    assert response.status_code == 200
+    return sorted(user['email'] for user in response.get_json()['users'])
+
+def test_user_directory_search_matches_email_prefixes(make_app):
+    app = make_app(SESSION_COOKIE_SECURE=False)
+    with app.app_context():
+        admin_id = new_user('admin@example.com', role='admin')
+        for email in ('Anna@example.com', 'ann_lee@example.com', 'annxlee@example.com', 'joanna@example.com'):
+            new_user(email)
+
+    assert search_directory(app, admin_id, 'ann') == ['Anna@example.com', 'ann_lee@example.com', 'annxlee@example.com']
+    # Wildcards in the search are taken literally
+    assert search_directory(app, admin_id, 'ann_') == ['ann_lee@example.com']
+    assert search_directory(app, admin_id, '%ann') == []
+
+def test_admin_changes_invalidate_the_cached_user(make_app):
+    app = make_app(SESSION_COOKIE_SECURE=False, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        admin_id = new_user('admin@example.com', role='admin')
+        user_id = new_user('client@example.com')
+    client = logged_in(app, admin_id)
+
+    assert cached_principal(app, user_id) == ('client', True)
+    client.post(f'/admin/users/{user_id}/toggle_active')
+    assert cached_principal(app, user_id) == ('client', False)
+
+    client.post(f'/admin/users/{user_id}/edit', data={'email': 'client@example.com', 'role': 'therapist', 'is_active': 'y'})
+    assert cached_principal(app, user_id) == ('therapist', True)
@@ -0,0 +1,33 @@
+from datetime import datetime
+import rollups
+from chat_service import chat_service
+from extensions import db
+from model_scheduler import model_scheduler
+from models import ChatMessage, DailyUserStats, User
+
+def test_reanalyze_sentiment_fills_missing_sentiment_in_the_background_class(app, monkeypatch):
+    user = User(email='client@example.com', password_hash='unused', role='client', is_active=True, email_verified=True, failed_login_attempts=0)
+    db.session.add(user)
+    db.session.commit()
+    timestamp = datetime.utcnow()
+    prompt = ChatMessage(user_id=user.id, content='I slept badly again', is_ai_response=False, timestamp=timestamp)
+    reply = ChatMessage(user_id=user.id, content='That sounds draining.', is_ai_response=True, timestamp=timestamp)
+    db.session.add_all([prompt, reply])
+    rollups.record_turn(prompt, reply)
+    db.session.commit()
+
+    calls = []
+    def analyze_sentiment(text, route=None):
+        calls.append((text, model_scheduler.current_priority()))
+        return {'sentiment_score': -0.4, 'sentiment_label': 'Negative', 'sentiment_analysis': 'Tired and low.'}
+    monkeypatch.setattr(chat_service, 'analyze_sentiment', analyze_sentiment)
+
+    result = app.test_cli_runner().invoke(args=['analytics', 'reanalyze-sentiment'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Analysed sentiment for 1 of 1 replies' in result.output
+    assert calls == [('I slept badly again', 'background')]
+    reply = db.session.get(ChatMessage, reply.id)
+    assert (reply.sentiment_score, reply.sentiment_label, reply.sentiment_analysis) == (-0.4, 'Negative', 'Tired and low.')
+    stats = db.session.get(DailyUserStats, (user.id, timestamp.date()))
+    assert (stats.message_count, stats.sentiment_count, stats.sentiment_min) == (1, 1, -0.4)
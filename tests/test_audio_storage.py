@@ -0,0 +1,33 @@
+import os
+import time
+from audio_storage import audio_store
+from extensions import db
+from models import ChatMessage, User
+
+def saved_reply(user_id, size, age):
+    """Store size bytes of audio age seconds old and a reply pointing at it"""
+    url = audio_store.save(b'x' * size)
+    path = os.path.join(audio_store.backend.root, *url[len('/audio/'):].split('/'))
+    modified = time.time() - age
+    os.utime(path, (modified, modified))
+    message = ChatMessage(user_id=user_id, content='I am here for you.', is_ai_response=True, message_type='voice', voice_url=url)
+    db.session.add(message)
+    db.session.commit()
+    return message.id, url
+
+def test_cleanup_unlinks_messages_from_the_audio_it_deletes(make_app, tmp_path):
+    app = make_app(AUDIO_STORAGE_DIR=str(tmp_path / 'audio'), AUDIO_CLEANUP_INTERVAL=0)
+    with app.app_context():
+        user = User(email='client@example.com', password_hash='unused', role='client', is_active=True, email_verified=True, failed_login_attempts=0)
+        db.session.add(user)
+        db.session.commit()
+        expired = saved_reply(user.id, 100, age=7200)
+        oldest = saved_reply(user.id, 100, age=600)
+        newest = saved_reply(user.id, 100, age=60)
+
+        # expired goes by age, oldest to get back under the quota
+        assert audio_store.cleanup(ttl=3600, quota_bytes=150) == 2
+
+        voice_urls = {message.id: message.voice_url for message in ChatMessage.query.all()}
+        assert voice_urls == {expired[0]: None, oldest[0]: None, newest[0]: newest[1]}
+        assert [key for key, _, _ in audio_store.backend.list_objects()] == [newest[1][len('/audio/'):]]
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from email_service import mail_queue
+from extensions import db
+from models import OutboundEmail
+
+class RecordingTransport:
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    def send_batch(self, emails):
+        self.batches.append([(email.id, email.status, email.attempts) for email in emails])
+        return {email.id: self.error for email in emails}
+
+@pytest.fixture
+def transport(app, monkeypatch):
+    transport = RecordingTransport()
+    monkeypatch.setattr(mail_queue, 'transport', transport)
+    return transport
+
+def queue_email(**values):
+    email = mail_queue.enqueue('user@example.com', 'Subject', '<p>Body</p>')
+    for name, value in values.items():
+        setattr(email, name, value)
+    db.session.commit()
+    return email.id
+
+def test_due_email_is_claimed_then_sent(app, transport):
+    email_id = queue_email()
+
+    assert mail_queue.process_batch() == 1
+
+    # The transport only ever sees rows this worker has claimed
+    assert transport.batches == [[(email_id, 'sending', 1)]]
+    email = db.session.get(OutboundEmail, email_id)
+    assert email.status == 'sent'
+    assert email.sent_at is not None
+    assert mail_queue.process_batch() == 0
+
+def test_claimed_email_is_not_sent_again_while_its_lease_holds(app, transport):
+    queue_email(status='sending', attempts=1, next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+
+    assert mail_queue.process_batch() == 0
+    assert transport.batches == []
+
+def test_expired_lease_is_reclaimed(app, transport):
+    # A sender that died mid-batch leaves the row in 'sending'
+    email_id = queue_email(status='sending', attempts=1, next_attempt_at=datetime.utcnow() - timedelta(seconds=1))
+
+    assert mail_queue.process_batch() == 1
+    assert transport.batches == [[(email_id, 'sending', 2)]]
+    assert db.session.get(OutboundEmail, email_id).status == 'sent'
+
+def test_row_claimed_by_another_worker_is_skipped(app, transport, monkeypatch):
+    email_id = queue_email()
+    execute = db.session.execute
+
+    def claim_elsewhere_first(statement, *args, **kwargs):
+        if getattr(statement, 'is_update', False):
+            # Another process claims the row between this worker's read and its claim
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(OutboundEmail).where(OutboundEmail.id == email_id)
+                    .values(status='sending', attempts=1, next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+                )
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', claim_elsewhere_first)
+
+    assert mail_queue.process_batch() == 0
+    assert transport.batches == []
+
+def test_failed_send_is_retried_with_backoff_then_given_up(app, transport):
+    app.config['MAIL_MAX_ATTEMPTS'] = 2
+    transport.error = 'mailbox unavailable'
+    email_id = queue_email()
+
+    before = datetime.utcnow()
+    assert mail_queue.process_batch() == 1
+    email = db.session.get(OutboundEmail, email_id)
+    assert (email.status, email.attempts, email.last_error) == ('pending', 1, 'mailbox unavailable')
+    assert email.next_attempt_at >= before + timedelta(seconds=app.config['MAIL_RETRY_BASE_SECONDS'])
+
+    email.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    assert mail_queue.process_batch() == 1
+    email = db.session.get(OutboundEmail, email_id)
+    assert (email.status, email.attempts) == ('failed', 2)
@@ -0,0 +1,73 @@
+import time
+import eventlet
+import pytest
+from generation_tracker import GenerationCancelled, GenerationTracker
+
+def test_newer_message_supersedes_the_running_generation():
+    tracker = GenerationTracker()
+    first = tracker.begin('sid-1')
+    second = tracker.begin('sid-1')
+
+    assert first.reason == 'superseded'
+    assert not tracker.is_current(first) and tracker.is_current(second)
+    with pytest.raises(GenerationCancelled):
+        first.check()
+    second.check()
+
+def test_cancel_aborts_a_blocked_model_call():
+    tracker = GenerationTracker()
+    started = eventlet.Event()
+
+    def generate():
+        generation = tracker.begin('sid-1')
+        with generation.interruptible():
+            started.send()
+            eventlet.sleep(30)  # Stands in for the model call
+
+    worker = eventlet.spawn(generate)
+    started.wait()
+    began = time.monotonic()
+    tracker.cancel('sid-1', 'disconnected')
+
+    with pytest.raises(GenerationCancelled):
+        worker.wait()
+    assert time.monotonic() - began < 1
+
+def test_cancel_outside_a_model_call_stops_at_the_next_check():
+    tracker = GenerationTracker()
+    generation = tracker.begin('sid-1')
+
+    tracker.cancel('sid-1', 'disconnected')
+
+    assert generation.reason == 'disconnected'
+    with pytest.raises(GenerationCancelled):
+        generation.check()
+    with pytest.raises(GenerationCancelled):
+        with generation.interruptible():
+            pass
+
+def test_resumable_generation_survives_a_reconnect_that_adopts_it():
+    tracker = GenerationTracker()
+    adopted = tracker.begin('sid-1')
+    adopted.resumable = True
+    abandoned = tracker.begin('sid-2')
+    abandoned.resumable = True
+
+    tracker.cancel('sid-1', 'disconnected', grace=0.05)
+    tracker.cancel('sid-2', 'disconnected', grace=0.05)
+    adopted.adopt()
+    assert not abandoned.cancelled
+    eventlet.sleep(0.1)
+
+    assert not adopted.cancelled
+    assert abandoned.reason == 'disconnected'
+
+def test_finish_counts_completed_and_cancelled_generations():
+    tracker = GenerationTracker()
+    superseded = tracker.begin('sid-1')
+    completed = tracker.begin('sid-1')
+    tracker.finish(superseded)
+    tracker.finish(completed)
+
+    stats = tracker.stats()
+    assert (stats['started'], stats['completed'], stats['superseded'], stats['active']) == (2, 1, 1, 0)
@@ -0,0 +1,140 @@
+import eventlet
+import pytest
+import idempotency
+from chat_service import chat_service
+from extensions import db, socketio
+from generation_tracker import GenerationCancelled
+from idempotency import IdempotencyStore
+from models import ChatMessage, User
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(idempotency.time, 'monotonic', clock)
+    return clock
+
+def test_only_the_first_claim_owns_the_key():
+    store = IdempotencyStore()
+
+    submission, owner = store.claim('send_message', 1, 'key-00001')
+    retry, retry_owner = store.claim('send_message', 1, 'key-00001')
+
+    assert owner and not retry_owner
+    assert retry is submission
+    # Keys are scoped per endpoint and per user
+    assert store.claim('voice_message', 1, 'key-00001')[1]
+    assert store.claim('send_message', 2, 'key-00001')[1]
+
+def test_retry_after_completion_replays_the_stored_result():
+    store = IdempotencyStore()
+    submission, _ = store.claim('send_message', 1, 'key-00001')
+    store.complete('send_message', 1, submission, {'ai_message': 'reply'})
+
+    retry, owner = store.claim('send_message', 1, 'key-00001')
+
+    assert not owner
+    assert store.wait(retry)
+    assert retry.result == {'ai_message': 'reply'}
+
+def test_retry_while_running_waits_for_the_owner():
+    store = IdempotencyStore(wait_timeout=5)
+    submission, _ = store.claim('send_message', 1, 'key-00001')
+    retry, _ = store.claim('send_message', 1, 'key-00001')
+
+    waiter = eventlet.spawn(lambda: (store.wait(retry), retry.result))
+    eventlet.sleep(0)
+    assert not waiter.dead
+
+    store.complete('send_message', 1, submission, {'ai_message': 'reply'})
+    assert waiter.wait() == (True, {'ai_message': 'reply'})
+
+def test_wait_gives_up_while_the_owner_is_still_running():
+    store = IdempotencyStore(wait_timeout=0.01)
+    store.claim('send_message', 1, 'key-00001')
+    retry, _ = store.claim('send_message', 1, 'key-00001')
+
+    assert not store.wait(retry)
+    assert not retry.done
+
+def test_failed_submission_releases_the_key():
+    store = IdempotencyStore()
+    submission, _ = store.claim('send_message', 1, 'key-00001')
+    retry, _ = store.claim('send_message', 1, 'key-00001')
+
+    store.complete('send_message', 1, submission, None)
+
+    # A waiter sees the failure; the next retry runs again
+    assert store.wait(retry) and retry.result is None
+    assert store.claim('send_message', 1, 'key-00001')[1]
+
+def test_finished_submissions_expire_after_ttl(clock):
+    store = IdempotencyStore(ttl=600)
+    submission, _ = store.claim('send_message', 1, 'key-00001')
+    store.complete('send_message', 1, submission, {'ai_message': 'reply'})
+
+    clock.now += 599
+    assert not store.claim('send_message', 1, 'key-00001')[1]
+    clock.now += 2
+    assert store.claim('send_message', 1, 'key-00001')[1]
+
+def test_eviction_never_drops_running_submissions(clock):
+    store = IdempotencyStore(max_entries=2)
+    running, _ = store.claim('send_message', 1, 'key-00001')
+    clock.now += 1
+    finished, _ = store.claim('send_message', 1, 'key-00002')
+    store.complete('send_message', 1, finished, {'ai_message': 'reply'})
+
+    clock.now += 1
+    store.claim('send_message', 1, 'key-00003')
+
+    assert store.claim('send_message', 1, 'key-00001') == (running, False)
+    assert store.claim('send_message', 1, 'key-00002')[1]
+
+def test_valid_key():
+    assert IdempotencyStore.valid_key('a1B2-c3_D4')
+    assert not IdempotencyStore.valid_key('short')
+    assert not IdempotencyStore.valid_key('has space in it')
+    assert not IdempotencyStore.valid_key(None)
+
+def test_resend_after_a_cancelled_reply_does_not_save_the_message_again(make_app, monkeypatch):
+    app = make_app(SESSION_COOKIE_SECURE=False)
+    with app.app_context():
+        user = User(email='client@example.com', role='client', is_active=True, email_verified=True, failed_login_attempts=0, password_hash='unused')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    calls = []
+    def generate_reply(user_message, user, generation=None, flagged=False):
+        calls.append(user_message)
+        # The connection went away while the model was working
+        raise GenerationCancelled('disconnected')
+    monkeypatch.setattr(chat_service, 'generate_reply', generate_reply)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    message = {'message': 'Hello', 'idempotency_key': 'chat-key-0001'}
+    first = socketio.test_client(app, flask_test_client=client)
+    first.emit('send_message', message)
+    first.disconnect()
+    second = socketio.test_client(app, flask_test_client=client)
+    second.get_received()
+    second.emit('send_message', message)
+
+    assert calls == ['Hello']
+    with app.app_context():
+        assert ChatMessage.query.filter_by(user_id=user_id).count() == 1
+    received = second.get_received()
+    replayed = [event['args'][0] for event in received if event['name'] == 'new_message']
+    assert [(payload['content'], payload['is_ai_response']) for payload in replayed] == [('Hello', False)]
+    assert {'message': 'Failed to get AI response', 'idempotency_key': 'chat-key-0001'} in [
+        event['args'][0] for event in received if event['name'] == 'error'
+    ]
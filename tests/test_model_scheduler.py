@@ -0,0 +1,95 @@
+import eventlet
+import pytest
+from model_scheduler import ModelCallExpired, ModelScheduler, model_scheduler
+
+class Blocker:
+    """A model call that holds its slot until released"""
+
+    def __init__(self):
+        self.started = eventlet.Event()
+        self.release = eventlet.Event()
+
+    def __call__(self):
+        self.started.send()
+        self.release.wait()
+        return 'done'
+
+def spawn_call(app, scheduler, priority, fn):
+    def run():
+        # Each green thread needs its own app context for the priority class
+        with app.app_context(), model_scheduler.priority(priority):
+            return scheduler.call(fn)
+    thread = eventlet.spawn(run)
+    eventlet.sleep(0)
+    return thread
+
+def test_call_runs_at_once_when_a_slot_is_free():
+    scheduler = ModelScheduler(max_concurrency=2)
+
+    assert scheduler.call(lambda value: value * 2, 21) == 42
+    assert scheduler.stats()['classes']['text']['started'] == 1
+
+def test_call_queued_past_its_deadline_is_dropped(app):
+    scheduler = ModelScheduler(max_concurrency=1, shares={'text': 1.0}, deadlines={'text': 0.05})
+    blocker = Blocker()
+    holder = spawn_call(app, scheduler, 'text', blocker)
+    blocker.started.wait()
+
+    calls = []
+    with pytest.raises(ModelCallExpired):
+        scheduler.call(calls.append, 'late')
+
+    assert calls == []
+    stats = scheduler.stats()['classes']['text']
+    assert (stats['expired'], stats['queued']) == (1, 0)
+    blocker.release.send()
+    assert holder.wait() == 'done'
+
+def test_queued_call_starts_when_a_slot_frees_before_its_deadline(app):
+    scheduler = ModelScheduler(max_concurrency=1, shares={'text': 1.0}, deadlines={'text': 5})
+    blocker = Blocker()
+    holder = spawn_call(app, scheduler, 'text', blocker)
+    blocker.started.wait()
+    waiting = spawn_call(app, scheduler, 'text', lambda: 'next')
+
+    blocker.release.send()
+
+    assert (holder.wait(), waiting.wait()) == ('done', 'next')
+    assert scheduler.stats()['classes']['text']['expired'] == 0
+
+def test_lower_class_cannot_take_a_higher_class_reserved_slot(app):
+    scheduler = ModelScheduler(max_concurrency=2, shares={'voice': 0.5, 'text': 0.5})
+    text = Blocker()
+    spawn_call(app, scheduler, 'text', text)
+    text.started.wait()
+
+    # The second text call would need voice's idle slot, so it queues
+    second_text = Blocker()
+    queued = spawn_call(app, scheduler, 'text', second_text)
+    assert not second_text.started.ready()
+
+    voice = Blocker()
+    spawn_call(app, scheduler, 'voice', voice)
+    assert voice.started.ready()
+
+    text.release.send()
+    second_text.started.wait()
+    voice.release.send()
+    second_text.release.send()
+    assert queued.wait() == 'done'
+
+def test_cancelled_waiter_gives_up_its_place(app):
+    scheduler = ModelScheduler(max_concurrency=1, shares={'text': 1.0})
+    blocker = Blocker()
+    spawn_call(app, scheduler, 'text', blocker)
+    blocker.started.wait()
+    waiting = spawn_call(app, scheduler, 'text', lambda: 'never')
+    assert scheduler.stats()['classes']['text']['queued'] == 1
+
+    # e.g. the generation was cancelled while its call was queued
+    waiting.kill()
+
+    assert scheduler.stats()['classes']['text']['queued'] == 0
+    blocker.release.send()
+    eventlet.sleep(0)
+    assert scheduler.stats()['classes']['text']['running'] == 0
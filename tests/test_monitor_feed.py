@@ -0,0 +1,44 @@
+from monitor_feed import MonitorFeed
+
+def message(message_id, **fields):
+    return {'id': message_id, 'content': f'Message {message_id}', 'flagged': False, 'monitor_notes': None, **fields}
+
+def test_diff_sends_new_messages_whole_and_then_only_changes():
+    feed = MonitorFeed()
+
+    first = feed.diff('admin-1', [message(2), message(1)])
+    assert first == {'order': [2, 1], 'changes': [message(2), message(1)]}
+
+    assert feed.diff('admin-1', [message(2), message(1)]) == {'order': [2, 1], 'changes': []}
+
+    second = feed.diff('admin-1', [message(3), message(2, flagged=True), message(1)])
+    assert second == {'order': [3, 2, 1], 'changes': [message(3), {'id': 2, 'flagged': True}]}
+
+def test_connections_are_tracked_separately():
+    feed = MonitorFeed()
+    feed.diff('admin-1', [message(1)])
+
+    assert feed.diff('admin-2', [message(1)])['changes'] == [message(1)]
+    feed.forget('admin-1')
+    assert feed.diff('admin-1', [message(1)])['changes'] == [message(1)]
+
+def test_update_records_fields_sent_outside_a_listing():
+    feed = MonitorFeed()
+    feed.diff('admin-1', [message(1)])
+
+    feed.update('admin-1', 1, monitor_notes='Follow up', unknown='ignored')
+    feed.update('admin-1', 99, flagged=True)
+    feed.update('admin-2', 1, flagged=True)
+
+    assert feed.diff('admin-1', [message(1, monitor_notes='Follow up')])['changes'] == []
+    assert feed.diff('admin-1', [message(1, monitor_notes='Done')])['changes'] == [{'id': 1, 'monitor_notes': 'Done'}]
+
+def test_diff_starts_over_past_max_messages():
+    feed = MonitorFeed(max_messages=3)
+    feed.diff('admin-1', [message(1), message(2)])
+
+    # Messages already sent do not count twice towards the limit
+    assert feed.diff('admin-1', [message(2), message(3)])['changes'] == [message(3)]
+
+    assert feed.diff('admin-1', [message(3), message(4)])['changes'] == [message(3), message(4)]
+    assert feed.diff('admin-1', [message(3), message(4)])['changes'] == []
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import pytest
+from flask_login import login_user
+from sqlalchemy import select, text
+from extensions import db
+from models import User
+from read_replicas import replica_reads, replica_router
+
+def new_user(email):
+    return User(email=email, password_hash='unused', role='client', is_active=True, email_verified=True, failed_login_attempts=0)
+
+@pytest.fixture
+def app(make_app, tmp_path, monkeypatch):
+    # Heartbeats are set by hand instead of by the background checker
+    monkeypatch.setattr(replica_router, '_started', True)
+    monkeypatch.setattr(replica_router, '_last_writes', {})
+    monkeypatch.setattr(replica_router, 'stats_counts', {'replica_reads': 0, 'primary_reads': 0, 'fallbacks': 0})
+    app = make_app(SQLALCHEMY_REPLICA_URIS=[f"sqlite:///{tmp_path / 'replica.db'}"])
+    with app.app_context():
+        # Each database gets a different row, so a read shows where it went
+        db.metadata.create_all(db.engines['replica_0'])
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(User.__table__.insert().values(
+                email='replica@example.com', password_hash='unused', role='client'
+            ))
+        db.session.add(new_user('primary@example.com'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+def set_heartbeat(age=0, healthy=True):
+    replica_router._replicas['replica_0'].update(healthy=healthy, heartbeat_at=datetime.utcnow() - timedelta(seconds=age))
+
+def read_emails():
+    return db.session.execute(select(User.email).order_by(User.email)).scalars().all()
+
+def routed(app, view, user_id=None):
+    # A fresh app context per request, so neither g nor the session carries over
+    with app.app_context(), app.test_request_context():
+        if user_id is not None:
+            login_user(db.session.get(User, user_id))
+        try:
+            return replica_reads(view)()
+        finally:
+            db.session.remove()
+
+def test_reads_go_to_a_fresh_replica(app):
+    set_heartbeat(age=1)
+
+    assert routed(app, read_emails) == ['replica@example.com']
+    assert replica_router.stats_counts['replica_reads'] == 1
+
+def test_views_without_replica_reads_stay_on_the_primary(app):
+    set_heartbeat(age=1)
+
+    with app.test_request_context():
+        assert read_emails() == ['primary@example.com']
+
+@pytest.mark.parametrize('heartbeat', [
+    {'age': 60},  # Lagging past REPLICA_MAX_LAG_SECONDS
+    {'age': 1, 'healthy': False},  # Failed its last check
+])
+def test_stale_or_down_replica_falls_back_to_the_primary(app, heartbeat):
+    set_heartbeat(**heartbeat)
+
+    assert routed(app, read_emails) == ['primary@example.com']
+    assert replica_router.stats_counts['fallbacks'] == 1
+
+def test_reads_after_a_write_in_the_same_session_use_the_primary(app):
+    set_heartbeat(age=1)
+
+    def write_then_read():
+        db.session.add(new_user('new@example.com'))
+        db.session.flush()
+        return read_emails()
+
+    assert routed(app, write_then_read) == ['new@example.com', 'primary@example.com']
+
+def test_user_reads_their_own_writes_until_the_replica_catches_up(app):
+    user_id = db.session.execute(select(User.id).filter_by(email='primary@example.com')).scalar_one()
+    set_heartbeat(age=1)
+
+    def write():
+        db.session.add(new_user('new@example.com'))
+        db.session.commit()
+    routed(app, write, user_id)
+
+    # The replica's heartbeat predates the write, so this user reads from the primary
+    assert routed(app, read_emails, user_id) == ['new@example.com', 'primary@example.com']
+    # Other users are not held back
+    assert routed(app, read_emails) == ['replica@example.com']
+    set_heartbeat(age=0)
+    assert routed(app, read_emails, user_id) == ['replica@example.com']
+
+def test_failed_replica_read_is_retried_on_the_primary(app):
+    set_heartbeat(age=1)
+    with db.engines['replica_0'].begin() as connection:
+        connection.execute(text('DROP TABLE user'))
+
+    assert routed(app, read_emails) == ['primary@example.com']
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import rollups
+from extensions import db
+from models import ChatMessage, DailyUserStats, User
+
+def new_user(email):
+    user = User(email=email, password_hash='unused', role='client', is_active=True, email_verified=True, failed_login_attempts=0)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def save_turn(user_id, timestamp, message_type='text', sentiment=None, with_audio=False, flagged=False):
+    """Save a turn the way chat_turn does, counting it as it goes"""
+    user_message = ChatMessage(user_id=user_id, content='How are you?', is_ai_response=False,
+                               message_type=message_type, timestamp=timestamp)
+    ai_message = ChatMessage(user_id=user_id, content='I am here for you.', is_ai_response=True,
+                             message_type=message_type, timestamp=timestamp, sentiment_score=sentiment,
+                             voice_url='/audio/reply.mp3' if with_audio else None)
+    db.session.add_all([user_message, ai_message])
+    rollups.record_turn(user_message, ai_message)
+    db.session.commit()
+    if flagged:
+        rollups.record_flag_change(user_message, True)
+        user_message.flagged = True
+        db.session.commit()
+
+def rollup_rows():
+    return sorted(
+        (row.user_id, row.day, *(getattr(row, column) for column in rollups.ROLLUP_COLUMNS))
+        for row in DailyUserStats.query.all()
+    )
+
+def test_backfill_matches_incremental_rollups(app):
+    first, second = new_user('first@example.com'), new_user('second@example.com')
+    today = datetime(2026, 10, 19, 12, 0)
+    save_turn(first, today, sentiment=0.5)
+    save_turn(first, today, message_type='voice', sentiment=-0.25, with_audio=True)
+    save_turn(first, today, flagged=True)
+    save_turn(first, today - timedelta(days=1), message_type='voice', with_audio=True)
+    save_turn(second, today, sentiment=0.1, flagged=True)
+
+    incremental = rollup_rows()
+    assert rollups.backfill() == len(incremental)
+
+    assert rollup_rows() == incremental
+    # One voice turn counts once, however many of its rows carry audio
+    assert incremental[1][2:4] == (3, 1)
+
+def test_backfill_for_some_users_leaves_the_others(app):
+    first, second = new_user('first@example.com'), new_user('second@example.com')
+    today = datetime(2026, 10, 19, 12, 0)
+    save_turn(first, today, message_type='voice', with_audio=True)
+    save_turn(second, today)
+    DailyUserStats.query.filter_by(user_id=second).update({'message_count': 7})
+    db.session.commit()
+
+    rollups.backfill(user_ids=[first])
+
+    counts = {row.user_id: (row.message_count, row.voice_count) for row in DailyUserStats.query.all()}
+    assert counts == {first: (1, 1), second: (7, 0)}
@@ -0,0 +1,30 @@
+import pytest
+from chat_service import ChatService
+from speech_backends import FailoverSpeechBackend, LocalSpeechToText, LocalTextToSpeech, build_speech_backend
+
+class FakeTextToSpeech:
+    name = 'fake'
+
+    def synthesize(self, text):
+        return text.encode('utf-8'), 'mp3'
+
+@pytest.fixture
+def no_api_key(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+
+def test_local_backends_need_no_api_key(make_app, no_api_key):
+    app = make_app(STT_BACKEND='local', TTS_BACKEND='local')
+    service = ChatService()
+
+    with app.app_context():
+        assert isinstance(service.speech_to_text, LocalSpeechToText)
+        assert isinstance(service.text_to_speech, LocalTextToSpeech)
+        with pytest.raises(ValueError):
+            service.client
+
+def test_openai_backend_without_a_key_fails_over(app, no_api_key):
+    service = ChatService()
+    primary = build_speech_backend('tts', lambda: service.client, app.config)
+    backend = FailoverSpeechBackend(primary, FakeTextToSpeech(), latency_budget=8, cooldown=60)
+
+    assert backend.synthesize('hello') == (b'hello', 'mp3')
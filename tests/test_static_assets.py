@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+from flask import url_for
+from static_assets import IMMUTABLE_CACHE_CONTROL, StaticAssets, build
+
+STYLESHEET = b'body {\n    background: url("../images/logo.svg");\n    color: #333333;\n}\n' * 20
+LOGO = b'<svg xmlns="http://www.w3.org/2000/svg"><rect width="10" height="10"/></svg>\n' * 20
+
+def write(static_folder, name, data):
+    path = static_folder / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+def read_built(static_folder, entry, suffix=''):
+    return (static_folder / (entry['path'] + suffix)).read_bytes()
+
+def static_site(tmp_path):
+    static_folder = tmp_path / 'static'
+    write(static_folder, 'css/site.css', STYLESHEET)
+    write(static_folder, 'images/logo.svg', LOGO)
+    write(static_folder, 'js/LICENSE.txt', b'MIT License\n')
+    return static_folder
+
+def test_build_fingerprints_and_precompresses(tmp_path):
+    static_folder = static_site(tmp_path)
+
+    files = build(str(static_folder))
+
+    assert json.loads((static_folder / 'dist' / 'manifest.json').read_text())['files'] == files
+    stylesheet, logo = files['css/site.css'], files['images/logo.svg']
+    assert stylesheet['path'].startswith('dist/css/site.') and stylesheet['path'].endswith('.css')
+    assert len(stylesheet['path'].split('.')[-2]) == 12
+    assert 'gzip' in stylesheet['encodings'] and files['js/LICENSE.txt']['encodings'] == []
+    built = read_built(static_folder, stylesheet)
+    assert gzip.decompress(read_built(static_folder, stylesheet, '.gz')) == built
+    # The stylesheet points at the fingerprinted logo next to it under dist/
+    assert f'../{logo["path"].removeprefix("dist/")}'.encode() in built
+
+    # Same content, same names; changed content gets a new name and --clean drops the old one
+    assert build(str(static_folder)) == files
+    write(static_folder, 'images/logo.svg', LOGO + b'<!-- v2 -->\n')
+    rebuilt = build(str(static_folder), clean=True)
+    assert rebuilt['images/logo.svg']['path'] != logo['path']
+    assert rebuilt['css/site.css']['path'] != stylesheet['path']
+    assert not (static_folder / logo['path']).exists()
+    assert (static_folder / rebuilt['images/logo.svg']['path']).exists()
+
+def test_serve_sends_the_best_accepted_encoding(make_app, tmp_path):
+    static_folder = static_site(tmp_path)
+    files = build(str(static_folder))
+    app = make_app(STATIC_ASSETS_ENABLED=True)
+    app.static_folder = str(static_folder)
+    StaticAssets().init_app(app)
+    stylesheet = files['css/site.css']
+    client = app.test_client()
+
+    with app.test_request_context():
+        assert url_for('static', filename='css/site.css') == f"/static/{stylesheet['path']}"
+
+    for accept, encoding, suffix in (('gzip, deflate, br', 'br', '.br'), ('gzip', 'gzip', '.gz'), ('identity', None, '')):
+        if encoding and encoding not in stylesheet['encodings']:
+            continue
+        response = client.get(f"/static/{stylesheet['path']}", headers={'Accept-Encoding': accept})
+        assert response.status_code == 200
+        assert response.headers.get('Content-Encoding') == encoding
+        assert response.data == read_built(static_folder, stylesheet, suffix)
+        assert response.mimetype == 'text/css'
+        assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+        assert 'Accept-Encoding' in response.vary
+        response.close()
+
+    # Source files are still served as they are, with the short max-age
+    response = client.get('/static/css/site.css')
+    assert response.data == STYLESHEET
+    assert response.cache_control.max_age == app.config['STATIC_MAX_AGE']
+    response.close()
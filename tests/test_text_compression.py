@@ -0,0 +1,47 @@
+from extensions import db
+from models import ChatMessage, User
+from text_compression import TextCompression
+
+LONG_TEXT = 'I keep waking up at four and replaying the day. ' * 40
+
+def test_encode_compresses_only_at_the_threshold_and_when_it_saves_space():
+    compression = TextCompression(min_bytes=64)
+
+    assert compression.encode(None) == (None, None)
+    assert compression.encode('x' * 63) == ('x' * 63, None)
+    plain, compressed = compression.encode('x' * 64)
+    assert plain is None and len(compressed) < 64
+    # Too short to shrink: stays in the plain column
+    assert TextCompression(min_bytes=1).encode('ab') == ('ab', None)
+    assert TextCompression(min_bytes=0).encode(LONG_TEXT) == (LONG_TEXT, None)
+
+def test_decode_reads_both_columns():
+    compression = TextCompression(min_bytes=64)
+
+    for value in (None, 'short', LONG_TEXT, 'café ' * 40):
+        assert compression.decode(*compression.encode(value)) == value
+    # A row written before compression was enabled
+    assert compression.decode(LONG_TEXT, None) == LONG_TEXT
+
+def test_compact_text_rewrites_legacy_rows(make_app):
+    app = make_app(TEXT_COMPRESSION_MIN_BYTES=64)
+    with app.app_context():
+        user = User(email='client@example.com', password_hash='unused', role='client', is_active=True, email_verified=True, failed_login_attempts=0)
+        db.session.add(user)
+        db.session.commit()
+        # Saved before compression: the long text sits in the plain column
+        legacy = ChatMessage(user_id=user.id, _content=LONG_TEXT, is_ai_response=False)
+        short = ChatMessage(user_id=user.id, content='Hello', is_ai_response=False)
+        db.session.add_all([legacy, short])
+        db.session.commit()
+        legacy_id, short_id = legacy.id, short.id
+
+    result = app.test_cli_runner().invoke(args=['admin', 'compact-text'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Rewrote 1 chat messages' in result.output
+    with app.app_context():
+        legacy, short = db.session.get(ChatMessage, legacy_id), db.session.get(ChatMessage, short_id)
+        assert legacy._content is None and legacy._content_zlib is not None
+        assert legacy.content == LONG_TEXT
+        assert (short._content, short._content_zlib) == ('Hello', None)
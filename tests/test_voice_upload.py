@@ -0,0 +1,65 @@
+import pytest
+from voice_upload import VoiceUploadError, VoiceUploadManager
+
+UPLOAD_ID = 'upload-0001'
+
+def uploads():
+    # 10 s at 8 kbit/s: about 28 KB with headroom
+    return VoiceUploadManager(max_duration=10, max_bitrate=8000, max_chunk_bytes=8 * 1024)
+
+def send(manager, sizes):
+    for index, size in enumerate(sizes):
+        manager.add_chunk(UPLOAD_ID, 1, index, b'x' * size)
+
+def test_complete_joins_the_chunks_in_order():
+    manager = uploads()
+    manager.add_chunk(UPLOAD_ID, 1, 1, b'b')
+    manager.add_chunk(UPLOAD_ID, 1, 0, b'a')
+
+    upload, audio_bytes = manager.complete(UPLOAD_ID, 1, 2, duration_ms=2000)
+
+    assert audio_bytes == b'ab'
+    assert upload.processing
+
+def test_missing_chunks_are_reported():
+    manager = uploads()
+    manager.add_chunk(UPLOAD_ID, 1, 0, b'a')
+    manager.add_chunk(UPLOAD_ID, 1, 2, b'c')
+
+    with pytest.raises(VoiceUploadError) as error:
+        manager.complete(UPLOAD_ID, 1, 3)
+    assert error.value.details == {'missing': [1]}
+
+def test_size_bound_holds_whatever_duration_the_client_reports():
+    manager = uploads()
+    send(manager, [8 * 1024] * 3)
+
+    with pytest.raises(VoiceUploadError) as error:
+        manager.add_chunk(UPLOAD_ID, 1, 3, b'x' * 8 * 1024)
+    assert error.value.status == 413
+
+    # Limits lowered after the chunks arrived still apply at completion, with no duration reported
+    manager.configure(max_duration=2)
+    with pytest.raises(VoiceUploadError) as error:
+        manager.complete(UPLOAD_ID, 1, 3)
+    assert error.value.status == 413
+
+def test_reported_duration_only_rejects_early():
+    manager = uploads()
+    send(manager, [1024])
+    with pytest.raises(VoiceUploadError, match='limited to 10 seconds'):
+        manager.complete(UPLOAD_ID, 1, 1, duration_ms=11000)
+
+    # Understating the duration cannot raise the allowance: the claimed bitrate is checked too
+    manager = uploads()
+    send(manager, [8 * 1024] * 3)
+    with pytest.raises(VoiceUploadError, match='bitrate is too high'):
+        manager.complete(UPLOAD_ID, 1, 3, duration_ms=1000)
+
+def test_upload_belongs_to_its_user():
+    manager = uploads()
+    manager.add_chunk(UPLOAD_ID, 1, 0, b'a')
+
+    with pytest.raises(VoiceUploadError) as error:
+        manager.complete(UPLOAD_ID, 2, 1)
+    assert error.value.status == 404
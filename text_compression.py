@@ -0,0 +1,57 @@
+import zlib
+from sqlalchemy.ext.hybrid import hybrid_property
+
+class TextCompression:
+    """zlib compression for large text columns.
+
+    Each compressed field is a pair of columns: the original Text column and a
+    binary one. Values at or above min_bytes go to the binary column when that
+    actually saves space; smaller values, and rows written before compression
+    was enabled, stay in the Text column. Reads handle both.
+    """
+
+    def __init__(self, min_bytes=1024, level=6):
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def configure(self, min_bytes=None, level=None):
+        if min_bytes is not None:
+            self.min_bytes = min_bytes
+        if level is not None:
+            self.level = level
+
+    def encode(self, value):
+        """Return (plain, compressed) column values for value"""
+        if value is None:
+            return None, None
+        data = value.encode('utf-8')
+        if self.min_bytes and len(data) >= self.min_bytes:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                return None, compressed
+        return value, None
+
+    def decode(self, plain, compressed):
+        if compressed is not None:
+            return zlib.decompress(compressed).decode('utf-8')
+        return plain
+
+text_compression = TextCompression()
+
+def compressed_text_property(plain_attr, compressed_attr):
+    """Hybrid property reading and writing a text value through a plain/compressed column pair.
+
+    In queries it refers to the plain column, so filters only see uncompressed rows.
+    """
+    def fget(self):
+        return text_compression.decode(getattr(self, plain_attr), getattr(self, compressed_attr))
+
+    def fset(self, value):
+        plain, compressed = text_compression.encode(value)
+        setattr(self, plain_attr, plain)
+        setattr(self, compressed_attr, compressed)
+
+    def expr(cls):
+        return getattr(cls, plain_attr)
+
+    return hybrid_property(fget, fset, expr=expr)
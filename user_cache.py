@@ -0,0 +1,82 @@
+import threading
+import time
+from flask_login import UserMixin
+
+class UserPrincipal(UserMixin):
+    """Detached snapshot of the User columns needed to authorize a request"""
+    is_active = False
+
+    def __init__(self, user):
+        self.id = user.id
+        self.email = user.email
+        self.role = user.role
+        self.is_active = bool(user.is_active)
+        self.email_verified = bool(user.email_verified)
+        self.created_at = user.created_at
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.id} {self.role}>'
+
+class UserCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, ttl=None, max_entries=None):
+        if ttl is not None:
+            self.ttl = ttl
+        if max_entries is not None:
+            self.max_entries = max_entries
+        self.clear()
+
+    def get(self, user_id, loader):
+        """Return the cached principal for user_id, calling loader() on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = loader()
+        if user is None:
+            return None
+
+        principal = UserPrincipal(user)
+        if self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._evict_expired(now)
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[user_id] = (now + self.ttl, principal)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl': self.ttl
+            }
+
+    def _evict_expired(self, now):
+        expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+
+user_cache = UserCache()
@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+class VoiceUploadError(ValueError):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+class VoiceUpload:
+    def __init__(self, upload_id, user_id, content_type):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.content_type = content_type
+        self.chunks = {}
+        self.size = 0
+        self.total_chunks = None
+        self.processing = False
+        self.result = None
+        self.updated_at = time.monotonic()
+
+    def missing_chunks(self):
+        if self.total_chunks is None:
+            return []
+        return [index for index in range(self.total_chunks) if index not in self.chunks]
+
+class VoiceUploadManager:
+    """Reassembles chunked voice uploads in a bounded in-memory buffer.
+
+    Uploads are per-process, so chunked uploads need the same sticky routing
+    the Socket.IO connection already relies on.
+    """
+
+    def __init__(self, max_duration=120, max_bitrate=64000, max_chunk_bytes=256 * 1024,
+                 buffer_bytes=64 * 1024 * 1024, ttl=600):
+        self.max_duration = max_duration
+        self.max_bitrate = max_bitrate
+        self.max_chunk_bytes = max_chunk_bytes
+        self.buffer_bytes = buffer_bytes
+        self.ttl = ttl
+        self._uploads = {}
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_duration=None, max_bitrate=None, max_chunk_bytes=None, buffer_bytes=None, ttl=None):
+        if max_duration is not None:
+            self.max_duration = max_duration
+        if max_bitrate is not None:
+            self.max_bitrate = max_bitrate
+        if max_chunk_bytes is not None:
+            self.max_chunk_bytes = max_chunk_bytes
+        if buffer_bytes is not None:
+            self.buffer_bytes = buffer_bytes
+        if ttl is not None:
+            self.ttl = ttl
+
+    @property
+    def max_upload_bytes(self):
+        # Allow headroom over the nominal bitrate for VBR peaks and container overhead
+        return int(self.max_bitrate / 8 * self.max_duration * 1.25) + 16 * 1024
+
+    def add_chunk(self, upload_id, user_id, index, data, content_type='audio/webm'):
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise VoiceUploadError('Invalid upload id')
+        if index < 0:
+            raise VoiceUploadError('Invalid chunk index')
+        if not data:
+            raise VoiceUploadError('Empty chunk')
+        if len(data) > self.max_chunk_bytes:
+            raise VoiceUploadError('Chunk too large', status=413)
+
+        with self._lock:
+            self._expire()
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                upload = VoiceUpload(upload_id, user_id, content_type)
+                self._uploads[upload_id] = upload
+            if upload.user_id != user_id:
+                raise VoiceUploadError('Upload not found', status=404)
+            if upload.processing or upload.result is not None:
+                raise VoiceUploadError('Upload already completed', status=409)
+            if upload.total_chunks is not None and index >= upload.total_chunks:
+                raise VoiceUploadError('Invalid chunk index')
+
+            previous = len(upload.chunks.get(index, b''))
+            growth = len(data) - previous
+            if upload.size + growth > self.max_upload_bytes:
+                raise VoiceUploadError('Recording exceeds the maximum allowed length', status=413)
+            if self._buffered + growth > self.buffer_bytes:
+                raise VoiceUploadError('Server is busy, please retry shortly', status=503)
+
+            # Resent chunks replace the earlier copy
+            upload.chunks[index] = data
+            upload.size += growth
+            self._buffered += growth
+            upload.updated_at = time.monotonic()
+            return upload
+
+    def complete(self, upload_id, user_id, total_chunks, duration_ms=None):
+        """Claim a fully received upload for processing and return its bytes.
+
+        Raises VoiceUploadError with the missing chunk indexes if any have not arrived.
+        duration_ms is reported by the client, so it is only used to reject uploads early.
+        """
+        with self._lock:
+            upload = self._get(upload_id, user_id)
+            if upload.processing:
+                raise VoiceUploadError('Upload is already being processed', status=409)
+            if upload.result is not None:
+                return upload, None
+
+            if total_chunks <= 0 or (upload.chunks and max(upload.chunks) >= total_chunks):
+                raise VoiceUploadError('Invalid chunk count')
+            upload.total_chunks = total_chunks
+            missing = upload.missing_chunks()
+            if missing:
+                raise VoiceUploadError('Upload incomplete', status=409, missing=missing)
+
+            # The size bound is the enforced limit; the client's duration_ms can only reject sooner
+            if upload.size > self.max_upload_bytes:
+                self._discard(upload)
+                raise VoiceUploadError('Recording exceeds the maximum allowed length', status=413)
+            if duration_ms is not None:
+                duration = duration_ms / 1000
+                if duration > self.max_duration:
+                    self._discard(upload)
+                    raise VoiceUploadError(f'Recordings are limited to {self.max_duration} seconds', status=413)
+                if upload.size > self.max_bitrate / 8 * max(duration, 1) * 1.25 + 16 * 1024:
+                    self._discard(upload)
+                    raise VoiceUploadError('Recording bitrate is too high', status=413)
+
+            audio_bytes = b''.join(upload.chunks[index] for index in range(total_chunks))
+            # Free the buffer now; the joined bytes belong to the caller
+            self._buffered -= upload.size
+            upload.chunks = {}
+            upload.size = 0
+            upload.processing = True
+            upload.updated_at = time.monotonic()
+            return upload, audio_bytes
+
+    def finish(self, upload, result):
+        """Record the processing result so a client that lost the response can fetch it"""
+        with self._lock:
+            upload.processing = False
+            if result and result.get('success'):
+                upload.result = result
+                upload.updated_at = time.monotonic()
+            else:
+                self._uploads.pop(upload.upload_id, None)
+
+    def status(self, upload_id, user_id):
+        with self._lock:
+            upload = self._get(upload_id, user_id)
+            return {
+                'upload_id': upload.upload_id,
+                'received': sorted(upload.chunks),
+                'bytes': upload.size,
+                'processing': upload.processing,
+                'result': upload.result
+            }
+
+    def _get(self, upload_id, user_id):
+        upload = self._uploads.get(upload_id)
+        if upload is None or upload.user_id != user_id:
+            raise VoiceUploadError('Upload not found', status=404)
+        return upload
+
+    def _discard(self, upload):
+        self._buffered -= upload.size
+        self._uploads.pop(upload.upload_id, None)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for upload in [u for u in self._uploads.values() if u.updated_at < cutoff and not u.processing]:
+            self._discard(upload)
+
+voice_uploads = VoiceUploadManager()